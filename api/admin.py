@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import User, Item, Bid, Message
+from .models import User, Item, Bid, Message, EmailOutbox, MediaBlob
 from django import forms
 from django.contrib.auth.models import Group
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
@@ -105,10 +105,10 @@ admin.site.unregister(Group)
 # Register Item model
 @admin.register(Item)
 class ItemAdmin(admin.ModelAdmin):
-    list_display = ['title', 'owner', 'minimum_bid', 'auction_end_date', 'created_at']
+    list_display = ['title', 'owner', 'minimum_bid', 'current_highest_bid', 'bid_count', 'auction_end_date', 'created_at']
     list_filter = ['auction_end_date', 'created_at']
     search_fields = ['title', 'description']
-    readonly_fields = ['created_at']
+    readonly_fields = ['created_at', 'current_highest_bid', 'highest_bidder', 'bid_count']
 
 
 # Register Bid model
@@ -127,3 +127,20 @@ class MessageAdmin(admin.ModelAdmin):
     list_filter = ['created_at']
     search_fields = ['message_title', 'message_body', 'poster__email', 'item__title']
     readonly_fields = ['created_at']
+
+
+# Register EmailOutbox model
+@admin.register(EmailOutbox)
+class EmailOutboxAdmin(admin.ModelAdmin):
+    list_display = ['subject', 'to_email', 'status', 'attempts', 'next_attempt_at', 'sent_at']
+    list_filter = ['status']
+    search_fields = ['subject', 'to_email']
+    readonly_fields = ['created_at', 'sent_at', 'last_error']
+
+
+# Register MediaBlob model
+@admin.register(MediaBlob)
+class MediaBlobAdmin(admin.ModelAdmin):
+    list_display = ['name', 'refcount', 'size', 'touched_at']
+    search_fields = ['name']
+    readonly_fields = ['name', 'refcount', 'size', 'touched_at']
@@ -0,0 +1,88 @@
+"""
+Bid placement.
+
+place_bid() validates a bid against the item's current price and records it
+inside a single transaction, so two bids arriving at the same moment can never
+both pass the "greater than the highest bid" check.
+
+On backends with row locks (PostgreSQL, MySQL) the item row is taken with
+SELECT ... FOR UPDATE, which queues competing bidders behind each other.
+
+SQLite has no row locks and Django silently drops select_for_update() there,
+so the price is additionally claimed with a conditional UPDATE that only
+matches while the stored price is still below the new bid. SQLite serialises
+writers, so whichever bid claims the row first wins and the loser's UPDATE
+matches nothing. project/database.py opens SQLite transactions with
+BEGIN IMMEDIATE so the write lock is taken up front rather than upgraded
+mid-transaction, which would otherwise fail with "database is locked" instead
+of waiting for the other writer.
+"""
+
+from datetime import date
+
+from django.db import transaction
+from django.db.models import Q
+
+from .models import Item, Bid
+
+
+class BidRejected(Exception):
+    """Raised when a bid cannot be accepted, carrying the HTTP status to return"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+def place_bid(item_id, bidder, bid_amount):
+    """
+    Place a bid of bid_amount on the item for bidder and return the new Bid.
+    Raises BidRejected if the item doesn't exist or the bid isn't allowed.
+    """
+    with transaction.atomic():
+        try:
+            item = Item.objects.select_for_update().get(id=item_id)
+        except Item.DoesNotExist:
+            raise BidRejected("Item not found", status=404)
+
+        if item.auction_end_date < date.today():
+            raise BidRejected("Auction has ended for this item")
+
+        if item.owner_id == bidder.id:
+            raise BidRejected("You cannot bid on your own item", status=403)
+
+        if item.current_highest_bid is not None:
+            # There are existing bids, must be higher than the highest bid
+            if bid_amount <= item.current_highest_bid:
+                raise BidRejected(
+                    f"Bid must be greater than the current highest bid of {item.current_highest_bid}"
+                )
+        elif bid_amount < item.minimum_bid:
+            # No existing bids, must meet or exceed minimum bid
+            raise BidRejected(
+                f"Bid must be at least the minimum bid of {item.minimum_bid}"
+            )
+
+        # Claim the price. Under a row lock this always matches; on SQLite it is
+        # what stops a concurrent bid that read the same price from also winning.
+        claimed = (
+            Item.objects.filter(id=item.id)
+            .filter(
+                Q(current_highest_bid__isnull=True, minimum_bid__lte=bid_amount)
+                | Q(current_highest_bid__lt=bid_amount)
+            )
+            .update(current_highest_bid=bid_amount, highest_bidder=bidder)
+        )
+        if not claimed:
+            current_highest_bid = (
+                Item.objects.filter(id=item.id)
+                .values_list("current_highest_bid", flat=True)
+                .first()
+            )
+            raise BidRejected(
+                f"Bid must be greater than the current highest bid of {current_highest_bid}"
+            )
+
+        # Bid.save() bumps bid_count; the price already matches so it is unchanged
+        return Bid.objects.create(bidder=bidder, item=item, bid_amount=bid_amount)
@@ -0,0 +1,213 @@
+"""
+Response caches for the hottest item reads.
+
+The item detail (get_item_by_id) caches the row its serializer fetches,
+under a versioned key: ``item:<PAYLOAD_VERSION>:<item id>:<item version>``.
+Changing an item, or a bid on it, bumps the item's version once the
+transaction commits (see api.signals and invalidate_item()), so the next read
+misses and reloads. A reader that loaded the old state just before a bump
+stores it under the old version, where nothing will look. Rows rather than
+rendered payloads are cached because image URLs depend on the request's host
+and is_active on today's date; rendering a cached row is cheap.
+
+Entries live in the ITEM_CACHE_ALIAS cache (default "items"), so the backend
+is whatever CACHES configures for it: local memory (the default, per
+process), a file-based cache, or Redis for a cache shared between processes.
+ITEM_CACHE_TIMEOUT bounds how long anything missed by invalidation (e.g. an
+owner renaming themselves) can stay stale.
+
+The first page of the active item listing (get_paginated_items without a
+search, for anonymous visitors) is cached the same way under a single
+listing generation: ``listing:<PAYLOAD_VERSION>:<generation>:<page>``, where
+page covers the parameters and today's date. Any invalidate_item() call bumps
+the generation, so every cached listing page is dropped at once. It is bumped
+straight away as well as on commit, so reads inside the writing transaction
+(which already see its changes) don't get the old page either. When a page
+misses, one request rebuilds it while the others that miss at the same time
+wait up to LISTING_CACHE_WAIT seconds for its result (see cached_listing()),
+so an invalidation doesn't send a burst of identical queries to the database.
+
+Hit/miss counts are kept per process in ITEM_CACHE_STATS and
+LISTING_CACHE_STATS.
+"""
+
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+# Bump when the cached row's columns change, so old entries are ignored
+PAYLOAD_VERSION = 1
+
+
+class CacheStats:
+    """Hit, miss and invalidation counts for one cache, in this process"""
+
+    def __init__(self, name):
+        self.name = name
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.hits = 0
+            self.misses = 0
+            self.invalidations = 0
+            self.coalesced = 0
+
+    def record(self, hit):
+        with self.lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def invalidated(self, count=1):
+        with self.lock:
+            self.invalidations += count
+
+    def waited(self):
+        # A miss served by another request's rebuild (also counted as a hit)
+        with self.lock:
+            self.coalesced += 1
+
+    @property
+    def hit_ratio(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def as_dict(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "coalesced": self.coalesced,
+            "hit_ratio": round(self.hit_ratio, 3),
+        }
+
+
+ITEM_CACHE_STATS = CacheStats("item_detail")
+LISTING_CACHE_STATS = CacheStats("item_listing")
+
+LISTING_GENERATION_KEY = "listing-generation"
+
+
+def item_cache():
+    return caches[getattr(settings, "ITEM_CACHE_ALIAS", "items")]
+
+
+def version_key(item_id):
+    return f"item-version:{item_id}"
+
+
+def new_version():
+    # Unique rather than 1, so a version key that was evicted and recreated
+    # can't bring back entries stored under an earlier version
+    return time.time_ns()
+
+
+def current_version(cache, key):
+    version = cache.get(key)
+    if version is None:
+        version = new_version()
+        if not cache.add(key, version, timeout=None):
+            version = cache.get(key, version)
+    return version
+
+
+def item_version(cache, item_id):
+    return current_version(cache, version_key(item_id))
+
+
+def bump_version(cache, key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Not cached (or evicted); start a new version
+        cache.set(key, new_version(), timeout=None)
+
+
+def cached_item_row(item_id, load):
+    """
+    (row, hit) for item_id's detail row: from the cache, or from load() (which
+    returns the row, or None if there is no such item) on a miss.
+    """
+    cache = item_cache()
+    key = f"item:{PAYLOAD_VERSION}:{item_id}:{item_version(cache, item_id)}"
+    row = cache.get(key)
+    if row is not None:
+        ITEM_CACHE_STATS.record(hit=True)
+        return row, True
+
+    ITEM_CACHE_STATS.record(hit=False)
+    row = load()
+    if row is not None:
+        cache.set(key, row, getattr(settings, "ITEM_CACHE_TIMEOUT", 300))
+    return row, False
+
+
+def cached_listing(page, load):
+    """
+    (value, hit) for the listing page described by page (a tuple of its
+    parameters): from the cache, or from load() on a miss. Only one caller at
+    a time runs load() for a page; the others wait for its result, and run
+    load() themselves if it doesn't arrive within LISTING_CACHE_WAIT seconds.
+    """
+    cache = item_cache()
+    generation = current_version(cache, LISTING_GENERATION_KEY)
+    key = f"listing:{PAYLOAD_VERSION}:{generation}:{':'.join(map(str, page))}"
+    value = cache.get(key)
+    if value is not None:
+        LISTING_CACHE_STATS.record(hit=True)
+        return value, True
+
+    timeout = getattr(settings, "LISTING_CACHE_TIMEOUT", 60)
+    wait = getattr(settings, "LISTING_CACHE_WAIT", 2.0)
+    # The lock expires on its own if its holder dies mid-rebuild
+    if not cache.add(f"{key}:rebuild", 1, timeout=max(int(wait * 2), 1)):
+        deadline = time.monotonic() + wait
+        delay = 0.005
+        while time.monotonic() < deadline:
+            time.sleep(delay)
+            delay = min(delay * 2, 0.05)
+            value = cache.get(key)
+            if value is not None:
+                LISTING_CACHE_STATS.record(hit=True)
+                LISTING_CACHE_STATS.waited()
+                return value, True
+        LISTING_CACHE_STATS.record(hit=False)
+        return load(), False
+
+    LISTING_CACHE_STATS.record(hit=False)
+    try:
+        value = load()
+        cache.set(key, value, timeout)
+    finally:
+        cache.delete(f"{key}:rebuild")
+    return value, False
+
+
+def bump_items(item_ids):
+    cache = item_cache()
+    for item_id in item_ids:
+        bump_version(cache, version_key(item_id))
+    ITEM_CACHE_STATS.invalidated(len(item_ids))
+
+
+def bump_listing():
+    bump_version(item_cache(), LISTING_GENERATION_KEY)
+    LISTING_CACHE_STATS.invalidated()
+
+
+def invalidate_item(*item_ids):
+    """
+    Drop the cached detail of the given items once the transaction commits,
+    and the cached listing pages both now and once it commits
+    """
+    item_ids = [item_id for item_id in item_ids if item_id is not None]
+    if item_ids:
+        bump_listing()
+        transaction.on_commit(lambda: bump_items(item_ids))
+        transaction.on_commit(bump_listing)
@@ -1,64 +1,81 @@
-from django.core.mail import send_mail
-from django.db.models import Max
+from django.db import transaction
+from django.db.models import OuterRef, Subquery
 from django.conf import settings
 from datetime import date
+from .caching import invalidate_item
 from .models import Item, Bid
+from .outbox import enqueue_emails, send_outbox
 
+# Auctions handled per query/transaction by process_auction_winners
+WINNER_CHUNK_SIZE = 1000
 
-def process_auction_winners():
+
+def process_auction_winners(chunk_size=WINNER_CHUNK_SIZE):
     """
     Cron job to process auction winners for auctions ending today.
 
-    For each auction ending today:
-    - Finds the highest bid
-    - Updates the item with the auction winner
-    - Sends an email to the winner
+    Auctions ending today without a winner are handled chunk_size at a time.
+    For each chunk:
+    - Assigns every auction to its highest bidder with one UPDATE
+    - Loads the winners' emails with one query
+    - Queues an email to each winner in the outbox (api.outbox)
+
+    Returns the number of winners assigned.
     """
     today = date.today()
 
     # Find all auctions ending today that don't have a winner assigned yet
     ending_auctions = Item.objects.filter(
         auction_end_date=today, auction_winner__isnull=True
-    )
-
-    for item in ending_auctions:
-        # Get the highest bid amount for this item
-        highest_bid_amount = Bid.objects.filter(item=item).aggregate(Max("bid_amount"))[
-            "bid_amount__max"
-        ]
+    ).order_by("id")
 
-        # Skip if no bids were placed
-        if highest_bid_amount is None:
-            continue
-
-        # Get the winning bid (first one in case of ties)
-        winning_bid = (
-            Bid.objects.filter(item=item, bid_amount=highest_bid_amount)
-            .order_by("created_at")
-            .first()
+    winners_assigned = 0
+    last_id = 0
+    while True:
+        item_ids = list(
+            ending_auctions.filter(id__gt=last_id).values_list("id", flat=True)[
+                :chunk_size
+            ]
         )
+        if not item_ids:
+            break
+        last_id = item_ids[-1]
 
-        # Ensure we have a valid winner
-        if not winning_bid or not winning_bid.bidder:
-            continue
+        with transaction.atomic():
+            # Highest amount wins, the earliest bid breaks ties. Items without
+            # bids, or whose winning bidder has been deleted, stay unassigned.
+            top_bid = Bid.objects.filter(item=OuterRef("pk")).order_by(
+                "-bid_amount", "created_at", "pk"
+            )
+            Item.objects.filter(id__in=item_ids).update(
+                auction_winner=Subquery(top_bid.values("bidder")[:1])
+            )
+            winners = list(
+                Item.objects.filter(id__in=item_ids, auction_winner__isnull=False)
+                .order_by("id")
+                .values_list("id", "auction_winner__email", "title")
+            )
+            # Queryset updates send no signals, so drop cached details here
+            invalidate_item(*[item_id for item_id, _, _ in winners])
+            # Queued in the same transaction, so a winner is emailed exactly
+            # when their win is recorded; send_queued_emails sends them
+            enqueue_emails(
+                (
+                    f"Congratulations! You won {title}",
+                    "Login to your account to check shipping details.",
+                    winner_email,
+                    settings.EMAIL_HOST_USER,
+                )
+                for _, winner_email, title in winners
+            )
+        winners_assigned += len(winners)
 
-        # Update the item with the auction winner
-        item.auction_winner = winning_bid.bidder
-        item.save()
+    return winners_assigned
 
-        # Send email to winner
-        winner_email = winning_bid.bidder.email
 
-        try:
-            # Use positional arguments like the working test version
-            send_mail(
-                f"Congratulations! You won {item.title}",
-                "Login to your account to check shipping details.",
-                settings.EMAIL_HOST_USER,
-                [winner_email],
-            )
-        except Exception as e:
-            # Log the error but continue processing other auctions
-            print(
-                f"Failed to send email to {winner_email} for item {item.id}: {str(e)}"
-            )
+def send_queued_emails():
+    """
+    Cron job to send the emails waiting in the outbox over one mail
+    connection, retrying failures with backoff.
+    """
+    return send_outbox()
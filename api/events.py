@@ -0,0 +1,198 @@
+"""
+Live auction events: accepted bids and new messages, pushed to watchers.
+
+Views publish events with publish_item_event() once their transaction
+commits. stream_item_events() (``items/<id>/events/``) sends them to each
+watcher of the item as server-sent events. It is an async view, so under an
+ASGI server (see project/asgi.py) an idle watcher costs a coroutine and a
+queue, not a thread, and one process can hold tens of thousands of them.
+
+Under the ASGI handler Django also keeps a thread for each request's sync
+code (middleware, ORM calls) until the request ends. Streams and long polls
+call release_request_thread() once, before they wait, so that thread isn't
+kept for a connection that's doing nothing. Sync code they run afterwards
+should use sync_to_async(thread_sensitive=False), or the request gets a new
+thread (and database connection) of its own again.
+
+Events travel through a hub, named by EVENT_HUB. LocalHub, the default,
+delivers them within this process only, which is enough for a single ASGI
+worker. With several workers, point EVENT_HUB at a hub backed by a broker
+(e.g. Redis pub/sub); it needs publish(channel, event), callable from any
+thread, and subscribe(channel), returning a Subscription.
+"""
+
+import asyncio
+import threading
+from functools import lru_cache
+
+from asgiref.sync import SyncToAsync, sync_to_async
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils.module_loading import import_string
+
+from .responses import dumps
+
+
+class SubscriberOverflow(Exception):
+    """A subscriber fell so far behind that events were dropped"""
+
+
+OVERFLOW = object()
+
+
+class Subscription:
+    """Events on one channel for one subscriber: get() them, then close()"""
+
+    def __init__(self, hub, channel, loop, max_size):
+        self.hub = hub
+        self.channel = channel
+        self.loop = loop
+        self.queue = asyncio.Queue(max_size)
+        self.overflowed = False
+
+    def put(self, event):
+        # Runs in the subscriber's event loop
+        if self.overflowed:
+            return
+        if self.queue.full():
+            # Rather than silently miss events, the subscriber is told it has
+            # (so a stream can end and its client reconnect and refetch)
+            self.overflowed = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            event = OVERFLOW
+        self.queue.put_nowait(event)
+
+    async def get(self, timeout=None):
+        """
+        The next event, or None if none arrives within timeout seconds.
+        Raises SubscriberOverflow if events were dropped.
+        """
+        try:
+            event = await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        if event is OVERFLOW:
+            raise SubscriberOverflow
+        return event
+
+    def close(self):
+        self.hub.unsubscribe(self)
+
+
+class LocalHub:
+    """Publish/subscribe between the threads and event loops of this process"""
+
+    def __init__(self, max_queue_size=None):
+        self.max_queue_size = max_queue_size or getattr(
+            settings, "EVENT_QUEUE_SIZE", 100
+        )
+        # {channel: {event loop: set of subscriptions}}
+        self.channels = {}
+        self.lock = threading.Lock()
+
+    def subscribe(self, channel):
+        """Subscribe the running event loop to channel"""
+        loop = asyncio.get_running_loop()
+        subscription = Subscription(self, channel, loop, self.max_queue_size)
+        with self.lock:
+            self.channels.setdefault(channel, {}).setdefault(loop, set()).add(
+                subscription
+            )
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            loops = self.channels.get(subscription.channel, {})
+            subscriptions = loops.get(subscription.loop, set())
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                loops.pop(subscription.loop, None)
+            if not loops:
+                self.channels.pop(subscription.channel, None)
+
+    def publish(self, channel, event):
+        """Deliver event to every subscriber to channel; safe from any thread"""
+        with self.lock:
+            loops = {
+                loop: list(subscriptions)
+                for loop, subscriptions in self.channels.get(channel, {}).items()
+            }
+        for loop, subscriptions in loops.items():
+            # One wake-up per event loop, however many subscribers it has
+            try:
+                loop.call_soon_threadsafe(deliver, subscriptions, event)
+            except RuntimeError:
+                # The loop has closed; its subscribers went with it
+                pass
+
+    def subscriber_count(self, channel):
+        with self.lock:
+            return sum(map(len, self.channels.get(channel, {}).values()))
+
+
+def deliver(subscriptions, event):
+    for subscription in subscriptions:
+        subscription.put(event)
+
+
+@lru_cache(maxsize=None)
+def get_hub():
+    return import_string(getattr(settings, "EVENT_HUB", "api.events.LocalHub"))()
+
+
+def item_channel(item_id):
+    return f"item:{item_id}"
+
+
+def publish_item_event(item_id, event_type, data):
+    """Send an event to the item's watchers once the transaction commits"""
+    event = {"type": event_type, "data": data}
+    transaction.on_commit(lambda: get_hub().publish(item_channel(item_id), event))
+
+
+async def release_request_thread():
+    """
+    Let the thread Django keeps for this request's sync code exit, after
+    closing its database connections. Thread-sensitive sync code run later in
+    the request gets a new one.
+
+    asgiref has no public API for this, so it goes through SyncToAsync's
+    executor registry, and does nothing if a later asgiref drops it.
+    """
+    executors = getattr(SyncToAsync, "context_to_thread_executor", None)
+    context = SyncToAsync.thread_sensitive_context.get(None)
+    if executors is None or context not in executors:
+        # No thread to release (not under the ASGI handler, or none yet)
+        return
+    await sync_to_async(connections.close_all)()
+    executor = executors.pop(context, None)
+    if executor is not None:
+        executor.shutdown(wait=False)
+
+
+async def event_stream(channel):
+    """
+    Server-sent events for channel: each event as it's published, and a
+    comment every EVENT_STREAM_HEARTBEAT seconds so proxies keep an idle
+    connection open and a gone client is noticed
+    """
+    heartbeat = getattr(settings, "EVENT_STREAM_HEARTBEAT", 15)
+    subscription = get_hub().subscribe(channel)
+    try:
+        # How long the browser waits before reconnecting
+        yield b"retry: 3000\n\n"
+        await release_request_thread()
+        while True:
+            event = await subscription.get(heartbeat)
+            if event is None:
+                yield b": keep-alive\n\n"
+            else:
+                yield b"event: %s\ndata: %s\n\n" % (
+                    event["type"].encode(),
+                    dumps(event["data"]),
+                )
+    except SubscriberOverflow:
+        return
+    finally:
+        subscription.close()
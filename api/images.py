@@ -0,0 +1,365 @@
+"""
+Image upload pipeline.
+
+Item photos and profile pictures are no longer decoded and re-encoded inside
+the request. The view checks the upload's header with check_upload(), then
+save_upload() stores the raw file under uploads/, marks the row's
+``<field>_status`` as processing and returns. Once the transaction commits,
+the job goes to a process pool (Pillow work is CPU-bound, so threads wouldn't
+run in parallel). When it finishes, the row is pointed at the processed file
+and marked ready, or marked failed if the image could not be decoded. The API
+reports the status and hides the image until it is ready.
+
+Items also get smaller renditions (RENDITION_SIZES, in JPEG plus WebP/AVIF
+where Pillow can write them) for srcset. Every file is saved through the
+content-addressed default storage (api.storage), so identical images are
+stored once; delete_image() releases an image and its renditions.
+
+The worker processes only run render_image(), so this module doesn't import
+the models at import time.
+
+IMAGE_PROCESSING_WORKERS sets the pool size (default: one per CPU). With 0,
+jobs run inline when the transaction commits, which is what the tests use.
+Jobs lost to a restart can be rerun with ``manage.py process_images``.
+"""
+
+import io
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connection, transaction
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+MAX_UPLOAD_SIZE = 5 * 1024 * 1024
+MAX_DIMENSION = 1024
+# Decoded size limit, checked from the header: a small file can still
+# decompress to an enormous bitmap
+MAX_PIXELS = 50_000_000
+# Images are decoded/reduced to at least this multiple of the target size
+# before the final resample (see open_scaled)
+REDUCING_GAP = 2.0
+UPLOAD_DIR = "uploads/"
+RENDITION_DIR = "renditions/"
+
+# Longest side of each rendition, largest first
+RENDITION_SIZES = (1024, 400, 160)
+
+# Rendition formats by Pillow format name: (file extension, save options).
+# Formats this Pillow build can't write are skipped.
+RENDITION_FORMATS = {
+    "JPEG": ("jpg", {"quality": 85, "optimize": True}),
+    "WEBP": ("webp", {"quality": 80, "method": 4}),
+    "AVIF": ("avif", {"quality": 60}),
+}
+
+# Model label -> (image field, name of the processed file, whether to make
+# renditions). The storage swaps the name for a content hash, keeping its
+# extension. Rendition names are kept in <field>_renditions.
+IMAGE_FIELDS = {
+    "api.Item": ("item_image", "item_{pk}.jpg", True),
+    "api.User": ("profile_picture", "user_{pk}_profile.jpg", False),
+}
+
+
+class InvalidImage(ValueError):
+    pass
+
+
+def max_pixels():
+    return getattr(settings, "IMAGE_MAX_PIXELS", MAX_PIXELS)
+
+
+def check_pixels(image, limit):
+    # Width and height come from the header, before anything is decoded
+    if image.width * image.height > limit:
+        raise InvalidImage(
+            f"Image too large. Maximum is {limit // 1_000_000} megapixels"
+        )
+
+
+def check_upload(uploaded_file):
+    """
+    Reject uploads that are too large or aren't images. Only the header is
+    read, so this is cheap enough for the request path.
+    """
+    if uploaded_file.size > MAX_UPLOAD_SIZE:
+        raise InvalidImage("File too large. Maximum size is 5MB")
+    try:
+        with Image.open(uploaded_file) as image:
+            check_pixels(image, max_pixels())
+    except (IOError, OSError, Image.DecompressionBombError):
+        raise InvalidImage("Invalid or corrupt image file")
+    finally:
+        uploaded_file.seek(0)
+
+
+def open_scaled(data, size, limit):
+    """
+    Decode image bytes scaled to fit within size x size, as RGB.
+
+    The image is opened once and never decoded at full size when it can be
+    avoided: JPEGs are decoded straight at 1/2, 1/4 or 1/8 scale by draft()
+    (no smaller than REDUCING_GAP times the target, so quality matches a full
+    decode), and thumbnail() reduces the rest in steps. Transparent images are
+    flattened onto white after scaling, on the small image.
+    """
+    image = Image.open(io.BytesIO(data))
+    check_pixels(image, limit)
+
+    width, height = image.size
+    scale = min(size / width, size / height, 1)
+    target = (max(round(width * scale), 1), max(round(height * scale), 1))
+    image.draft(None, (int(target[0] * REDUCING_GAP), int(target[1] * REDUCING_GAP)))
+
+    if image.mode == "P":
+        # Palette images can only be resized nearest-neighbour
+        image = image.convert("RGBA" if "transparency" in image.info else "RGB")
+    elif image.mode not in ("RGB", "RGBA", "L", "LA", "CMYK"):
+        image = image.convert("RGB")
+    image.thumbnail(target, Image.Resampling.LANCZOS, reducing_gap=REDUCING_GAP)
+
+    if image.mode in ("RGBA", "LA"):
+        background = Image.new("RGB", image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel("A"))
+        return background
+    return image.convert("RGB")
+
+
+def encode(image, image_format):
+    output = io.BytesIO()
+    image.save(output, format=image_format, **RENDITION_FORMATS[image_format][1])
+    return output.getvalue()
+
+
+def rendition_formats():
+    Image.init()
+    return [name for name in RENDITION_FORMATS if name in Image.SAVE]
+
+
+def render_image(data, renditions=False, limit=MAX_PIXELS):
+    """
+    Turn uploaded image bytes into the JPEG that is served (RGB, at most
+    MAX_DIMENSION pixels a side) and, if renditions is set, a
+    {format: {width: bytes}} map of smaller copies in every format available.
+    Images over limit pixels are refused. Runs in the worker processes.
+    """
+    image = open_scaled(data, MAX_DIMENSION, limit)
+    primary = encode(image, "JPEG")
+    if not renditions:
+        return primary, {}
+
+    rendered = {image_format: {} for image_format in rendition_formats()}
+    for size in RENDITION_SIZES:
+        # Each size is scaled down from the previous one, not the original
+        image.thumbnail((size, size), Image.Resampling.LANCZOS)
+        for image_format, by_width in rendered.items():
+            if image.width not in by_width:
+                by_width[image.width] = encode(image, image_format)
+    return primary, rendered
+
+
+def store_renditions(storage, rendered):
+    """Save rendered renditions; returns the {extension: {width: name}} map"""
+    names = {}
+    for image_format, by_width in rendered.items():
+        extension = RENDITION_FORMATS[image_format][0]
+        names[extension] = {
+            str(width): storage.save(
+                f"{RENDITION_DIR}{width}.{extension}", ContentFile(data)
+            )
+            for width, data in by_width.items()
+        }
+    return names
+
+
+def release_renditions(storage, renditions):
+    for by_width in (renditions or {}).values():
+        for name in by_width.values():
+            storage.delete(name)
+
+
+def delete_image(instance):
+    """
+    Release instance's image and any renditions (the files go once nothing
+    else uses them) and clear its fields. Doesn't save instance.
+    """
+    field_name, _, renditions = IMAGE_FIELDS[instance._meta.label]
+    field_file = getattr(instance, field_name)
+    if field_file:
+        field_file.delete(save=False)
+    if renditions:
+        renditions_field = f"{field_name}_renditions"
+        release_renditions(field_file.storage, getattr(instance, renditions_field))
+        setattr(instance, renditions_field, None)
+
+
+def save_upload(instance, uploaded_file):
+    """
+    Store uploaded_file raw as instance's image and queue it for processing.
+    Replaces (and deletes) any previous image.
+    """
+    from .models import ImageStatus
+
+    label = instance._meta.label
+    field_name, filename, renditions = IMAGE_FIELDS[label]
+    delete_image(instance)
+
+    extension = os.path.splitext(uploaded_file.name)[1].lower()
+    raw_name = getattr(instance, field_name).storage.save(
+        f"{UPLOAD_DIR}upload{extension}", uploaded_file
+    )
+    setattr(instance, field_name, raw_name)
+    setattr(instance, f"{field_name}_status", ImageStatus.PROCESSING)
+    update_fields = [field_name, f"{field_name}_status"]
+    if renditions:
+        update_fields.append(f"{field_name}_renditions")
+    instance.save(update_fields=update_fields)
+
+    job = (label, instance.pk, field_name, raw_name, filename.format(pk=instance.pk))
+    transaction.on_commit(lambda: submit(job))
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool(reset=False):
+    global _pool
+    with _pool_lock:
+        if _pool is None or reset:
+            workers = getattr(settings, "IMAGE_PROCESSING_WORKERS", None)
+            # Not forked: this process's threads may hold locks and DB sockets
+            # the children would inherit. render_image() needs neither
+            # settings nor models, so fresh interpreters will do.
+            _pool = ProcessPoolExecutor(
+                max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        return _pool
+
+
+def submit(job):
+    """Process a job in the pool, or inline if IMAGE_PROCESSING_WORKERS is 0"""
+    label, pk, field_name, raw_name, filename = job
+    if getattr(settings, "IMAGE_PROCESSING_WORKERS", None) == 0:
+        run_job(job)
+        return
+
+    try:
+        with image_storage(label, field_name).open(raw_name) as raw:
+            data = raw.read()
+    except OSError as e:
+        finish(job, error=e)
+        return
+
+    renditions = IMAGE_FIELDS[label][2]
+    try:
+        future = get_pool().submit(render_image, data, renditions, max_pixels())
+    except BrokenProcessPool:
+        # A worker died (e.g. killed for memory); start a fresh pool
+        future = get_pool(reset=True).submit(
+            render_image, data, renditions, max_pixels()
+        )
+    future.add_done_callback(lambda future: finish_in_thread(job, future))
+
+
+def finish_in_thread(job, future):
+    # Runs on the pool's result thread, which has its own DB connection
+    try:
+        error = future.exception()
+        finish(job, rendered=None if error else future.result(), error=error)
+    except Exception:
+        logger.exception("Failed to finish image job %s", job)
+    finally:
+        connection.close()
+
+
+def run_job(job):
+    """Process a job in this process"""
+    label, pk, field_name, raw_name, filename = job
+    try:
+        with image_storage(label, field_name).open(raw_name) as raw:
+            rendered = render_image(raw.read(), IMAGE_FIELDS[label][2], max_pixels())
+    except Exception as e:
+        finish(job, error=e)
+    else:
+        finish(job, rendered=rendered)
+
+
+def finish(job, rendered=None, error=None):
+    """
+    Point the row at the processed image (and its renditions), or mark it
+    failed. rendered is render_image()'s result.
+    """
+    from .caching import invalidate_item
+    from .models import ImageStatus
+
+    label, pk, field_name, raw_name, filename = job
+    model = apps.get_model(label)
+    field = model._meta.get_field(field_name)
+    status_field = f"{field_name}_status"
+    renditions_field = f"{field_name}_renditions" if IMAGE_FIELDS[label][2] else None
+
+    # Only if the row still holds this upload: it may have been replaced or
+    # deleted while the job ran
+    pending = model.objects.filter(
+        pk=pk, **{field_name: raw_name, status_field: ImageStatus.PROCESSING}
+    )
+
+    if error is not None:
+        logger.warning("Image %s for %s %s failed: %s", raw_name, label, pk, error)
+        changes = {field_name: None, status_field: ImageStatus.FAILED}
+        if renditions_field:
+            changes[renditions_field] = None
+        updated = pending.update(**changes)
+    else:
+        primary, renditions = rendered
+        name = field.storage.save(
+            field.generate_filename(None, filename), ContentFile(primary)
+        )
+        changes = {field_name: name, status_field: ImageStatus.READY}
+        if renditions_field:
+            changes[renditions_field] = store_renditions(field.storage, renditions)
+        updated = pending.update(**changes)
+        if not updated:
+            field.storage.delete(name)
+            release_renditions(field.storage, changes.get(renditions_field))
+
+    if updated and label == "api.Item":
+        # update() sends no signals; see api.caching. Only now the row has
+        # changed, so no request can cache the old one again afterwards
+        invalidate_item(pk)
+
+    # Otherwise whatever replaced or deleted the upload already released it,
+    # and the raw file may be shared with another row
+    if updated:
+        field.storage.delete(raw_name)
+
+
+def image_storage(label, field_name):
+    return apps.get_model(label)._meta.get_field(field_name).storage
+
+
+def pending_jobs():
+    """Jobs for every image still marked processing"""
+    from .models import ImageStatus
+
+    jobs = []
+    for label, (field_name, filename, _) in IMAGE_FIELDS.items():
+        model = apps.get_model(label)
+        rows = model.objects.filter(
+            **{f"{field_name}_status": ImageStatus.PROCESSING}
+        ).values_list("pk", field_name)
+        jobs.extend(
+            (label, pk, field_name, raw_name, filename.format(pk=pk))
+            for pk, raw_name in rows
+        )
+    return jobs
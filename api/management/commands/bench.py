@@ -0,0 +1,342 @@
+import json
+import statistics
+import sys
+import time
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from api import urls
+from api.metrics import REQUEST_METRICS
+from api.models import Bid, Item, Message, User
+
+BENCH_PASSWORD = "benchpass"
+
+# Endpoints not timed, and why; anything else in api/urls.py without a
+# request in Command.requests() fails the run, so new endpoints aren't missed
+SKIPPED = {
+    "upload_profile_picture": "writes image files to media storage",
+    "delete_profile_picture": "needs an uploaded picture",
+    "stream_item_events": "streams until the client disconnects",
+}
+
+
+def percentile(quantiles, percent):
+    return round(quantiles[percent - 1] * 1000, 3)
+
+
+class Command(BaseCommand):
+    help = (
+        "Time every endpoint in api/urls.py with the test client against the "
+        "current database (see seed_auctions) and print p50/p95/p99 latency "
+        "and queries per request as JSON. Writes are rolled back. With "
+        "--compare, fail if any endpoint got slower or runs more queries than "
+        "in an earlier run's JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--runs", type=int, default=50, help="Timed requests per endpoint"
+        )
+        parser.add_argument(
+            "--warmup", type=int, default=3, help="Untimed requests per endpoint first"
+        )
+        parser.add_argument(
+            "--only", action="append", help="Only time this endpoint (may be repeated)"
+        )
+        parser.add_argument("--output", help="Write the JSON here instead of stdout")
+        parser.add_argument("--compare", help="JSON from an earlier run to compare with")
+        parser.add_argument(
+            "--tolerance",
+            type=float,
+            default=0.25,
+            help="Allowed p95 slowdown against --compare, as a fraction (default: 0.25)",
+        )
+
+    def handle(self, *args, **options):
+        if options["runs"] < 2:
+            raise CommandError("--runs must be at least 2")
+        if "api.middleware.RequestMetricsMiddleware" not in settings.MIDDLEWARE:
+            raise CommandError("Queries are counted by api.middleware.RequestMetricsMiddleware")
+
+        try:
+            setup_test_environment()
+        except RuntimeError:
+            # Already set up (e.g. run from the test suite)
+            teardown = False
+        else:
+            teardown = True
+        try:
+            with transaction.atomic():
+                results = self.run(options)
+                transaction.set_rollback(True)
+        finally:
+            if teardown:
+                teardown_test_environment()
+
+        output = json.dumps(results, indent=2)
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                f.write(output + "\n")
+        else:
+            self.stdout.write(output)
+
+        if options["compare"]:
+            with open(options["compare"]) as f:
+                baseline = json.load(f)
+            regressions = self.compare(baseline, results, options["tolerance"])
+            if regressions:
+                raise CommandError(
+                    f"{len(regressions)} endpoint(s) regressed:\n" + "\n".join(regressions)
+                )
+
+    def run(self, options):
+        # The data being benchmarked against, before the fixtures are added
+        rows = {
+            "users": User.objects.count(),
+            "items": Item.objects.count(),
+            "bids": Bid.objects.count(),
+            "messages": Message.objects.count(),
+        }
+        fixtures = self.fixtures()
+        requests = self.requests(**fixtures)
+
+        for pattern in urls.urlpatterns:
+            name = pattern.name or pattern.callback.__name__
+            if name in SKIPPED or name in requests:
+                continue
+            raise CommandError(f"No benchmark request for the {name!r} endpoint")
+
+        results = {}
+        for name, (user, method, path, body) in requests.items():
+            if options["only"] and name not in options["only"]:
+                continue
+            for _ in range(options["warmup"]):
+                self.request(fixtures, user, method, path, body)
+
+            REQUEST_METRICS.reset()
+            timings = []
+            for _ in range(options["runs"]):
+                started = time.perf_counter()
+                response = self.request(fixtures, user, method, path, body)
+                timings.append(time.perf_counter() - started)
+
+            queries = [
+                histograms["queries"] for histograms in REQUEST_METRICS.views.values()
+            ]
+            quantiles = statistics.quantiles(timings, n=100, method="inclusive")
+            results[name] = {
+                "method": method,
+                "path": path,
+                "status": response.status_code,
+                "p50_ms": percentile(quantiles, 50),
+                "p95_ms": percentile(quantiles, 95),
+                "p99_ms": percentile(quantiles, 99),
+                "queries": round(
+                    sum(histogram.sum for histogram in queries)
+                    / sum(histogram.count for histogram in queries),
+                    1,
+                ),
+            }
+            self.stderr.write(
+                f"{name:<30} p50 {results[name]['p50_ms']:9.3f} ms"
+                f"   p95 {results[name]['p95_ms']:9.3f} ms"
+                f"   {results[name]['queries']:6} queries"
+            )
+
+        return {
+            "database": connection.vendor,
+            "rows": rows,
+            "runs": options["runs"],
+            "python": sys.version.split()[0],
+            "endpoints": results,
+            "skipped": SKIPPED,
+        }
+
+    def fixtures(self):
+        """Users and rows for the benchmark, rolled back with everything else"""
+
+        def user(name, create=User.objects.create_user):
+            return create(
+                first_name="Bench",
+                last_name=name.capitalize(),
+                email=f"bench-{name}@example.com",
+                date_of_birth=date(1990, 1, 1),
+                password=BENCH_PASSWORD,
+            )
+
+        owner = user("owner")
+        bidder = user("bidder")
+        admin = user("admin", User.objects.create_superuser)
+        item = Item.objects.create(
+            title="Bench item",
+            description="Item written by the benchmark",
+            owner=owner,
+            minimum_bid=10,
+            auction_end_date=date.today() + timedelta(days=7),
+        )
+        bid = Bid.objects.create(item=item, bidder=bidder, bid_amount=20)
+        message = Message.objects.create(
+            item=item, poster=bidder, message_title="Question", message_body="Still for sale?"
+        )
+
+        # Read the busiest rows, as the slowest real requests would
+        active = Item.objects.filter(auction_end_date__gte=date.today())
+        hot_item = active.exclude(owner=bidder).order_by("-bid_count").first() or item
+        busiest = (
+            Bid.objects.filter(bidder__isnull=False)
+            .values("bidder")
+            .annotate(bids=Count("id"))
+            .order_by("-bids")
+            .values("bidder")[:1]
+        )
+        heavy_bidder = User.objects.filter(pk__in=busiest).first() or bidder
+        heavy_owner = hot_item.owner or owner
+
+        return {
+            "owner": owner,
+            "bidder": bidder,
+            "admin": admin,
+            "item": item,
+            "bid": bid,
+            "message": message,
+            "hot_item": hot_item,
+            "heavy_bidder": heavy_bidder,
+            "heavy_owner": heavy_owner,
+            "clients": {},
+        }
+
+    def requests(self, owner, bidder, admin, item, bid, message, hot_item,
+                 heavy_bidder, heavy_owner, **_):
+        """
+        {endpoint: (user or None, method, path, JSON body or None)}, keyed by
+        URL name, plus any extra cases of an endpoint worth timing separately
+        """
+        next_bid = max(hot_item.current_highest_bid or 0, hot_item.minimum_bid) + 1
+        return {
+            "main_spa": (None, "GET", "/", None),
+            "login": (
+                None,
+                "POST",
+                "/login/",
+                {"email": bidder.email, "password": BENCH_PASSWORD},
+            ),
+            "signup": (
+                None,
+                "POST",
+                "/signup/",
+                {
+                    "first_name": "New",
+                    "last_name": "User",
+                    "email": "bench-signup@example.com",
+                    "password": BENCH_PASSWORD,
+                    "date_of_birth": "1990-01-01",
+                },
+            ),
+            "user_profile": (bidder, "GET", "/profile/", None),
+            "update_user_profile": (bidder, "PUT", "/profile/update/", {"first_name": "Ben"}),
+            # The home page's first page, and the search box
+            "get_items": (None, "GET", "/items/?start=0&end=20", None),
+            "get_items (search)": (
+                None,
+                "GET",
+                "/items/?search=vintage&start=0&end=5",
+                None,
+            ),
+            "create_item": (
+                owner,
+                "POST",
+                "/items/create/",
+                {
+                    "title": "Bench lamp",
+                    "description": "Created by the benchmark",
+                    "minimum_bid": 10,
+                    "auction_end_date": str(date.today() + timedelta(days=7)),
+                },
+            ),
+            "get_item_by_id": (bidder, "GET", f"/items/{hot_item.id}/", None),
+            "update_item": (owner, "PUT", f"/items/{item.id}/update/", {"title": "Renamed"}),
+            "delete_item": (owner, "DELETE", f"/items/{item.id}/delete/", None),
+            "get_user_items": (admin, "GET", f"/users/{heavy_owner.id}/items/", None),
+            "get_my_items": (heavy_owner, "GET", "/users/me/items/", None),
+            "create_bid": (
+                bidder,
+                "POST",
+                "/bids/create/",
+                {"item_id": hot_item.id, "bid_amount": next_bid},
+            ),
+            "delete_bid": (bidder, "DELETE", f"/bids/{bid.id}/delete/", None),
+            "get_user_bids": (admin, "GET", f"/users/{heavy_bidder.id}/bids/", None),
+            "get_my_bids": (heavy_bidder, "GET", "/users/me/bids/", None),
+            "get_item_bids": (bidder, "GET", f"/items/{hot_item.id}/bids/", None),
+            "get_user_bidded_items": (
+                admin,
+                "GET",
+                f"/users/{heavy_bidder.id}/bidded-items/",
+                None,
+            ),
+            "get_my_bidded_items": (heavy_bidder, "GET", "/users/me/bidded-items/", None),
+            "create_message": (
+                bidder,
+                "POST",
+                "/messages/create/",
+                {
+                    "item_id": hot_item.id,
+                    "message_title": "Question",
+                    "message_body": "Does it come with the box?",
+                },
+            ),
+            "get_item_messages": (bidder, "GET", f"/items/{hot_item.id}/messages/", None),
+            "update_message": (
+                bidder,
+                "PUT",
+                f"/messages/{message.id}/update/",
+                {"message_body": "Still for sale? Thanks"},
+            ),
+            "delete_message": (bidder, "DELETE", f"/messages/{message.id}/delete/", None),
+            "get_cache_stats": (admin, "GET", "/stats/cache/", None),
+            "get_metrics": (admin, "GET", "/metrics/", None),
+        }
+
+    def request(self, fixtures, user, method, path, body):
+        if user is None:
+            # A new client each time, so logging in doesn't stick
+            client = Client()
+        else:
+            client = fixtures["clients"].get(user.pk)
+            if client is None:
+                client = fixtures["clients"][user.pk] = Client()
+                client.force_login(user)
+
+        kwargs = {}
+        if body is not None:
+            kwargs = {"data": json.dumps(body), "content_type": "application/json"}
+        if method == "GET":
+            return client.get(path, **kwargs)
+
+        # Undo the write, so every run does the same work
+        with transaction.atomic():
+            response = client.generic(method, path, **kwargs)
+            transaction.set_rollback(True)
+        return response
+
+    def compare(self, baseline, results, tolerance):
+        regressions = []
+        for name, result in results["endpoints"].items():
+            before = baseline.get("endpoints", {}).get(name)
+            if before is None:
+                continue
+            if result["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+                regressions.append(
+                    f"  {name}: p95 {before['p95_ms']} ms -> {result['p95_ms']} ms"
+                )
+            if result["queries"] > before["queries"]:
+                regressions.append(
+                    f"  {name}: {before['queries']} -> {result['queries']} queries"
+                )
+        return regressions
@@ -0,0 +1,125 @@
+import io
+import multiprocessing
+import random
+import resource
+import statistics
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from PIL import Image
+
+from api import images
+
+
+def render_full_decode(data, limit):
+    # The processing before draft decoding: verify, re-open, convert and
+    # composite at full size, then shrink
+    Image.open(io.BytesIO(data)).verify()
+    image = Image.open(io.BytesIO(data))
+    if image.mode in ("RGBA", "LA", "P"):
+        background = Image.new("RGB", image.size, (255, 255, 255))
+        if image.mode == "P":
+            image = image.convert("RGBA")
+        background.paste(image, mask=image.split()[-1] if image.mode == "RGBA" else None)
+        image = background
+    elif image.mode != "RGB":
+        image = image.convert("RGB")
+    image.thumbnail((images.MAX_DIMENSION, images.MAX_DIMENSION), Image.Resampling.LANCZOS)
+    return images.encode(image, "JPEG")
+
+
+PATHS = {
+    "full decode": render_full_decode,
+    "draft/reduce": lambda data, limit: images.render_image(data, limit=limit),
+}
+
+
+def peak_rss_kb():
+    # ru_maxrss survives exec, so a spawned child would report its parent's
+    # peak; Linux's VmHWM starts afresh
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, kilobytes elsewhere
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+
+def measure(path, data, repeat):
+    # Runs in a fresh process so its peak RSS belongs to this path alone
+    render = PATHS[path]
+    baseline = peak_rss_kb()
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        render(data, images.MAX_PIXELS)
+        timings.append(time.perf_counter() - started)
+    return baseline, peak_rss_kb(), timings
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark latency and peak memory of processing one uploaded photo, "
+        "decoding at full size versus draft/reduce-on-load decoding."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--megapixels",
+            default="2,12,24",
+            help="Comma-separated photo sizes to benchmark (default: 2,12,24)",
+        )
+        parser.add_argument(
+            "--format",
+            choices=["JPEG", "PNG"],
+            default="JPEG",
+            help="Upload format; PNGs are RGBA, to include alpha flattening",
+        )
+        parser.add_argument("--repeat", type=int, default=5, help="Timed runs per path")
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        context = multiprocessing.get_context("spawn")
+
+        for megapixels in [float(size) for size in options["megapixels"].split(",")]:
+            data, size = self.make_photo(rng, megapixels, options["format"])
+            self.stdout.write(
+                f"\n{size[0]}x{size[1]} {options['format']}, "
+                f"{len(data) / 1024 / 1024:.1f} MB"
+            )
+            for path in PATHS:
+                with ProcessPoolExecutor(1, mp_context=context) as pool:
+                    baseline, peak, timings = pool.submit(
+                        measure, path, data, options["repeat"]
+                    ).result()
+                self.stdout.write(
+                    f"  {path:<14} p50 {statistics.median(timings) * 1000:8.1f} ms"
+                    f"   max {max(timings) * 1000:8.1f} ms"
+                    f"   peak RSS +{(peak - baseline) / 1024:7.1f} MB"
+                )
+
+    def make_photo(self, rng, megapixels, image_format):
+        # 3:2 like a phone camera, with noise so it compresses like a photo
+        height = int((megapixels * 1_000_000 / 1.5) ** 0.5)
+        size = (int(height * 1.5), height)
+        seed = Image.effect_noise((size[0] // 8, size[1] // 8), 60 + rng.random() * 20)
+        base = Image.merge(
+            "RGB",
+            [
+                Image.linear_gradient("L").resize(size),
+                seed.resize(size, Image.Resampling.BICUBIC),
+                Image.effect_noise(size, 30),
+            ],
+        )
+        if image_format == "PNG":
+            base.putalpha(Image.linear_gradient("L").resize(size))
+        output = io.BytesIO()
+        base.save(output, image_format, quality=90)
+        return output.getvalue(), size
@@ -0,0 +1,129 @@
+import json
+import random
+import statistics
+import time
+from datetime import date, datetime, timedelta, timezone
+
+from django.core.management.base import BaseCommand
+from django.core.serializers.json import DjangoJSONEncoder
+from django.test import RequestFactory
+
+from api import responses
+from api.serializers import ITEM_LIST_FIELDS, ItemSerializer
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark serializing and JSON-encoding an items listing page with "
+        "each available JSON encoder. No database access."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes",
+            default="20,100,1000",
+            help="Comma-separated page sizes to benchmark (default: 20,100,1000)",
+        )
+        parser.add_argument(
+            "--repeat", type=int, default=200, help="Timed runs per page size"
+        )
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        serializer = ItemSerializer(RequestFactory().get("/items/"), ITEM_LIST_FIELDS)
+
+        encoders = [
+            ("django json (isoformat)", self.encode_django),
+            ("stdlib json", self.encode_stdlib),
+        ]
+        if responses.orjson is not None:
+            encoders.append(("orjson", self.encode_orjson))
+        if responses.msgspec is not None:
+            encoders.append(("msgspec", self.encode_msgspec))
+
+        self.stdout.write(f"JsonResponse backend in use: {responses.JSON_BACKEND}")
+        for size in [int(size) for size in options["sizes"].split(",")]:
+            rows = self.make_rows(rng, size)
+            self.stdout.write(f"\npage size {size}")
+            for name, encode in encoders:
+                timings = []
+                for _ in range(options["repeat"]):
+                    started = time.perf_counter()
+                    encode(serializer, rows)
+                    timings.append(time.perf_counter() - started)
+                self.stdout.write(
+                    f"  {name:<25} p50 {statistics.median(timings) * 1000:8.3f} ms"
+                    f"   max {max(timings) * 1000:8.3f} ms"
+                )
+
+    def make_rows(self, rng, size):
+        # .values() rows as get_paginated_items fetches them
+        created_at = datetime(2026, 1, 1, tzinfo=timezone.utc)
+        rows = []
+        for item_id in range(size, 0, -1):
+            has_winner = rng.random() < 0.2
+            rows.append(
+                {
+                    "id": item_id,
+                    "title": f"Item {item_id} vintage watch",
+                    "description": "Beautiful vintage watch in great condition. " * 5,
+                    "minimum_bid": rng.randint(1, 500),
+                    "auction_end_date": date(2026, 6, 1)
+                    + timedelta(days=rng.randint(0, 60)),
+                    "created_at": created_at
+                    - timedelta(seconds=item_id, microseconds=rng.randint(0, 999999)),
+                    "owner_id": 1,
+                    "owner__first_name": "Test",
+                    "owner__last_name": "User",
+                    "owner__email": "test@example.com",
+                    "auction_winner_id": 2 if has_winner else None,
+                    "auction_winner__first_name": "Win" if has_winner else None,
+                    "auction_winner__last_name": "Ner" if has_winner else None,
+                    "item_image": f"item_pictures/item_{item_id}.jpg",
+                    "item_image_status": "ready",
+                    "item_image_renditions": {
+                        extension: {
+                            str(width): f"renditions/{item_id:064x}/{width}.{extension}"
+                            for width in (160, 400, 1024)
+                        }
+                        for extension in ("jpg", "webp")
+                    },
+                    "current_highest_bid": rng.choice([None, rng.randint(1, 1000)]),
+                    "bid_count": rng.randint(0, 30),
+                }
+            )
+        return rows
+
+    def page(self, serializer, rows):
+        return {
+            "success": True,
+            "items": [serializer.serialize(row) for row in rows],
+            "count": len(rows),
+            "total_count": len(rows),
+            "next_cursor": None,
+        }
+
+    def encode_django(self, serializer, rows):
+        # What views did before api.responses: format every date by hand and
+        # encode with django.http.JsonResponse's DjangoJSONEncoder
+        data = self.page(serializer, rows)
+        for item in data["items"]:
+            item["auction_end_date"] = str(item["auction_end_date"])
+            item["created_at"] = item["created_at"].isoformat()
+        return json.dumps(data, cls=DjangoJSONEncoder).encode()
+
+    def encode_stdlib(self, serializer, rows):
+        return json.dumps(
+            self.page(serializer, rows), cls=responses.StdlibJSONEncoder
+        ).encode()
+
+    def encode_orjson(self, serializer, rows):
+        return responses.orjson.dumps(
+            self.page(serializer, rows), default=responses.encode_default
+        )
+
+    def encode_msgspec(self, serializer, rows):
+        return responses.msgspec.json.encode(
+            self.page(serializer, rows), enc_hook=responses.encode_default
+        )
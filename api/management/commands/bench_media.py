@@ -0,0 +1,202 @@
+import http.client
+import random
+import shutil
+import statistics
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+from django.test import RequestFactory
+from django.test.utils import override_settings
+from django.urls import re_path
+from django.utils.http import http_date
+from django.views.static import serve
+
+from api.media import serve_media
+
+
+def static_serve(request, path):
+    from django.conf import settings
+
+    return serve(request, path, document_root=settings.MEDIA_ROOT)
+
+
+# URLconf for the benchmark server: both views side by side
+urlpatterns = [
+    re_path(r"^static-serve/(?P<path>.*)$", static_serve),
+    re_path(r"^media/(?P<path>.*)$", serve_media),
+]
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Load test media serving: requests/sec and latency of "
+        "django.views.static.serve against api.media.serve_media (in each "
+        "MEDIA_SERVING mode) through a local threaded HTTP server. Uses a "
+        "temporary MEDIA_ROOT."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--files", type=int, default=200, help="Files to serve")
+        parser.add_argument(
+            "--size", type=int, default=60, help="File size in KB (default: 60)"
+        )
+        parser.add_argument(
+            "--requests", type=int, default=2000, help="Requests per scenario"
+        )
+        parser.add_argument(
+            "--concurrency", type=int, default=8, help="Concurrent clients"
+        )
+        parser.add_argument(
+            "--revalidate",
+            type=float,
+            default=0.5,
+            help="Share of requests that revalidate a copy they already have "
+            "(If-None-Match / If-Modified-Since) (default: 0.5)",
+        )
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        media_root = tempfile.mkdtemp()
+        try:
+            with override_settings(
+                MEDIA_ROOT=media_root,
+                ROOT_URLCONF=__name__,
+                DEBUG=False,
+                ALLOWED_HOSTS=["*"],
+            ):
+                self.run(options)
+        finally:
+            shutil.rmtree(media_root)
+
+    def run(self, options):
+        rng = random.Random(options["seed"])
+        names = []
+        for _ in range(options["files"]):
+            # Written straight to disk: no MediaBlob rows in the real database
+            content = ContentFile(rng.randbytes(options["size"] * 1024))
+            name = default_storage.content_name("item_pictures/photo.jpg", content)
+            default_storage.write(name, content)
+            names.append(name)
+
+        server = ThreadedWSGIServer(("127.0.0.1", 0), QuietRequestHandler)
+        server.set_app(WSGIHandler())
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        port = server.server_address[1]
+        self.stdout.write(
+            f"{len(names)} files of {options['size']} KB, {options['requests']} "
+            f"requests per scenario, {options['concurrency']} clients, "
+            f"{options['revalidate']:.0%} revalidating"
+        )
+
+        scenarios = [
+            ("django.views.static.serve", "/static-serve/", "python"),
+            ("serve_media (python)", "/media/", "python"),
+            ("serve_media (x-accel-redirect)", "/media/", "x-accel-redirect"),
+        ]
+        self.stdout.write("\nThrough HTTP (includes the test server and clients):")
+        try:
+            for label, prefix, mode in scenarios:
+                plan = [
+                    (rng.choice(names), rng.random() < options["revalidate"])
+                    for _ in range(options["requests"])
+                ]
+                with override_settings(MEDIA_SERVING=mode):
+                    validators = self.validators(port, prefix, names)
+                    self.report(label, self.load(port, prefix, plan, validators, options))
+        finally:
+            server.shutdown()
+            server.server_close()
+
+        self.stdout.write("\nView only, no HTTP (full response consumed):")
+        views = [
+            ("django.views.static.serve", static_serve, "python"),
+            ("serve_media (python)", serve_media, "python"),
+            ("serve_media (x-accel-redirect)", serve_media, "x-accel-redirect"),
+        ]
+        factory = RequestFactory()
+        # Understood by both views, unlike If-None-Match
+        revalidate = {"HTTP_IF_MODIFIED_SINCE": http_date(time.time())}
+        for label, view, mode in views:
+            requests = [
+                factory.get("/", **(revalidate if rng.random() < options["revalidate"] else {}))
+                for _ in names
+            ]
+            with override_settings(MEDIA_SERVING=mode):
+                timings = []
+                for _ in range(max(options["requests"] // len(names), 1)):
+                    for request, name in zip(requests, names):
+                        started = time.perf_counter()
+                        response = view(request, name)
+                        for _ in response:
+                            pass
+                        response.close()
+                        timings.append(time.perf_counter() - started)
+            self.stdout.write(
+                f"  {label:<32} p50 {statistics.median(timings) * 1e6:7.1f} us"
+                f"   mean {statistics.mean(timings) * 1e6:7.1f} us"
+            )
+
+    def validators(self, port, prefix, names):
+        # What a client that already has each file would send back
+        validators = {}
+        for name in names:
+            status, headers, _ = self.fetch(port, prefix + name, {})
+            validators[name] = {"If-Modified-Since": headers["last-modified"]}
+            if "etag" in headers:
+                validators[name]["If-None-Match"] = headers["etag"]
+        return validators
+
+    def fetch(self, port, path, headers):
+        connection = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+        try:
+            connection.request("GET", path, headers=headers)
+            response = connection.getresponse()
+            body = response.read()
+            return (
+                response.status,
+                {name.lower(): value for name, value in response.getheaders()},
+                body,
+            )
+        finally:
+            connection.close()
+
+    def load(self, port, prefix, plan, validators, options):
+        def request(step):
+            name, revalidate = step
+            started = time.perf_counter()
+            status, _, body = self.fetch(
+                port, prefix + name, validators[name] if revalidate else {}
+            )
+            return time.perf_counter() - started, status, len(body)
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(options["concurrency"]) as pool:
+            results = list(pool.map(request, plan))
+        return time.perf_counter() - started, results
+
+    def report(self, label, measured):
+        elapsed, results = measured
+        timings = sorted(timing for timing, _, _ in results)
+        statuses = {}
+        for _, status, _ in results:
+            statuses[status] = statuses.get(status, 0) + 1
+        sent = sum(size for _, _, size in results)
+        self.stdout.write(
+            f"  {label:<32} {len(results) / elapsed:8.1f} req/s"
+            f"   p50 {statistics.median(timings) * 1000:6.2f} ms"
+            f"   p99 {timings[int(len(timings) * 0.99) - 1] * 1000:6.2f} ms"
+            f"   {sent / elapsed / 1024 / 1024:7.1f} MB/s"
+            f"   {' '.join(f'{status}x{count}' for status, count in sorted(statuses.items()))}"
+        )
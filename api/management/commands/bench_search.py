@@ -0,0 +1,117 @@
+import random
+import statistics
+import time
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from api.models import Item, User
+from api.search import PatternSearchBackend, SQLiteFTSSearchBackend
+from api.search_index import InvertedIndexSearchBackend, get_item_index, reset_item_index
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark item search backends against synthetic items. Data is "
+        "created inside a transaction that is rolled back afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes",
+            default="10000,100000,1000000",
+            help="Comma-separated item counts to benchmark (default: 10000,100000,1000000)",
+        )
+        parser.add_argument(
+            "--queries", type=int, default=20, help="Search terms per size"
+        )
+        parser.add_argument(
+            "--repeat", type=int, default=3, help="Timed runs per search term"
+        )
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        vocabulary = self.make_vocabulary(rng, 5000)
+        sizes = [int(size) for size in options["sizes"].split(",")]
+
+        backends = [("regex", PatternSearchBackend())]
+        if connection.vendor == "sqlite":
+            backends.append(("fts5", SQLiteFTSSearchBackend()))
+        backends.append(("inverted index", InvertedIndexSearchBackend()))
+
+        for size in sizes:
+            with transaction.atomic():
+                self.create_items(rng, vocabulary, size)
+                keywords = [
+                    self.pick_word(rng, vocabulary) for _ in range(options["queries"])
+                ]
+
+                reset_item_index()
+                started = time.perf_counter()
+                index = get_item_index()
+                build_seconds = time.perf_counter() - started
+
+                self.stdout.write(
+                    f"\n{size} items (inverted index: {len(index)} docs "
+                    f"built in {build_seconds:.2f}s)"
+                )
+                for name, backend in backends:
+                    timings = self.time_backend(backend, keywords, options["repeat"])
+                    self.stdout.write(
+                        f"  {name:<15} p50 {statistics.median(timings) * 1000:9.2f} ms"
+                        f"   max {max(timings) * 1000:9.2f} ms"
+                    )
+
+                reset_item_index()
+                transaction.set_rollback(True)
+
+    def make_vocabulary(self, rng, size):
+        letters = "abcdefghijklmnopqrstuvwxyz"
+        return [
+            "".join(rng.choice(letters) for _ in range(rng.randint(3, 10)))
+            for _ in range(size)
+        ]
+
+    def pick_word(self, rng, vocabulary):
+        # Zipf-like: a few words are everywhere, most are rare
+        return vocabulary[min(int(rng.paretovariate(1.1)) - 1, len(vocabulary) - 1)]
+
+    def create_items(self, rng, vocabulary, size, batch_size=5000):
+        owner = User.objects.create(
+            first_name="Bench",
+            last_name="Owner",
+            email=f"bench-owner-{rng.random()}@example.com",
+            date_of_birth=date(1990, 1, 1),
+        )
+        end_date = date.today() + timedelta(days=7)
+        for offset in range(0, size, batch_size):
+            Item.objects.bulk_create(
+                [
+                    Item(
+                        title=" ".join(
+                            self.pick_word(rng, vocabulary) for _ in range(4)
+                        ),
+                        description=" ".join(
+                            self.pick_word(rng, vocabulary) for _ in range(40)
+                        ),
+                        owner=owner,
+                        minimum_bid=10,
+                        auction_end_date=end_date,
+                    )
+                    for _ in range(min(batch_size, size - offset))
+                ]
+            )
+
+    def time_backend(self, backend, keywords, repeat):
+        items = Item.objects.filter(auction_end_date__gte=date.today()).select_related(
+            "owner", "auction_winner"
+        )
+        timings = []
+        for keyword in keywords:
+            for _ in range(repeat):
+                started = time.perf_counter()
+                backend.search_page(items, keyword, 0, 20)
+                timings.append(time.perf_counter() - started)
+        return timings
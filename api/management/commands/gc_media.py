@@ -0,0 +1,35 @@
+from datetime import timedelta
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from api.storage import collect_garbage
+
+
+class Command(BaseCommand):
+    help = (
+        "Correct media reference counts from the image columns and delete "
+        "content-addressed files that nothing references"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--grace",
+            type=int,
+            default=3600,
+            help="Leave files and counts changed in the last N seconds (default: 3600)",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Report what would be changed without changing it",
+        )
+
+    def handle(self, *args, **options):
+        stats = collect_garbage(
+            default_storage,
+            grace=timedelta(seconds=options["grace"]),
+            dry_run=options["dry_run"],
+        )
+        prefix = "Dry run, nothing changed: " if options["dry_run"] else ""
+        self.stdout.write(self.style.SUCCESS(f"{prefix}{stats}"))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from api.images import pending_jobs, run_job
+
+
+class Command(BaseCommand):
+    help = (
+        "Process every uploaded image still marked processing, e.g. after a "
+        "restart lost the background jobs"
+    )
+
+    def handle(self, *args, **options):
+        jobs = pending_jobs()
+        for job in jobs:
+            run_job(job)
+
+        self.stdout.write(self.style.SUCCESS(f"Processed {len(jobs)} image(s)"))
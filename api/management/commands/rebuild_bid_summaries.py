@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from api.models import Item
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute each item's current_highest_bid, highest_bidder and "
+        "bid_count from the Bid table"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--item",
+            type=int,
+            action="append",
+            dest="item_ids",
+            help="Only rebuild the given item id (may be repeated)",
+        )
+
+    def handle(self, *args, **options):
+        items = Item.objects.all()
+        if options["item_ids"]:
+            items = items.filter(id__in=options["item_ids"])
+
+        updated = items.rebuild_bid_summaries()
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Rebuilt bid summaries for {updated} item(s)")
+        )
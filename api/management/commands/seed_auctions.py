@@ -0,0 +1,343 @@
+import bisect
+import itertools
+import random
+import time
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import F, Max
+from django.utils import timezone
+
+from api.caching import bump_listing
+from api.models import Bid, Item, Message, User
+
+# Seeded users' emails end with this, so --flush can find them again
+SEED_DOMAIN = "@seed.example.com"
+
+FIRST_NAMES = (
+    "Alice", "Amir", "Ben", "Chloe", "Dara", "Elena", "Femi", "Grace", "Hiro",
+    "Isla", "Jonas", "Kemi", "Liam", "Maya", "Noor", "Oscar", "Priya", "Quinn",
+    "Rosa", "Sam", "Tariq", "Uma", "Victor", "Wen", "Yusuf", "Zoe",
+)
+LAST_NAMES = (
+    "Adams", "Bianchi", "Chen", "Davies", "Evans", "Fischer", "Garcia", "Hughes",
+    "Ito", "Jones", "Khan", "Lopez", "Murphy", "Nowak", "Okafor", "Patel",
+    "Rossi", "Smith", "Taylor", "Walsh", "Wright", "Young",
+)
+ADJECTIVES = (
+    "vintage", "antique", "rare", "signed", "restored", "handmade", "original",
+    "mint", "boxed", "retro", "Victorian", "art deco", "limited edition",
+    "mid-century", "hand-painted", "brass", "oak", "silver", "leather", "ceramic",
+)
+NOUNS = (
+    "watch", "camera", "guitar", "record player", "clock", "lamp", "chair",
+    "mirror", "typewriter", "bicycle", "vase", "print", "radio", "teapot",
+    "desk", "map", "telescope", "sewing machine", "jacket", "first edition",
+)
+PHRASES = (
+    "in great condition",
+    "a few signs of wear",
+    "fully working",
+    "collection only",
+    "comes with original packaging",
+    "from a smoke-free home",
+    "recently serviced",
+    "minor scratches on the back",
+    "a real conversation piece",
+    "sold as seen",
+)
+QUESTIONS = (
+    "Is this still available?",
+    "Can you post it?",
+    "Any damage not shown in the photo?",
+    "Does it come with the box?",
+    "Would you take an offer?",
+    "How old is it?",
+    "Where can I collect from?",
+    "Is it fully working?",
+)
+ANSWERS = (
+    "Yes, it is.",
+    "Collection only, sorry.",
+    "No damage apart from what's described.",
+    "It does, in good shape too.",
+    "Please bid through the auction.",
+    "About forty years old.",
+    "I can post it at cost.",
+    "Tested last week, works fine.",
+)
+# Share of messages at each depth: thread starters, replies, replies to replies
+THREAD_DEPTHS = (0.45, 0.35, 0.2)
+
+
+def popularity(rng, size, shape):
+    """Cumulative power-law weights for size things: a few get most of the activity"""
+    return list(itertools.accumulate(rng.paretovariate(shape) for _ in range(size)))
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(itertools.islice(iterator, size)):
+        yield batch
+
+
+@contextmanager
+def historical_timestamps(*fields):
+    """Let bulk_create() keep the given auto_now_add fields' values"""
+    saved = [field.auto_now_add for field in fields]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now_add in zip(fields, saved):
+            field.auto_now_add = auto_now_add
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill the database with synthetic users, items, bid histories and "
+        "message threads for load testing. Bids and messages go mostly to a "
+        "few popular items and active users, as they do on a real auction "
+        "site. Seeded users can log in with --password."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument("--items", type=int, default=10000)
+        parser.add_argument("--bids", type=int, default=100000)
+        parser.add_argument("--messages", type=int, default=20000)
+        parser.add_argument(
+            "--batch-size", type=int, default=5000, help="Rows per bulk_create"
+        )
+        parser.add_argument(
+            "--shape",
+            type=float,
+            default=1.2,
+            help="Pareto shape of item and user popularity; lower is more skewed",
+        )
+        parser.add_argument("--password", default="seedpass")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--flush",
+            action="store_true",
+            help="Delete previously seeded users and their items first",
+        )
+
+    def handle(self, *args, **options):
+        if options["users"] < 2 and (options["bids"] or options["messages"]):
+            raise CommandError("Bids and messages need at least 2 users")
+        if options["items"] < 1 and (options["bids"] or options["messages"]):
+            raise CommandError("Bids and messages need at least 1 item")
+
+        self.rng = random.Random(options["seed"])
+        self.batch_size = options["batch_size"]
+        self.now = timezone.now()
+
+        if options["flush"]:
+            self.flush()
+
+        user_ids = self.create_users(options["users"], options["password"])
+        user_weights = popularity(self.rng, len(user_ids), options["shape"])
+        items = self.create_items(options["items"], user_ids)
+        item_weights = popularity(self.rng, len(items), options["shape"])
+        self.create_bids(options["bids"], items, item_weights, user_ids, user_weights)
+        self.create_messages(
+            options["messages"], items, item_weights, user_ids, user_weights
+        )
+
+        # bulk_create() skips the signals that drop cached listing pages
+        bump_listing()
+        self.stdout.write(self.style.SUCCESS("Done"))
+
+    def step(self, label, count, create):
+        started = time.perf_counter()
+        result = create()
+        seconds = time.perf_counter() - started
+        self.stdout.write(
+            f"{label:<10} {count:>10} in {seconds:7.2f}s"
+            f" ({count / seconds if seconds else 0:,.0f}/s)"
+        )
+        return result
+
+    def flush(self):
+        seeded = User.objects.filter(email__endswith=SEED_DOMAIN)
+        with transaction.atomic():
+            deleted = sum(
+                queryset.delete()[0]
+                for queryset in (
+                    Bid.objects.filter(bidder__in=seeded),
+                    Message.objects.filter(poster__in=seeded),
+                    Item.objects.filter(owner__in=seeded),
+                    seeded,
+                )
+            )
+            # The bids went without Bid.delete(), which keeps these up to date
+            Item.objects.rebuild_bid_summaries()
+        self.stdout.write(f"Flushed {deleted} seeded rows")
+
+    def new_ids(self, model, before):
+        return model.objects.filter(id__gt=before).order_by("id")
+
+    def last_id(self, model):
+        return model.objects.aggregate(last=Max("id"))["last"] or 0
+
+    def create_users(self, count, password):
+        rng = self.rng
+        # One hash for everyone; hashing each password would take longer than the rest
+        password = make_password(password)
+        first = User.objects.filter(email__endswith=SEED_DOMAIN).count()
+        before = self.last_id(User)
+
+        def create():
+            for batch in batched(range(first, first + count), self.batch_size):
+                User.objects.bulk_create(
+                    User(
+                        first_name=rng.choice(FIRST_NAMES),
+                        last_name=rng.choice(LAST_NAMES),
+                        email=f"user{number}{SEED_DOMAIN}",
+                        date_of_birth=date(1950, 1, 1)
+                        + timedelta(days=rng.randint(0, 365 * 55)),
+                        password=password,
+                    )
+                    for number in batch
+                )
+            return list(self.new_ids(User, before).values_list("id", flat=True))
+
+        return self.step("users", count, create)
+
+    def create_items(self, count, user_ids):
+        rng = self.rng
+        before = self.last_id(Item)
+
+        def make_item():
+            # Listed over the last 60 days for 1 to 30 days, so some have ended
+            created_at = self.now - timedelta(seconds=rng.randint(0, 60 * 86400))
+            title = f"{rng.choice(ADJECTIVES).capitalize()} {rng.choice(NOUNS)}"
+            return Item(
+                title=title,
+                description=f"{title}, "
+                + ", ".join(rng.sample(PHRASES, rng.randint(1, 4)))
+                + ".",
+                owner_id=rng.choice(user_ids),
+                minimum_bid=rng.choice((1, 5, 10, 20, 50, 100, 250)),
+                auction_end_date=created_at.date()
+                + timedelta(days=rng.randint(1, 30)),
+                created_at=created_at,
+            )
+
+        def create():
+            with historical_timestamps(Item._meta.get_field("created_at")):
+                for batch in batched(range(count), self.batch_size):
+                    Item.objects.bulk_create(make_item() for _ in batch)
+            return list(
+                self.new_ids(Item, before).values_list(
+                    "id", "owner_id", "minimum_bid", "created_at", "auction_end_date"
+                )
+            )
+
+        return self.step("items", count, create)
+
+    def create_bids(self, count, items, item_weights, user_ids, user_weights):
+        if not count:
+            return
+        rng = self.rng
+        before = self.last_id(Bid)
+        total_weight = item_weights[-1]
+        # Each item's bidding so far: (highest amount, time of the last bid,
+        # close of bidding, mean time between bids)
+        state = {}
+
+        def make_bid():
+            index = bisect.bisect(item_weights, rng.random() * total_weight)
+            item_id, owner_id, minimum_bid, created_at, end_date = items[index]
+            if index in state:
+                amount, last, closes, spacing = state[index]
+            else:
+                amount, last = minimum_bid - 1, created_at
+                closes = min(
+                    timezone.make_aware(datetime.combine(end_date, datetime.max.time())),
+                    self.now,
+                )
+                # Spread the item's expected share of the bids over its auction
+                weight = item_weights[index] - (item_weights[index - 1] if index else 0)
+                spacing = (closes - created_at) / (count * weight / total_weight + 1)
+            last = min(last + spacing * rng.expovariate(1), closes)
+            amount += rng.choice((1, 1, 2, 5, 5, 10, 25)) * max(minimum_bid // 10, 1)
+            state[index] = (amount, last, closes, spacing)
+
+            bidder_id = owner_id
+            while bidder_id == owner_id:
+                bidder_id = rng.choices(user_ids, cum_weights=user_weights)[0]
+            return Bid(
+                item_id=item_id, bidder_id=bidder_id, bid_amount=amount, created_at=last
+            )
+
+        def create():
+            with historical_timestamps(Bid._meta.get_field("created_at")):
+                for batch in batched(range(count), self.batch_size):
+                    Bid.objects.bulk_create(make_bid() for _ in batch)
+            # bulk_create() skips Bid.save(), which keeps these up to date
+            bidded = Item.objects.filter(id__gt=items[0][0] - 1)
+            bidded.rebuild_bid_summaries()
+            bidded.filter(auction_end_date__lt=date.today()).update(
+                auction_winner=F("highest_bidder")
+            )
+
+        self.step("bids", count, create)
+
+    def create_messages(self, count, items, item_weights, user_ids, user_weights):
+        if not count:
+            return
+        rng = self.rng
+        total_weight = item_weights[-1]
+
+        def make_thread():
+            index = bisect.bisect(item_weights, rng.random() * total_weight)
+            item_id, _, _, created_at, _ = items[index]
+            return Message(
+                item_id=item_id,
+                poster_id=rng.choices(user_ids, cum_weights=user_weights)[0],
+                message_title=rng.choice(QUESTIONS),
+                message_body=f"{rng.choice(QUESTIONS)} {rng.choice(PHRASES).capitalize()}?",
+                created_at=created_at + (self.now - created_at) * rng.random(),
+            )
+
+        def make_reply(parent):
+            parent_id, item_id, owner_id, created_at = parent
+            # Mostly the seller answering
+            poster_id = (
+                owner_id
+                if owner_id and rng.random() < 0.7
+                else rng.choices(user_ids, cum_weights=user_weights)[0]
+            )
+            return Message(
+                item_id=item_id,
+                replying_to_id=parent_id,
+                poster_id=poster_id,
+                message_title="Re: question",
+                message_body=rng.choice(ANSWERS),
+                created_at=created_at + (self.now - created_at) * rng.random(),
+            )
+
+        def create():
+            replies = [round(count * share) for share in THREAD_DEPTHS[1:]]
+            parents = None
+            with historical_timestamps(Message._meta.get_field("created_at")):
+                for depth, level_count in enumerate([count - sum(replies), *replies]):
+                    before = self.last_id(Message)
+                    for batch in batched(range(level_count), self.batch_size):
+                        Message.objects.bulk_create(
+                            make_thread() if depth == 0 else make_reply(rng.choice(parents))
+                            for _ in batch
+                        )
+                    parents = list(
+                        self.new_ids(Message, before).values_list(
+                            "id", "item_id", "item__owner_id", "created_at"
+                        )
+                    )
+
+        self.step("messages", count, create)
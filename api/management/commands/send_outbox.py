@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from api.outbox import DEFAULT_BATCH_SIZE, send_outbox
+
+
+class Command(BaseCommand):
+    help = "Send the emails waiting in the outbox over one mail connection"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help=f"Emails claimed per batch (default: {DEFAULT_BATCH_SIZE})",
+        )
+        parser.add_argument(
+            "--max-batches",
+            type=int,
+            help="Stop after this many batches (default: until the outbox is empty)",
+        )
+
+    def handle(self, *args, **options):
+        stats = send_outbox(
+            batch_size=options["batch_size"], max_batches=options["max_batches"]
+        )
+        self.stdout.write(self.style.SUCCESS(f"Email outbox: {stats}"))
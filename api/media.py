@@ -0,0 +1,296 @@
+"""
+Serving uploaded media.
+
+serve_media() replaces django.views.static.serve for MEDIA_URL. Each file's
+metadata (path, size, modification time, ETag, content type) comes from an
+in-memory index, so a request for a known file costs no stat() or mimetype
+lookup. Content-addressed files (see api.storage) never change: their index
+entries are kept (up to MEDIA_INDEX_SIZE of them), their ETag is their hash
+and they are sent with a year-long, immutable Cache-Control. Files under
+older, per-object names are stat()ed on every request and sent with
+``no-cache`` so clients revalidate them.
+
+Conditional requests (If-None-Match / If-Modified-Since) get a 304 and single
+byte ranges a 206, or a 416 if the range is unsatisfiable.
+
+MEDIA_SERVING picks who sends the bytes:
+
+- ``"python"`` (default): Django streams the file. Under WSGI servers whole
+  files go out through wsgi.file_wrapper (sendfile). ASGI has no equivalent,
+  and Django reads a synchronous stream into memory before sending it over
+  ASGI, so under the Procfile's uvicorn workers the file is instead read
+  ASYNC_CHUNK_SIZE bytes at a time off the event loop and streamed as it's
+  read. That still passes every byte through Python; in production prefer
+  one of the front end modes below.
+- ``"x-accel-redirect"``: nginx sends it. The response carries an
+  ``X-Accel-Redirect`` header of MEDIA_ACCEL_REDIRECT_PREFIX plus the file's
+  name, which needs an ``internal`` nginx location aliased to MEDIA_ROOT.
+- ``"x-sendfile"``: Apache (mod_xsendfile) or lighttpd sends it, from the
+  absolute path in an ``X-Sendfile`` header.
+"""
+
+import mimetypes
+import os
+import posixpath
+import re
+import stat
+import threading
+from email.utils import parsedate_to_datetime
+from urllib.parse import quote
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.handlers.asgi import ASGIRequest
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+from .storage import is_content_name
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+MUTABLE_CACHE_CONTROL = "no-cache"
+
+RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+# Bytes per read when streaming a file under ASGI; each read is a trip to a
+# worker thread, so larger than FileResponse's block size
+ASYNC_CHUNK_SIZE = 64 * 1024
+
+
+class MediaFile:
+    """What the index knows about one file"""
+
+    __slots__ = ("path", "size", "mtime", "etag", "content_type", "encoding", "immutable")
+
+    def __init__(self, path, size, mtime, etag, content_type, encoding, immutable):
+        self.path = path
+        self.size = size
+        self.mtime = mtime
+        self.etag = etag
+        self.content_type = content_type
+        self.encoding = encoding
+        self.immutable = immutable
+
+
+class MediaIndex:
+    """
+    Metadata for the files under root, looked up by media-relative name.
+    Only immutable (content-addressed) files are remembered.
+    """
+
+    def __init__(self, root, max_entries):
+        self.root = root
+        self.max_entries = max_entries
+        self.files = {}
+        self.lock = threading.Lock()
+
+    def get(self, name):
+        """The MediaFile for name; raises Http404 if there's no such file"""
+        media_file = self.files.get(name)
+        if media_file is not None:
+            return media_file
+
+        media_file = self.stat(name)
+        if media_file.immutable:
+            with self.lock:
+                if len(self.files) >= self.max_entries:
+                    # Oldest first
+                    del self.files[next(iter(self.files))]
+                self.files[name] = media_file
+        return media_file
+
+    def forget(self, name):
+        with self.lock:
+            self.files.pop(name, None)
+
+    def stat(self, name):
+        try:
+            path = safe_join(self.root, name)
+            stat_result = os.stat(path)
+        except (SuspiciousFileOperation, OSError, ValueError):
+            raise Http404("No such media file")
+        if not stat.S_ISREG(stat_result.st_mode):
+            raise Http404("No such media file")
+
+        immutable = is_content_name(name)
+        if immutable:
+            # The file's SHA-256, from its name
+            etag = f'"{posixpath.basename(name).split(".")[0]}"'
+        else:
+            etag = f'W/"{stat_result.st_mtime_ns:x}-{stat_result.st_size:x}"'
+        content_type, encoding = mimetypes.guess_type(path)
+        return MediaFile(
+            path=path,
+            size=stat_result.st_size,
+            mtime=int(stat_result.st_mtime),
+            etag=etag,
+            content_type=content_type or "application/octet-stream",
+            encoding=encoding,
+            immutable=immutable,
+        )
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index():
+    global _index
+    root = str(settings.MEDIA_ROOT)
+    with _index_lock:
+        if _index is None or _index.root != root:
+            _index = MediaIndex(root, getattr(settings, "MEDIA_INDEX_SIZE", 10000))
+        return _index
+
+
+class FileRange:
+    """Read-only view of length bytes of file from start, for FileResponse"""
+
+    def __init__(self, file, start, length):
+        file.seek(start)
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+async def read_chunks(file, chunk_size=ASYNC_CHUNK_SIZE):
+    """The rest of file as an async iterator, read on worker threads"""
+    read = sync_to_async(file.read, thread_sensitive=False)
+    try:
+        while chunk := await read(chunk_size):
+            yield chunk
+    finally:
+        file.close()
+
+
+def parse_range(header, size):
+    """
+    (start, length) for a single "bytes=" range, None to send the whole file
+    (no or unsupported Range), or raise ValueError if it can't be satisfied.
+    """
+    match = RANGE.match(header.strip()) if header else None
+    if match is None:
+        # Multiple ranges are allowed to be answered with the whole file
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Suffix range: the last N bytes
+        length = min(int(last), size)
+        if not length:
+            raise ValueError
+        return size - length, length
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or end < start:
+        raise ValueError
+    return start, end - start + 1
+
+
+def range_applies(request, media_file):
+    # If-Range: only honour the range if the client's copy is still current
+    if_range = request.headers.get("If-Range")
+    if not if_range:
+        return True
+    if if_range.startswith('"'):
+        return if_range == media_file.etag
+    try:
+        return int(parsedate_to_datetime(if_range).timestamp()) == media_file.mtime
+    except (TypeError, ValueError):
+        return False
+
+
+def serve_media(request, path):
+    if request.method not in ("GET", "HEAD"):
+        response = HttpResponse(status=405)
+        response["Allow"] = "GET, HEAD"
+        return response
+
+    index = get_index()
+    media_file = index.get(path)
+    headers = {
+        "ETag": media_file.etag,
+        "Last-Modified": http_date(media_file.mtime),
+        "Cache-Control": IMMUTABLE_CACHE_CONTROL
+        if media_file.immutable
+        else MUTABLE_CACHE_CONTROL,
+    }
+
+    not_modified = get_conditional_response(
+        request, etag=media_file.etag, last_modified=media_file.mtime
+    )
+    if not_modified is not None:
+        for header, value in headers.items():
+            not_modified[header] = value
+        return not_modified
+
+    mode = getattr(settings, "MEDIA_SERVING", "python")
+    if mode == "x-accel-redirect":
+        prefix = getattr(settings, "MEDIA_ACCEL_REDIRECT_PREFIX", "/protected-media/")
+        response = HttpResponse(content_type=media_file.content_type)
+        response["X-Accel-Redirect"] = prefix + quote(path)
+    elif mode == "x-sendfile":
+        response = HttpResponse(content_type=media_file.content_type)
+        response["X-Sendfile"] = media_file.path
+    else:
+        response = send_file(request, media_file, index, path)
+
+    for header, value in headers.items():
+        response[header] = value
+    if media_file.encoding:
+        response["Content-Encoding"] = media_file.encoding
+    return response
+
+
+def send_file(request, media_file, index, path):
+    try:
+        byte_range = parse_range(request.headers.get("Range"), media_file.size)
+    except ValueError:
+        response = HttpResponse(status=416)
+        response["Content-Range"] = f"bytes */{media_file.size}"
+        return response
+    if byte_range is not None and not range_applies(request, media_file):
+        byte_range = None
+
+    try:
+        file = open(media_file.path, "rb")
+    except OSError:
+        # Deleted since it was indexed
+        index.forget(path)
+        raise Http404("No such media file")
+
+    if request.method == "HEAD":
+        file.close()
+        response = HttpResponse(content_type=media_file.content_type)
+        response["Content-Length"] = media_file.size
+        response["Accept-Ranges"] = "bytes"
+        return response
+
+    length = media_file.size
+    if byte_range is not None:
+        start, length = byte_range
+        file = FileRange(file, start, length)
+    if isinstance(request, ASGIRequest):
+        response = StreamingHttpResponse(
+            read_chunks(file), content_type=media_file.content_type
+        )
+    else:
+        response = FileResponse(file, content_type=media_file.content_type)
+    response["Content-Length"] = length
+    if byte_range is not None:
+        response.status_code = 206
+        response["Content-Range"] = f"bytes {start}-{start + length - 1}/{media_file.size}"
+    response["Accept-Ranges"] = "bytes"
+    return response
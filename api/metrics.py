@@ -0,0 +1,252 @@
+"""
+Per-view request metrics, exported in the Prometheus text format.
+
+RequestMetricsMiddleware (api.middleware) traces every request: how long it
+took, how many SQL queries it ran and for how long, how long encoding its
+JSON took (see api.responses) and how big the response was. Each measure goes
+into a histogram, labelled with the request's URL name, with fixed buckets,
+so memory stays bounded however many requests are served.
+
+Queries are counted by record_query(), a database execute wrapper (see
+``connection.execute_wrapper``) added to each connection as it opens (see
+api.signals). It finds the request through a context variable, so queries
+run in sync_to_async threads for an async request are counted too.
+
+With SLOW_REQUEST_SECONDS set, requests that take longer are logged with
+their slowest and most repeated statements; a statement repeated many times
+in one request is the mark of an N+1 query.
+
+The figures are for this process, and are shown to admins at /metrics/.
+"""
+
+import bisect
+import contextvars
+import logging
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SERIALIZATION_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+# (metric name, help, buckets, RequestTrace attribute)
+MEASURES = (
+    (
+        "http_request_duration_seconds",
+        "Time to handle the request",
+        DURATION_BUCKETS,
+        "duration",
+    ),
+    ("http_request_db_queries", "SQL queries run", QUERY_BUCKETS, "queries"),
+    (
+        "http_request_db_seconds",
+        "Time spent running SQL queries",
+        DURATION_BUCKETS,
+        "db_time",
+    ),
+    (
+        "http_response_serialization_seconds",
+        "Time spent encoding JSON",
+        SERIALIZATION_BUCKETS,
+        "serialization_time",
+    ),
+    (
+        "http_response_size_bytes",
+        "Response body size (not counted for streamed responses)",
+        SIZE_BUCKETS,
+        "size",
+    ),
+)
+
+# Requests that didn't match a URL pattern share one label
+UNMATCHED = "<unmatched>"
+
+current_trace = contextvars.ContextVar("current_trace", default=None)
+
+
+class Histogram:
+    """Counts of observed values at or below each bucket's upper bound"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        # The last count is for values above every bucket
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        """(upper bound, count of values at or below it) pairs, ending with +Inf"""
+        total = 0
+        for bound, count in zip((*self.buckets, "+Inf"), self.counts):
+            total += count
+            yield bound, total
+
+
+class RequestTrace:
+    """What one request did"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.duration = 0.0
+        self.queries = 0
+        self.db_time = 0.0
+        self.serialization_time = 0.0
+        self.size = None
+        self.statements = Counter()
+        self.slowest = []
+        self.lock = threading.Lock()
+
+    def query(self, sql, duration):
+        with self.lock:
+            self.queries += 1
+            self.db_time += duration
+            self.statements[sql] += 1
+            self.slowest.append((duration, sql))
+            if len(self.slowest) > 10:
+                self.slowest.sort(reverse=True)
+                del self.slowest[5:]
+
+    def serialized(self, duration):
+        self.serialization_time += duration
+
+
+class RequestMetrics:
+    """Histograms of each measure, by URL name, for this process"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            # {URL name: {attribute: Histogram}}
+            self.views = {}
+            self.statuses = Counter()
+
+    def record(self, view, status, trace):
+        with self.lock:
+            histograms = self.views.get(view)
+            if histograms is None:
+                histograms = self.views[view] = {
+                    attribute: Histogram(buckets)
+                    for _, _, buckets, attribute in MEASURES
+                }
+            for attribute, histogram in histograms.items():
+                value = getattr(trace, attribute)
+                if value is not None:
+                    histogram.observe(value)
+            self.statuses[view, status] += 1
+
+    def render(self):
+        """The metrics in the Prometheus text exposition format"""
+        with self.lock:
+            lines = [
+                "# HELP http_requests_total Requests handled, by URL name and status",
+                "# TYPE http_requests_total counter",
+            ]
+            for (view, status), count in sorted(self.statuses.items()):
+                lines.append(
+                    f'http_requests_total{{view="{view}",status="{status}"}} {count}'
+                )
+            for name, help_text, _, attribute in MEASURES:
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} histogram")
+                for view, histograms in sorted(self.views.items()):
+                    histogram = histograms[attribute]
+                    for bound, count in histogram.cumulative():
+                        lines.append(
+                            f'{name}_bucket{{view="{view}",le="{bound}"}} {count}'
+                        )
+                    lines.append(f'{name}_sum{{view="{view}"}} {histogram.sum:g}')
+                    lines.append(f'{name}_count{{view="{view}"}} {histogram.count}')
+        return "\n".join(lines) + "\n"
+
+
+REQUEST_METRICS = RequestMetrics()
+
+
+def render_cache_stats(*stats):
+    """CacheStats (see api.caching) in the Prometheus text exposition format"""
+    lines = []
+    for name, attribute in (
+        ("cache_hits_total", "hits"),
+        ("cache_misses_total", "misses"),
+        ("cache_invalidations_total", "invalidations"),
+        ("cache_coalesced_total", "coalesced"),
+    ):
+        lines.append(f"# TYPE {name} counter")
+        for cache in stats:
+            lines.append(f'{name}{{cache="{cache.name}"}} {getattr(cache, attribute)}')
+    return "\n".join(lines) + "\n"
+
+
+def record_query(execute, sql, params, many, context):
+    """Database execute wrapper timing each query for the current request"""
+    trace = current_trace.get()
+    if trace is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        trace.query(sql, time.perf_counter() - started)
+
+
+def record_serialization(duration):
+    trace = current_trace.get()
+    if trace is not None:
+        trace.serialized(duration)
+
+
+def start_trace():
+    trace = RequestTrace()
+    return trace, current_trace.set(trace)
+
+
+def finish_trace(request, response, trace):
+    trace.duration = time.perf_counter() - trace.started
+    if not response.streaming:
+        trace.size = len(response.content)
+
+    match = getattr(request, "resolver_match", None)
+    view = (match.url_name or match.view_name) if match else UNMATCHED
+    REQUEST_METRICS.record(view, response.status_code, trace)
+
+    threshold = getattr(settings, "SLOW_REQUEST_SECONDS", None)
+    if threshold is not None and trace.duration >= threshold:
+        log_slow_request(request, response, view, trace)
+
+
+def log_slow_request(request, response, view, trace):
+    slowest = sorted(trace.slowest, reverse=True)[:3]
+    repeated = [
+        (sql, count) for sql, count in trace.statements.most_common(3) if count > 1
+    ]
+    logger.warning(
+        "Slow request: %s %s (%s) %s in %.0f ms, %d queries in %.0f ms, "
+        "%.1f ms serializing, %s bytes%s%s",
+        request.method,
+        request.path,
+        view,
+        response.status_code,
+        trace.duration * 1000,
+        trace.queries,
+        trace.db_time * 1000,
+        trace.serialization_time * 1000,
+        trace.size if trace.size is not None else "streamed",
+        "".join(
+            f"\n  slowest {duration * 1000:.1f} ms: {sql}" for duration, sql in slowest
+        ),
+        "".join(f"\n  repeated {count}x: {sql}" for sql, count in repeated),
+    )
@@ -0,0 +1,72 @@
+"""
+Project middleware.
+
+Under ASGI, one middleware that only works synchronously makes Django run the
+whole chain beneath it, and the view, in a thread per request. That would
+tie up a thread for every long poll (see get_item_bids), so middleware here
+handles both sync and async requests.
+"""
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+from .metrics import current_trace, finish_trace, start_trace
+
+
+class RequestMetricsMiddleware:
+    """Record each request's timings, queries and size (see api.metrics)"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        trace, token = start_trace()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_trace.reset(token)
+        finish_trace(request, response, trace)
+        return response
+
+    async def __acall__(self, request):
+        trace, token = start_trace()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_trace.reset(token)
+        finish_trace(request, response, trace)
+        return response
+
+
+class AsyncWhiteNoiseMiddleware(WhiteNoiseMiddleware):
+    """WhiteNoiseMiddleware that passes async requests through without a thread"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, *args, **kwargs):
+        super().__init__(get_response, *args, **kwargs)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            # Looks on disk
+            static_file = await sync_to_async(self.find_file)(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return await sync_to_async(self.serve)(static_file, request)
+        return await self.get_response(request)
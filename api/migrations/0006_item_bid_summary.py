@@ -0,0 +1,50 @@
+# Generated by Django 5.1.4 on 2026-10-17 01:17
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def populate_bid_summaries(apps, schema_editor):
+    Item = apps.get_model('api', 'Item')
+    Bid = apps.get_model('api', 'Bid')
+    item_bids = Bid.objects.filter(item=OuterRef('pk'))
+    top_bid = item_bids.order_by('-bid_amount', 'created_at', 'pk')
+    Item.objects.update(
+        current_highest_bid=Subquery(top_bid.values('bid_amount')[:1]),
+        highest_bidder=Subquery(top_bid.values('bidder')[:1]),
+        bid_count=Coalesce(
+            Subquery(
+                item_bids.order_by().values('item').annotate(total=Count('pk')).values('total')
+            ),
+            0,
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_alter_message_poster_alter_message_replying_to'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='item',
+            name='bid_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='item',
+            name='current_highest_bid',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='item',
+            name='highest_bidder',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='leading_items', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RunPython(populate_bid_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,78 @@
+from django.db import migrations
+
+
+# Must stay identical to ITEM_SEARCH_VECTOR_SQL in api/search.py so PostgreSQL
+# can answer searches from the expression index
+ITEM_SEARCH_VECTOR_SQL = (
+    "(setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(description, '')), 'B'))"
+)
+
+SQLITE_FORWARD = [
+    # External-content FTS5 table over api_item; the text lives only in api_item
+    """
+    CREATE VIRTUAL TABLE api_item_fts USING fts5(
+        title, description,
+        content='api_item', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )
+    """,
+    """
+    CREATE TRIGGER api_item_fts_insert AFTER INSERT ON api_item BEGIN
+        INSERT INTO api_item_fts(rowid, title, description)
+        VALUES (new.id, new.title, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER api_item_fts_delete AFTER DELETE ON api_item BEGIN
+        INSERT INTO api_item_fts(api_item_fts, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+    END
+    """,
+    """
+    CREATE TRIGGER api_item_fts_update AFTER UPDATE OF title, description ON api_item BEGIN
+        INSERT INTO api_item_fts(api_item_fts, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+        INSERT INTO api_item_fts(rowid, title, description)
+        VALUES (new.id, new.title, new.description);
+    END
+    """,
+    "INSERT INTO api_item_fts(api_item_fts) VALUES ('rebuild')",
+]
+
+SQLITE_BACKWARD = [
+    "DROP TRIGGER IF EXISTS api_item_fts_update",
+    "DROP TRIGGER IF EXISTS api_item_fts_delete",
+    "DROP TRIGGER IF EXISTS api_item_fts_insert",
+    "DROP TABLE IF EXISTS api_item_fts",
+]
+
+POSTGRESQL_FORWARD = [
+    f"CREATE INDEX api_item_search_idx ON api_item USING GIN ({ITEM_SEARCH_VECTOR_SQL})",
+]
+
+POSTGRESQL_BACKWARD = [
+    "DROP INDEX IF EXISTS api_item_search_idx",
+]
+
+
+def run_for_vendor(statements):
+    def run(apps, schema_editor):
+        for sql in statements.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(sql)
+
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_composite_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run_for_vendor({'sqlite': SQLITE_FORWARD, 'postgresql': POSTGRESQL_FORWARD}),
+            run_for_vendor({'sqlite': SQLITE_BACKWARD, 'postgresql': POSTGRESQL_BACKWARD}),
+        ),
+    ]
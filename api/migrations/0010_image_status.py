@@ -0,0 +1,42 @@
+# Generated by Django 5.1.4 on 2026-10-17 01:59
+
+from importlib import import_module
+
+from django.db import migrations, models
+
+search_index = import_module('api.migrations.0008_item_search_index')
+
+
+def restore_search_triggers(apps, schema_editor):
+    """
+    SQLite can't add a NOT NULL column in place, so Django rebuilds api_item
+    and the FTS triggers from 0008_item_search_index are dropped with the old
+    table. Recreate them and resync the index.
+    """
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for sql in search_index.SQLITE_BACKWARD[:3] + search_index.SQLITE_FORWARD[1:]:
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_email_outbox'),
+    ]
+
+    operations = [
+        # Restores the triggers after the field is removed when unapplying
+        migrations.RunPython(migrations.RunPython.noop, restore_search_triggers),
+        migrations.AddField(
+            model_name='item',
+            name='item_image_status',
+            field=models.CharField(choices=[('ready', 'Ready'), ('processing', 'Processing'), ('failed', 'Failed')], default='ready', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='profile_picture_status',
+            field=models.CharField(choices=[('ready', 'Ready'), ('processing', 'Processing'), ('failed', 'Failed')], default='ready', max_length=10),
+        ),
+        migrations.RunPython(restore_search_triggers, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.4 on 2026-10-17 02:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_image_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='item',
+            name='item_image_renditions',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.1.4 on 2026-10-17 04:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0013_message_updated_at'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='item',
+            name='end_date_created_at_idx',
+        ),
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(fields=['-created_at', '-id', 'auction_end_date'], name='listing_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(fields=['auction_end_date'], name='end_date_idx'),
+        ),
+    ]
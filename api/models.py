@@ -1,11 +1,23 @@
-from django.db import models
+from django.db import models, transaction
+from django.utils import timezone
 import datetime
 from django.contrib.auth.models import AbstractUser, BaseUserManager
-from django.db.models import F, Q
+from django.db.models import F, Q, Case, When, Value, Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .caching import invalidate_item
 
 # Create your models here.
 
 
+class ImageStatus(models.TextChoices):
+    """Where an uploaded image is in the api.images pipeline"""
+
+    READY = "ready", "Ready"
+    PROCESSING = "processing", "Processing"
+    FAILED = "failed", "Failed"
+
+
 class MyUserManager(BaseUserManager):
     def create_user(self, first_name, last_name, email, date_of_birth, password=None):
         if not email:
@@ -49,6 +61,9 @@ class User(AbstractUser):
         blank=True,
         help_text="User's profile picture",
     )
+    profile_picture_status = models.CharField(
+        max_length=10, choices=ImageStatus.choices, default=ImageStatus.READY
+    )
     is_active = models.BooleanField(default=True)
     is_admin = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -76,6 +91,35 @@ class User(AbstractUser):
     pass
 
 
+class ItemQuerySet(models.QuerySet):
+    def rebuild_bid_summaries(self):
+        """
+        Recompute the denormalised bid summary columns from the Bid table
+        in a single UPDATE, and drop the items' cached copies. Used to repair
+        items after bulk bid changes.
+        """
+        item_bids = Bid.objects.filter(item=OuterRef("pk"))
+        # Highest amount wins, the earliest bid breaks ties
+        top_bid = item_bids.order_by("-bid_amount", "created_at", "pk")
+        item_ids = list(self.values_list("pk", flat=True))
+        updated = self.update(
+            current_highest_bid=Subquery(top_bid.values("bid_amount")[:1]),
+            highest_bidder=Subquery(top_bid.values("bidder")[:1]),
+            bid_count=Coalesce(
+                Subquery(
+                    item_bids.order_by()
+                    .values("item")
+                    .annotate(total=Count("pk"))
+                    .values("total")
+                ),
+                0,
+            ),
+        )
+        # update() sends no signals; see api.caching
+        invalidate_item(*item_ids)
+        return updated
+
+
 class Item(models.Model):
     title = models.CharField(max_length=80)
     description = models.TextField(max_length=1250)
@@ -96,7 +140,24 @@ class Item(models.Model):
         blank=True,
         help_text="Auction item photo",
     )
+    item_image_status = models.CharField(
+        max_length=10, choices=ImageStatus.choices, default=ImageStatus.READY
+    )
+    # Smaller copies of item_image for srcset, {extension: {width: name}}
+    item_image_renditions = models.JSONField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Denormalised bid summary kept in step with the Bid table by Bid.save() and
+    # Bid.delete(), so read paths don't have to aggregate over the bid history
+    current_highest_bid = models.IntegerField(null=True, blank=True)
+    highest_bidder = models.ForeignKey(
+        User,
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        related_name="leading_items",
+    )
+    bid_count = models.IntegerField(default=0)
+    objects = ItemQuerySet.as_manager()
     REQUIRED_FIELDS = [
         "title",
         "description",
@@ -110,11 +171,50 @@ class Item(models.Model):
             models.Index(fields=["title"], name="title_idx"),
             models.Index(fields=["description"], name="description_idx"),
             models.Index(fields=["-created_at"], name="created_at_idx"),
+            # Active listing: auction_end_date >= today, newest first. The range
+            # filter can't lead without a sort, so the index is in listing order
+            # and carries the end date to filter on without reading the rows.
+            models.Index(
+                fields=["-created_at", "-id", "auction_end_date"],
+                name="listing_idx",
+            ),
+            # The listing's total_count, and auctions ending on a date (cron)
+            models.Index(fields=["auction_end_date"], name="end_date_idx"),
         ]
 
     def __str__(self):
         return self.title
 
+    def refresh_bid_summary(self):
+        """Recompute this item's bid summary columns from its bids"""
+        Item.objects.filter(pk=self.pk).rebuild_bid_summaries()
+        self.refresh_from_db(
+            fields=["current_highest_bid", "highest_bidder", "bid_count"]
+        )
+
+
+class ItemSearchEntry(models.Model):
+    """
+    A row of the api_item_fts FTS5 table that api.search joins in on SQLite.
+    Migration 0008 creates the table, and triggers keep it in step with api_item.
+    """
+
+    item = models.OneToOneField(
+        Item,
+        primary_key=True,
+        db_column="rowid",
+        on_delete=models.DO_NOTHING,
+        related_name="search_entry",
+    )
+    title = models.TextField()
+    description = models.TextField()
+    # FTS5's hidden column named after the table; MATCH on it searches every column
+    document = models.TextField(db_column="api_item_fts")
+
+    class Meta:
+        managed = False
+        db_table = "api_item_fts"
+
 
 class Bid(models.Model):
     bidder = models.ForeignKey(User, null=True, on_delete=models.SET_NULL)
@@ -127,6 +227,53 @@ class Bid(models.Model):
         "bid_amount",
     ]
 
+    class Meta:
+        indexes = [
+            # An item's bids by amount (bid history, highest bid)
+            models.Index(fields=["item", "-bid_amount"], name="bid_item_amount_idx"),
+            # A user's bids, newest first
+            models.Index(fields=["bidder", "-created_at"], name="bid_bidder_created_at_idx"),
+            # Earliest bid at a given amount (auction winner)
+            models.Index(
+                fields=["item", "bid_amount", "created_at"],
+                name="bid_item_amount_created_idx",
+            ),
+        ]
+
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if not adding:
+                self.item.refresh_bid_summary()
+                return
+
+            # Fold the new bid into the item's summary without reading the bid
+            # history. highest_bidder is listed first because MySQL evaluates SET
+            # clauses left to right against already-updated values.
+            outbids = Q(current_highest_bid__isnull=True) | Q(
+                current_highest_bid__lt=self.bid_amount
+            )
+            Item.objects.filter(pk=self.item_id).update(
+                highest_bidder=Case(
+                    When(outbids, then=Value(self.bidder_id)),
+                    default=F("highest_bidder"),
+                    output_field=models.BigIntegerField(),
+                ),
+                current_highest_bid=Case(
+                    When(outbids, then=Value(self.bid_amount)),
+                    default=F("current_highest_bid"),
+                ),
+                bid_count=F("bid_count") + 1,
+            )
+
+    def delete(self, *args, **kwargs):
+        # Bulk queryset deletes bypass this; run rebuild_bid_summaries afterwards
+        with transaction.atomic():
+            result = super().delete(*args, **kwargs)
+            Item.objects.filter(pk=self.item_id).rebuild_bid_summaries()
+        return result
+
 
 class Message(models.Model):
     poster = models.ForeignKey(
@@ -137,6 +284,9 @@ class Message(models.Model):
     message_title = models.CharField(max_length=80)
     message_body = models.TextField(max_length=250)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Set on every save, so edits change the thread's ETag (null for messages
+    # written before it was added)
+    updated_at = models.DateTimeField(auto_now=True, null=True)
     REQUIRED_FIELDS = [
         "poster",
         "item",
@@ -144,6 +294,12 @@ class Message(models.Model):
         "message_body",
     ]
 
+    class Meta:
+        indexes = [
+            # An item's message thread, oldest first
+            models.Index(fields=["item", "created_at"], name="message_item_created_at_idx"),
+        ]
+
     def clean(self):
         from django.core.exceptions import ValidationError
         if self.replying_to and self.replying_to.item != self.item:
@@ -159,6 +315,59 @@ class Message(models.Model):
         return self.message_title
 
 
+class EmailOutbox(models.Model):
+    """
+    An email waiting to be sent. Rows are written in the same transaction as
+    the change they announce and sent later by api.outbox.send_outbox.
+    """
+
+    PENDING = "pending"
+    SENT = "sent"
+    FAILED = "failed"
+    STATUS_CHOICES = [
+        (PENDING, "Pending"),
+        (SENT, "Sent"),
+        (FAILED, "Failed"),
+    ]
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=254, null=True, blank=True)
+    to_email = models.EmailField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.IntegerField(default=0)
+    # Not sent before this time: set for retries, and while a worker holds the row
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Pending emails that are due, oldest first
+            models.Index(fields=["status", "next_attempt_at"], name="outbox_status_due_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} -> {self.to_email} ({self.status})"
+
+
+class MediaBlob(models.Model):
+    """
+    A file in api.storage.ContentAddressedStorage and the number of
+    references to it
+    """
+
+    name = models.CharField(max_length=255, unique=True)
+    refcount = models.IntegerField(default=0)
+    size = models.BigIntegerField()
+    # Last time a reference was taken; gc_media leaves recent blobs alone
+    touched_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.name} ({self.refcount} references)"
+
+
 class PageView(models.Model):
     count = models.IntegerField(default=0)
 
@@ -0,0 +1,218 @@
+"""
+Transactional email outbox.
+
+Code that needs to send an email as part of a database change calls
+enqueue_email() inside the same transaction, so the email exists if and only
+if the change committed. send_outbox() then sends the due emails in batches
+over one reused mail connection, instead of opening an SMTP/TLS connection
+per message on the request or cron path.
+
+A message that fails is retried with exponential backoff
+(OUTBOX_RETRY_DELAY seconds, doubling per attempt, capped at
+OUTBOX_MAX_RETRY_DELAY) and marked failed after OUTBOX_MAX_ATTEMPTS attempts.
+Several workers can drain the outbox at once: each claims its batch by
+pushing next_attempt_at forward by OUTBOX_CLAIM_SECONDS before sending.
+"""
+
+import logging
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import EmailOutbox
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 100
+
+
+def outbox_setting(name, default):
+    return getattr(settings, name, default)
+
+
+def enqueue_email(subject, body, to_email, from_email=None):
+    """Queue one email; call inside the transaction making the change"""
+    return EmailOutbox.objects.create(
+        subject=subject,
+        body=body,
+        to_email=to_email,
+        from_email=from_email,
+    )
+
+
+def enqueue_emails(emails):
+    """Queue many (subject, body, to_email, from_email) emails in one INSERT"""
+    return EmailOutbox.objects.bulk_create(
+        [
+            EmailOutbox(
+                subject=subject, body=body, to_email=to_email, from_email=from_email
+            )
+            for subject, body, to_email, from_email in emails
+        ]
+    )
+
+
+def retry_delay(attempts):
+    """Seconds to wait before retrying a message that has failed attempts times"""
+    base = outbox_setting("OUTBOX_RETRY_DELAY", 60)
+    cap = outbox_setting("OUTBOX_MAX_RETRY_DELAY", 3600)
+    return min(base * 2 ** (attempts - 1), cap)
+
+
+class OutboxStats:
+    """Counts and timing for one send_outbox() run"""
+
+    def __init__(self):
+        self.sent = 0
+        self.retried = 0
+        self.failed = 0
+        self.batches = 0
+        self.seconds = 0.0
+
+    @property
+    def per_second(self):
+        return self.sent / self.seconds if self.seconds else 0.0
+
+    def as_dict(self):
+        return {
+            "sent": self.sent,
+            "retried": self.retried,
+            "failed": self.failed,
+            "batches": self.batches,
+            "seconds": round(self.seconds, 3),
+            "per_second": round(self.per_second, 1),
+        }
+
+    def __str__(self):
+        return (
+            f"sent {self.sent}, retried {self.retried}, failed {self.failed} "
+            f"in {self.batches} batches, {self.seconds:.2f}s "
+            f"({self.per_second:.1f}/s)"
+        )
+
+
+def claim_batch(batch_size):
+    """
+    Claim up to batch_size due emails for this worker and return them. Claimed
+    rows are hidden from other workers for OUTBOX_CLAIM_SECONDS.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        batch = list(
+            EmailOutbox.objects.select_for_update(skip_locked=True)
+            .filter(status=EmailOutbox.PENDING, next_attempt_at__lte=now)
+            .order_by("next_attempt_at", "id")[:batch_size]
+        )
+        if batch:
+            EmailOutbox.objects.filter(id__in=[email.id for email in batch]).update(
+                next_attempt_at=now
+                + timedelta(seconds=outbox_setting("OUTBOX_CLAIM_SECONDS", 300))
+            )
+    return batch
+
+
+def send_batch(connection, batch, stats):
+    sent_ids = []
+    for email in batch:
+        message = EmailMessage(
+            email.subject,
+            email.body,
+            email.from_email or settings.DEFAULT_FROM_EMAIL,
+            [email.to_email],
+            connection=connection,
+        )
+        try:
+            # One message per call so a failure is pinned on its own row; the
+            # connection stays open between calls
+            if not connection.send_messages([message]):
+                raise RuntimeError("Mail backend did not send the message")
+        except Exception as e:
+            record_failure(email, e, stats)
+            reopen(connection)
+        else:
+            sent_ids.append(email.id)
+
+    if sent_ids:
+        EmailOutbox.objects.filter(id__in=sent_ids).update(
+            status=EmailOutbox.SENT,
+            sent_at=timezone.now(),
+            attempts=F("attempts") + 1,
+            last_error="",
+        )
+        stats.sent += len(sent_ids)
+
+
+def reopen(connection):
+    # The failure may have left the SMTP session unusable; start a new one so
+    # the rest of the batch still shares a connection
+    try:
+        connection.close()
+        connection.open()
+    except Exception as e:
+        logger.warning("Could not reopen mail connection: %s", e)
+
+
+def record_failure(email, error, stats):
+    email.attempts += 1
+    email.last_error = f"{type(error).__name__}: {error}"
+    if email.attempts >= outbox_setting("OUTBOX_MAX_ATTEMPTS", 5):
+        email.status = EmailOutbox.FAILED
+        stats.failed += 1
+        logger.error(
+            "Giving up on email %s to %s after %s attempts: %s",
+            email.id,
+            email.to_email,
+            email.attempts,
+            email.last_error,
+        )
+    else:
+        email.next_attempt_at = timezone.now() + timedelta(
+            seconds=retry_delay(email.attempts)
+        )
+        stats.retried += 1
+        logger.warning(
+            "Email %s to %s failed (attempt %s), retrying at %s: %s",
+            email.id,
+            email.to_email,
+            email.attempts,
+            email.next_attempt_at,
+            email.last_error,
+        )
+    email.save(update_fields=["attempts", "last_error", "status", "next_attempt_at"])
+
+
+def send_outbox(batch_size=DEFAULT_BATCH_SIZE, max_batches=None, connection=None):
+    """
+    Send due emails until none are left (or max_batches batches have been
+    sent) over a single mail connection. Returns an OutboxStats.
+    """
+    stats = OutboxStats()
+    started = time.perf_counter()
+    connection = connection or get_connection()
+
+    try:
+        connection.open()
+    except Exception as e:
+        # Nothing can be sent; leave every email due for the next run
+        logger.error("Could not open mail connection: %s", e)
+        return stats
+
+    try:
+        while max_batches is None or stats.batches < max_batches:
+            batch = claim_batch(batch_size)
+            if not batch:
+                break
+            send_batch(connection, batch, stats)
+            stats.batches += 1
+    finally:
+        connection.close()
+        stats.seconds = time.perf_counter() - started
+
+    if stats.batches:
+        logger.info("Email outbox: %s", stats)
+    return stats
@@ -0,0 +1,115 @@
+"""
+Keyset (cursor) pagination.
+
+Instead of OFFSET, each page starts after the last row of the previous one:
+a seek predicate on the ordering columns such as
+``created_at < x OR (created_at = x AND id < y)``. This is answered from an
+index in the same time however deep the client has scrolled. The position is
+handed to clients as an opaque cursor string, a base64-encoded JSON list of
+the last row's ordering values.
+"""
+
+import base64
+import binascii
+import json
+from datetime import date, datetime
+
+from django.db.models import Q
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def parse_limit(value, default=DEFAULT_PAGE_SIZE):
+    """Parse a page size query parameter, capped at MAX_PAGE_SIZE"""
+    if value is None:
+        return default
+    limit = int(value)
+    if limit <= 0:
+        raise ValueError("limit must be positive")
+    return min(limit, MAX_PAGE_SIZE)
+
+
+def encode_cursor(values):
+    """Encode a row's ordering values as an opaque cursor string"""
+    payload = json.dumps(
+        [
+            value.isoformat() if isinstance(value, (date, datetime)) else value
+            for value in values
+        ],
+        separators=(",", ":"),
+    )
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor, length):
+    """Decode a cursor string back into its list of length ordering values"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (binascii.Error, ValueError, UnicodeDecodeError):
+        raise InvalidCursor("Invalid cursor")
+    if not isinstance(values, list) or len(values) != length:
+        raise InvalidCursor("Invalid cursor")
+    return values
+
+
+class Keyset:
+    """
+    A keyset ordering, given like order_by() arguments. The last field must be
+    unique (normally id) so every row has a distinct position.
+    """
+
+    def __init__(self, *ordering):
+        self.ordering = ordering
+        self.fields = [
+            (field.lstrip("-"), field.startswith("-")) for field in ordering
+        ]
+
+    def seek(self, values):
+        """Q matching the rows that come after the row with these values"""
+        condition = Q()
+        for position, (field, descending) in enumerate(self.fields):
+            lookup = "lt" if descending else "gt"
+            term = Q(**{f"{field}__{lookup}": values[position]})
+            for (previous, _), value in zip(self.fields[:position], values):
+                term &= Q(**{previous: value})
+            condition |= term
+        return condition
+
+    def values_for(self, obj):
+        # obj is a model instance or a .values() row
+        if isinstance(obj, dict):
+            return [obj[field] for field, _ in self.fields]
+        return [getattr(obj, field) for field, _ in self.fields]
+
+    def cursor_for(self, obj):
+        return encode_cursor(self.values_for(obj))
+
+    def decode(self, cursor):
+        return decode_cursor(cursor, len(self.fields))
+
+    def after(self, queryset, cursor=None):
+        """queryset in keyset order, from the row after cursor (or the start)"""
+        queryset = queryset.order_by(*self.ordering)
+        if cursor:
+            queryset = queryset.filter(self.seek(self.decode(cursor)))
+        return queryset
+
+    def paginate(self, queryset, cursor=None, limit=DEFAULT_PAGE_SIZE):
+        """
+        Return (page, next_cursor) for the rows after cursor (from the start if
+        cursor is empty). next_cursor is None on the last page.
+        """
+        queryset = self.after(queryset, cursor)
+
+        # Fetch one extra row to learn whether there is a next page
+        page = list(queryset[: limit + 1])
+        if len(page) <= limit:
+            return page, None
+        page = page[:limit]
+        return page, self.cursor_for(page[-1])
@@ -0,0 +1,145 @@
+"""
+JSON responses encoded with the fastest encoder available.
+
+JsonResponse here takes the same arguments as django.http.JsonResponse but
+encodes with orjson if it is installed, then msgspec, then the stdlib json
+module. Dates, datetimes and times are encoded natively, so views can put
+them in response data as-is:
+
+- orjson and the stdlib fallback both write datetime.isoformat() output,
+  e.g. "2026-01-02T03:04:05.123456+00:00", and dates as "2026-01-02".
+- msgspec writes RFC 3339, which spells UTC as "Z".
+
+Decimals, UUIDs and lazy translation strings are written as strings.
+
+make_etag() and not_modified() let read views answer conditional GETs: the
+view works out a cheap version token for what it would send, and returns a
+304 when the client's If-None-Match already holds it, before building the
+payload.
+
+NdjsonResponse streams a queryset as newline-delimited JSON, one object per
+row, reading STREAM_CHUNK_SIZE rows from the database at a time, so a
+response of any length is sent in constant memory.
+"""
+
+import hashlib
+import json
+from datetime import date, datetime, time
+from time import perf_counter
+from decimal import Decimal
+from uuid import UUID
+
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.functional import Promise
+
+from .metrics import record_serialization
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+
+def encode_default(obj):
+    """Encode the types the JSON libraries don't handle natively"""
+    if isinstance(obj, (date, datetime, time)):
+        return obj.isoformat()
+    if isinstance(obj, (Decimal, UUID, Promise)):
+        return str(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+class StdlibJSONEncoder(json.JSONEncoder):
+    def default(self, obj):
+        return encode_default(obj)
+
+
+if orjson is not None:
+    JSON_BACKEND = "orjson"
+
+    def dumps(data):
+        return orjson.dumps(
+            data, default=encode_default, option=orjson.OPT_NON_STR_KEYS
+        )
+
+elif msgspec is not None:
+    JSON_BACKEND = "msgspec"
+    _msgspec_encoder = msgspec.json.Encoder(enc_hook=encode_default)
+
+    def dumps(data):
+        return _msgspec_encoder.encode(data)
+
+else:
+    JSON_BACKEND = "json"
+
+    def dumps(data):
+        return json.dumps(data, cls=StdlibJSONEncoder).encode()
+
+
+class JsonResponse(HttpResponse):
+    """
+    An HTTP response class that consumes data to be serialized to JSON.
+
+    With safe=True (the default) only dicts are accepted, as with Django's
+    JsonResponse.
+    """
+
+    def __init__(self, data, safe=True, **kwargs):
+        if safe and not isinstance(data, dict):
+            raise TypeError(
+                "In order to allow non-dict objects to be serialized set the "
+                "safe parameter to False."
+            )
+        kwargs.setdefault("content_type", "application/json")
+        started = perf_counter()
+        content = dumps(data)
+        record_serialization(perf_counter() - started)
+        super().__init__(content=content, **kwargs)
+
+
+def make_etag(*parts):
+    """A strong ETag for a response determined by parts (values with a stable repr)"""
+    digest = hashlib.blake2b(repr(parts).encode(), digest_size=12).hexdigest()
+    return f'"{digest}"'
+
+
+def not_modified(request, etag):
+    """A 304 response if the request's If-None-Match matches etag, else None"""
+    response = get_conditional_response(request, etag=etag)
+    if response is not None:
+        response["ETag"] = etag
+    return response
+
+
+# Rows fetched per query round trip by NdjsonResponse
+STREAM_CHUNK_SIZE = 500
+
+
+class NdjsonResponse(StreamingHttpResponse):
+    """
+    A streamed response with serialize(obj) on a line for each object in a
+    queryset. Under ASGI the rows are read with aiterator(), so Django
+    doesn't have to collect a synchronous iterator into memory to send it.
+    """
+
+    def __init__(self, request, queryset, serialize, chunk_size=STREAM_CHUNK_SIZE):
+        if isinstance(request, ASGIRequest):
+
+            async def lines():
+                async for obj in queryset.aiterator(chunk_size=chunk_size):
+                    yield dumps(serialize(obj)) + b"\n"
+
+        else:
+
+            def lines():
+                for obj in queryset.iterator(chunk_size=chunk_size):
+                    yield dumps(serialize(obj)) + b"\n"
+
+        super().__init__(lines(), content_type="application/x-ndjson")
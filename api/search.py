@@ -0,0 +1,202 @@
+"""
+Full-text search over item titles and descriptions.
+
+get_paginated_items hands its queryset to a search backend, which filters it
+to matching items and annotates a ``relevance_score`` (higher is better) to
+order by. The backend is picked from the database in use, or from the
+SEARCH_BACKEND setting (a dotted path to a SearchBackend subclass):
+
+- SQLite: an FTS5 table (api_item_fts) kept in sync with api_item by
+  triggers and joined in through the unmanaged ItemSearchEntry model, ranked
+  with BM25.
+- PostgreSQL: a weighted tsvector expression with a GIN index, ranked with
+  ts_rank.
+
+Both match every search term as a word prefix.
+- Anything else: the original icontains/iregex matching with fixed weights.
+
+api.search_index.InvertedIndexSearchBackend keeps the index in process memory
+instead and can be selected with SEARCH_BACKEND.
+
+Both index structures are created by migration 0008_item_search_index.
+"""
+
+import re
+from functools import cache
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import (
+    BooleanField,
+    Case,
+    FloatField,
+    IntegerField,
+    Lookup,
+    Q,
+    Value,
+    When,
+)
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+
+from .models import ItemSearchEntry
+from .pagination import DEFAULT_PAGE_SIZE, Keyset
+
+# Title matches count for ten times as much as description matches
+TITLE_WEIGHT = 10.0
+DESCRIPTION_WEIGHT = 1.0
+
+# Search results are ordered best match first, then newest first
+SEARCH_KEYSET = Keyset("-relevance_score", "-created_at", "-id")
+
+# Must stay identical to the expression indexed in 0008_item_search_index
+ITEM_SEARCH_VECTOR_SQL = (
+    "(setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(description, '')), 'B'))"
+)
+
+
+def search_terms(keyword):
+    """Split a search keyword into lowercase word tokens"""
+    return re.findall(r"\w+", keyword.lower())
+
+
+class SearchBackend:
+    def search(self, items, keyword):
+        """
+        Filter the items queryset to those matching keyword, annotated with a
+        relevance_score and ordered best match first, newest first.
+        """
+        raise NotImplementedError
+
+    def search_page(self, items, keyword, start=None, end=None):
+        """
+        Return (page, total_count) for a search: the matching items from start
+        to end (all of them if either is None) and how many matched in total.
+        """
+        results = self.search(items, keyword)
+        total_count = results.count()
+        if start is not None and end is not None:
+            results = results[start:end]
+        return list(results), total_count
+
+    def search_count(self, items, keyword):
+        """Return how many items match keyword"""
+        return self.search_page(items, keyword, 0, 0)[1]
+
+    def search_keyset(self, items, keyword, cursor=None, limit=DEFAULT_PAGE_SIZE):
+        """
+        Return (page, next_cursor) for the matching items after cursor, for
+        keyset pagination through the results.
+        """
+        return SEARCH_KEYSET.paginate(self.search(items, keyword), cursor, limit)
+
+
+@ItemSearchEntry._meta.get_field("document").register_lookup
+class Match(Lookup):
+    """FTS5 full-text match: search_entry__document__match=<FTS5 query>"""
+
+    lookup_name = "match"
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f"{lhs} MATCH {rhs}", [*lhs_params, *rhs_params]
+
+
+class SQLiteFTSSearchBackend(SearchBackend):
+    def search(self, items, keyword):
+        terms = search_terms(keyword)
+        if not terms:
+            return items.none()
+
+        # Every term must match, as a prefix so partially typed words still hit
+        match = " ".join(f'"{term}"*' for term in terms)
+
+        # bm25() is only valid in a query that also runs the MATCH, so the
+        # FTS table is joined in (through ItemSearchEntry) rather than queried
+        # through a subquery. It returns lower-is-better scores, hence the
+        # negation.
+        return (
+            items.filter(search_entry__document__match=match)
+            .annotate(
+                relevance_score=RawSQL(
+                    "-bm25(api_item_fts, %s, %s)",
+                    [TITLE_WEIGHT, DESCRIPTION_WEIGHT],
+                    output_field=FloatField(),
+                )
+            )
+            .order_by(*SEARCH_KEYSET.ordering)
+        )
+
+
+class PostgresSearchBackend(SearchBackend):
+    def search(self, items, keyword):
+        terms = search_terms(keyword)
+        if not terms:
+            return items.none()
+
+        # Every term must match, as a prefix, the same as on SQLite. The terms
+        # are word characters only, so they can't carry tsquery operators.
+        prefixes = " & ".join(f"{term}:*" for term in terms)
+        query = "to_tsquery('english', %s)"
+        return (
+            items.filter(
+                RawSQL(
+                    f"{ITEM_SEARCH_VECTOR_SQL} @@ {query}",
+                    [prefixes],
+                    output_field=BooleanField(),
+                )
+            )
+            .annotate(
+                relevance_score=RawSQL(
+                    f"ts_rank({ITEM_SEARCH_VECTOR_SQL}, {query})",
+                    [prefixes],
+                    output_field=FloatField(),
+                )
+            )
+            .order_by(*SEARCH_KEYSET.ordering)
+        )
+
+
+class PatternSearchBackend(SearchBackend):
+    def search(self, items, keyword):
+        # Escape special regex characters to prevent regex injection
+        escaped_keyword = re.escape(keyword)
+
+        # Filter items that contain the keyword in title or description
+        items = items.filter(
+            Q(title__icontains=keyword) | Q(description__icontains=keyword)
+        )
+
+        # Priority: title exact match > title partial > description exact > description partial
+        return items.annotate(
+            relevance_score=Case(
+                When(title__iregex=r"\b" + escaped_keyword + r"\b", then=Value(100)),
+                When(title__icontains=keyword, then=Value(50)),
+                When(
+                    description__iregex=r"\b" + escaped_keyword + r"\b", then=Value(20)
+                ),
+                When(description__icontains=keyword, then=Value(10)),
+                default=Value(0),
+                output_field=IntegerField(),
+            )
+        ).order_by(*SEARCH_KEYSET.ordering)
+
+
+VENDOR_BACKENDS = {
+    "sqlite": SQLiteFTSSearchBackend,
+    "postgresql": PostgresSearchBackend,
+}
+
+
+@cache
+def _load_backend(backend_path, vendor):
+    if backend_path:
+        return import_string(backend_path)()
+    return VENDOR_BACKENDS.get(vendor, PatternSearchBackend)()
+
+
+def get_search_backend():
+    """Return the search backend for the configured database"""
+    return _load_backend(getattr(settings, "SEARCH_BACKEND", None), connection.vendor)
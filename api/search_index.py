@@ -0,0 +1,358 @@
+"""
+In-process inverted index over item titles and descriptions.
+
+Used by InvertedIndexSearchBackend for SQLite deployments that want search
+without a round trip to the database per query. Each token maps to a posting
+list of {item_id: weight}, with the title/description weights folded in when
+the item is indexed, so a search only sums precomputed numbers.
+
+The index is built from the database the first time it is needed and then
+kept up to date by the Item post_save/post_delete handlers in api/signals.py.
+Bulk queryset operations (update(), bulk_create()) don't send those signals,
+and other worker processes hold their own copy, so the index is also rebuilt
+once it is older than SEARCH_INDEX_MAX_AGE seconds (default 300). That rebuild
+runs on a background thread while searches keep using the old index, which is
+swapped out once the new one is ready.
+"""
+
+import bisect
+import heapq
+import logging
+import threading
+import time
+from collections import Counter
+from datetime import date, datetime
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Case, IntegerField, Value, When
+
+from .pagination import DEFAULT_PAGE_SIZE, InvalidCursor
+from .search import (
+    DESCRIPTION_WEIGHT,
+    SEARCH_KEYSET,
+    TITLE_WEIGHT,
+    SearchBackend,
+    search_terms,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class ItemSearchIndex:
+    def __init__(self):
+        self._lock = threading.RLock()
+        # token -> {item_id: weight}
+        self._postings = {}
+        # Sorted tokens, for prefix lookups
+        self._tokens = []
+        # item_id -> (tokens, created_at timestamp, auction_end_date)
+        self._documents = {}
+        self.built_at = time.monotonic()
+
+    def __len__(self):
+        return len(self._documents)
+
+    def add(self, item_id, title, description, created_at, auction_end_date):
+        """Index an item, replacing any previous entry for it"""
+        weights = Counter()
+        for token in search_terms(title):
+            weights[token] += TITLE_WEIGHT
+        for token in search_terms(description):
+            weights[token] += DESCRIPTION_WEIGHT
+
+        with self._lock:
+            self._remove(item_id)
+            for token, weight in weights.items():
+                postings = self._postings.get(token)
+                if postings is None:
+                    postings = self._postings[token] = {}
+                    bisect.insort(self._tokens, token)
+                postings[item_id] = weight
+            self._documents[item_id] = (
+                tuple(weights),
+                created_at.timestamp(),
+                auction_end_date,
+            )
+
+    def remove(self, item_id):
+        """Drop an item from the index"""
+        with self._lock:
+            self._remove(item_id)
+
+    def _remove(self, item_id):
+        document = self._documents.pop(item_id, None)
+        if document is None:
+            return
+        for token in document[0]:
+            postings = self._postings[token]
+            del postings[item_id]
+            if not postings:
+                del self._postings[token]
+                del self._tokens[bisect.bisect_left(self._tokens, token)]
+
+    def _term_scores(self, term):
+        # A term matches every indexed token it is a prefix of, scoring the
+        # best of them for each item
+        scores = {}
+        position = bisect.bisect_left(self._tokens, term)
+        while position < len(self._tokens) and self._tokens[position].startswith(
+            term
+        ):
+            for item_id, weight in self._postings[self._tokens[position]].items():
+                if weight > scores.get(item_id, 0):
+                    scores[item_id] = weight
+            position += 1
+        return scores
+
+    def _scores(self, keyword, ending_on_or_after):
+        terms = search_terms(keyword)
+        if not terms:
+            return {}
+
+        # Start from the rarest term so the intersection stays small
+        term_scores = sorted((self._term_scores(term) for term in set(terms)), key=len)
+        totals = dict(term_scores[0])
+        for scores in term_scores[1:]:
+            totals = {
+                item_id: total + scores[item_id]
+                for item_id, total in totals.items()
+                if item_id in scores
+            }
+
+        if ending_on_or_after is not None:
+            totals = {
+                item_id: total
+                for item_id, total in totals.items()
+                if self._documents[item_id][2] >= ending_on_or_after
+            }
+        return totals
+
+    def _rank_key(self, totals):
+        documents = self._documents
+
+        def rank(item_id):
+            # Best score, then newest, then highest id first
+            return (-totals[item_id], -documents[item_id][1], -item_id)
+
+        return rank
+
+    def search(self, keyword, ending_on_or_after=None, limit=None):
+        """
+        Return (ids, total_count) for items containing every term of keyword,
+        best match first then newest first. Items whose auction ends before
+        ending_on_or_after are skipped. If limit is given only the top limit
+        ids are ranked and returned; total_count still counts every match.
+        """
+        with self._lock:
+            totals = self._scores(keyword, ending_on_or_after)
+            rank = self._rank_key(totals)
+            if limit is None:
+                return sorted(totals, key=rank), len(totals)
+            return heapq.nsmallest(limit, totals, key=rank), len(totals)
+
+    def search_after(self, keyword, after=None, limit=20, ending_on_or_after=None):
+        """
+        Return up to limit (item_id, score, created_at timestamp) tuples
+        ranked after the position after, a (score, created_at timestamp,
+        item_id) tuple, or from the top if after is None.
+        """
+        with self._lock:
+            totals = self._scores(keyword, ending_on_or_after)
+            rank = self._rank_key(totals)
+            if after is not None:
+                score, created_at, item_id = after
+                after_rank = (-score, -created_at, -item_id)
+                totals = {
+                    candidate: total
+                    for candidate, total in totals.items()
+                    if rank(candidate) > after_rank
+                }
+            return [
+                (item_id, totals[item_id], self._documents[item_id][1])
+                for item_id in heapq.nsmallest(limit, totals, key=rank)
+            ]
+
+
+_index = None
+_index_lock = threading.Lock()
+# Changes made to _index while a background rebuild runs, replayed onto the
+# new index before it replaces the old one; None when no rebuild is running
+_rebuild_changes = None
+
+
+def build_item_index():
+    """Build a fresh index from every item in the database"""
+    from .models import Item
+
+    index = ItemSearchIndex()
+    rows = Item.objects.values_list(
+        "id", "title", "description", "created_at", "auction_end_date"
+    )
+    for item_id, title, description, created_at, auction_end_date in rows.iterator(
+        chunk_size=5000
+    ):
+        index.add(item_id, title, description, created_at, auction_end_date)
+    return index
+
+
+def rebuild_item_index():
+    """Build a new index and swap it in, keeping changes made meanwhile"""
+    global _index, _rebuild_changes
+    try:
+        index = build_item_index()
+    except Exception:
+        logger.exception("Failed to rebuild the item search index")
+        index = None
+    finally:
+        # Runs on its own thread, which has its own DB connection
+        connection.close()
+
+    with _index_lock:
+        changes, _rebuild_changes = _rebuild_changes, None
+        # A reset while the rebuild ran discards it
+        if index is None or changes is None:
+            return
+        for method, args in changes:
+            getattr(index, method)(*args)
+        _index = index
+
+
+def get_item_index():
+    """
+    Return the process-wide item index, building it if missing. A stale one
+    is returned as is while a fresh one is built in the background.
+    """
+    global _index, _rebuild_changes
+    max_age = getattr(settings, "SEARCH_INDEX_MAX_AGE", 300)
+    with _index_lock:
+        if _index is None:
+            _index = build_item_index()
+        elif (
+            _rebuild_changes is None and time.monotonic() - _index.built_at > max_age
+        ):
+            _rebuild_changes = []
+            threading.Thread(
+                target=rebuild_item_index, name="item-index-rebuild", daemon=True
+            ).start()
+        return _index
+
+
+def loaded_item_index():
+    """Return the process-wide item index if it has been built, else None"""
+    return _index
+
+
+def update_item_index(method, *args):
+    """
+    Apply an ItemSearchIndex add() or remove() call to the process-wide index
+    if it has been built, and to the one being rebuilt if there is one
+    """
+    with _index_lock:
+        if _index is None:
+            return
+        getattr(_index, method)(*args)
+        if _rebuild_changes is not None:
+            _rebuild_changes.append((method, args))
+
+
+def reset_item_index():
+    """Discard the process-wide index so the next search rebuilds it"""
+    global _index, _rebuild_changes
+    with _index_lock:
+        _index = _rebuild_changes = None
+
+
+def rows_by_id(items, ids):
+    """
+    Fetch the rows of the items queryset with these ids, keyed by id. Works
+    for .values() querysets (which need "id" among their columns) as well as
+    model querysets.
+    """
+    rows = {}
+    for row in items.order_by().filter(id__in=ids):
+        rows[row["id"] if isinstance(row, dict) else row.id] = row
+    return rows
+
+
+class InvertedIndexSearchBackend(SearchBackend):
+    """
+    Ranks items in memory and only asks the database for the rows on the
+    requested page, by primary key. Searches cover active auctions.
+    """
+
+    def ranked_ids(self, keyword, limit=None):
+        return get_item_index().search(
+            keyword, ending_on_or_after=date.today(), limit=limit
+        )
+
+    def search(self, items, keyword):
+        ranked_ids, _ = self.ranked_ids(keyword)
+        return (
+            items.filter(id__in=ranked_ids)
+            .annotate(
+                relevance_score=Case(
+                    *[
+                        When(id=item_id, then=Value(-position))
+                        for position, item_id in enumerate(ranked_ids)
+                    ],
+                    default=Value(None),
+                    output_field=IntegerField(),
+                )
+            )
+            .order_by("-relevance_score")
+        )
+
+    def search_page(self, items, keyword, start=None, end=None):
+        if start is not None and end is not None:
+            ranked_ids, total_count = self.ranked_ids(keyword, limit=end)
+            page_ids = ranked_ids[start:end]
+        else:
+            page_ids, total_count = self.ranked_ids(keyword)
+
+        # The queryset still applies its own filters to the page rows
+        rows = rows_by_id(items, page_ids)
+        return [rows[item_id] for item_id in page_ids if item_id in rows], total_count
+
+    def search_keyset(self, items, keyword, cursor=None, limit=DEFAULT_PAGE_SIZE):
+        after = None
+        if cursor:
+            score, created_at, item_id = SEARCH_KEYSET.decode(cursor)
+            try:
+                after = (
+                    float(score),
+                    datetime.fromisoformat(created_at).timestamp(),
+                    int(item_id),
+                )
+            except (TypeError, ValueError):
+                raise InvalidCursor("Invalid cursor")
+
+        # The queryset may leave out some of the ranked ids (deleted items,
+        # the view's own filters), so keep ranking past them until the page
+        # is full or the matches run out
+        index = get_item_index()
+        page = []
+        while True:
+            wanted = limit - len(page)
+            # One extra to learn whether there is a next page
+            ranked = index.search_after(
+                keyword, after, wanted + 1, ending_on_or_after=date.today()
+            )
+            candidates = ranked[:wanted]
+            rows = rows_by_id(items, [item_id for item_id, _, _ in candidates])
+            for item_id, score, _ in candidates:
+                if item_id in rows:
+                    row = rows[item_id]
+                    if isinstance(row, dict):
+                        row["relevance_score"] = score
+                    else:
+                        row.relevance_score = score
+                    page.append(row)
+
+            if len(ranked) <= wanted:
+                return page, None
+            if len(page) == limit:
+                # Every candidate was kept, so the last row was the last ranked
+                return page, SEARCH_KEYSET.cursor_for(page[-1])
+            item_id, score, created_at = candidates[-1]
+            after = (score, created_at, item_id)
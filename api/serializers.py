@@ -0,0 +1,253 @@
+"""
+Item serialization shared by the item views.
+
+Views describe the fields they return by name. compile_item_fields() turns a
+field list into the database columns to fetch with .values() and one small
+render function per field, once per distinct field list, so serializing a
+page is a loop over plain dicts with no model instances, lazy relation loads
+or per-row URL building. The absolute media URL is built once per request.
+
+List views accept a ``fields`` query parameter (comma-separated) to return a
+subset of their fields, e.g. ``?fields=id,title,highest_bid`` to skip the
+description.
+"""
+
+from datetime import date
+from functools import lru_cache
+
+from django.conf import settings
+from django.db.models.fields.files import FieldFile
+from django.utils.encoding import filepath_to_uri
+
+from .models import ImageStatus
+
+
+class ItemField:
+    def __init__(self, columns, render):
+        self.columns = columns
+        self.render = render
+
+
+def column(name):
+    return ItemField((name,), lambda row, serializer: row[name])
+
+
+def render_owner(row, serializer):
+    if row["owner_id"] is None:
+        return None
+    return {
+        "id": row["owner_id"],
+        "name": f"{row['owner__first_name']} {row['owner__last_name']}",
+        "email": row["owner__email"],
+    }
+
+
+def render_auction_winner(row, serializer):
+    if row["auction_winner_id"] is None:
+        return None
+    return {
+        "id": row["auction_winner_id"],
+        "name": f"{row['auction_winner__first_name']} {row['auction_winner__last_name']}",
+    }
+
+
+def render_item_image(row, serializer):
+    # Hidden while the upload is being processed (see api.images)
+    if not row["item_image"] or row["item_image_status"] != ImageStatus.READY:
+        return None
+    return serializer.media_base + filepath_to_uri(row["item_image"])
+
+
+def render_image_srcset(row, serializer):
+    """
+    {extension: srcset} for the item's renditions, e.g.
+    {"webp": ".../160.webp 160w, .../400.webp 400w", "jpg": ...}
+    """
+    renditions = row["item_image_renditions"]
+    if not renditions or row["item_image_status"] != ImageStatus.READY:
+        return None
+    return {
+        extension: ", ".join(
+            f"{serializer.media_base}{filepath_to_uri(name)} {width}w"
+            for width, name in sorted(names.items(), key=lambda pair: int(pair[0]))
+        )
+        for extension, names in renditions.items()
+    }
+
+
+ITEM_FIELDS = {
+    "id": column("id"),
+    "title": column("title"),
+    "description": column("description"),
+    "minimum_bid": column("minimum_bid"),
+    # Dates are left to the response encoder (api.responses)
+    "auction_end_date": column("auction_end_date"),
+    "created_at": column("created_at"),
+    "is_active": ItemField(
+        ("auction_end_date",),
+        lambda row, serializer: row["auction_end_date"] >= serializer.today,
+    ),
+    "owner": ItemField(
+        ("owner_id", "owner__first_name", "owner__last_name", "owner__email"),
+        render_owner,
+    ),
+    "auction_winner": ItemField(
+        (
+            "auction_winner_id",
+            "auction_winner__first_name",
+            "auction_winner__last_name",
+        ),
+        render_auction_winner,
+    ),
+    "item_image": ItemField(("item_image", "item_image_status"), render_item_image),
+    "image_srcset": ItemField(
+        ("item_image_renditions", "item_image_status"), render_image_srcset
+    ),
+    "image_status": ItemField(
+        ("item_image_status",), lambda row, serializer: row["item_image_status"]
+    ),
+    "highest_bid": ItemField(
+        ("current_highest_bid",), lambda row, serializer: row["current_highest_bid"]
+    ),
+    "bid_count": column("bid_count"),
+}
+
+
+# The fields each item view returns
+ITEM_LIST_FIELDS = (
+    "id",
+    "title",
+    "description",
+    "minimum_bid",
+    "auction_end_date",
+    "created_at",
+    "owner",
+    "auction_winner",
+    "item_image",
+    "image_status",
+    "image_srcset",
+    "highest_bid",
+    "bid_count",
+)
+ITEM_DETAIL_FIELDS = (
+    "id",
+    "title",
+    "description",
+    "minimum_bid",
+    "auction_end_date",
+    "created_at",
+    "is_active",
+    "owner",
+    "auction_winner",
+    "item_image",
+    "image_status",
+    "highest_bid",
+    "bid_count",
+)
+ITEM_FIELDS_ON_WRITE = (
+    "id",
+    "title",
+    "description",
+    "minimum_bid",
+    "auction_end_date",
+    "created_at",
+    "owner",
+    "item_image",
+    "image_status",
+)
+USER_ITEM_FIELDS = (
+    "id",
+    "title",
+    "description",
+    "minimum_bid",
+    "auction_end_date",
+    "created_at",
+    "is_active",
+    "owner",
+    "auction_winner",
+    "item_image",
+    "image_status",
+    "image_srcset",
+)
+USER_BIDDED_ITEM_FIELDS = (
+    "id",
+    "title",
+    "description",
+    "minimum_bid",
+    "auction_end_date",
+    "is_active",
+    "highest_bid",
+    "owner",
+    "item_image",
+    "image_status",
+)
+
+
+@lru_cache(maxsize=64)
+def compile_item_fields(fields):
+    """
+    Return (columns, renderers) for a tuple of field names: the .values()
+    columns they need and a (name, render) pair per field.
+    """
+    columns = []
+    renderers = []
+    for name in fields:
+        field = ITEM_FIELDS[name]
+        for column_name in field.columns:
+            if column_name not in columns:
+                columns.append(column_name)
+        renderers.append((name, field.render))
+    return tuple(columns), tuple(renderers)
+
+
+def requested_fields(request, default_fields):
+    """
+    Return the fields named in the request's ``fields`` parameter, limited to
+    default_fields (id is always included), or default_fields if it is absent.
+    Raises ValueError naming any field the view doesn't offer.
+    """
+    requested = request.GET.get("fields")
+    if not requested:
+        return default_fields
+
+    names = [name.strip() for name in requested.split(",") if name.strip()]
+    unknown = [name for name in names if name not in default_fields]
+    if unknown:
+        raise ValueError(f"Unknown field(s): {', '.join(unknown)}")
+    return tuple(name for name in default_fields if name == "id" or name in names)
+
+
+class ItemSerializer:
+    def __init__(self, request, fields):
+        self.fields = tuple(fields)
+        self.columns, self.renderers = compile_item_fields(self.fields)
+        self.media_base = request.build_absolute_uri(settings.MEDIA_URL)
+        self.today = date.today()
+
+    def rows(self, queryset, *extra_columns):
+        """Restrict an item queryset to the columns the fields need"""
+        columns = self.columns + tuple(
+            name for name in extra_columns if name not in self.columns
+        )
+        return queryset.values(*columns)
+
+    def serialize(self, row):
+        return {name: render(row, self) for name, render in self.renderers}
+
+    def serialize_instance(self, item):
+        """Serialize an Item instance already in memory, e.g. after a write"""
+        return self.serialize(row_from_instance(item, self.columns))
+
+
+def row_from_instance(instance, columns):
+    """Build the .values() row for columns from a model instance"""
+    row = {}
+    for name in columns:
+        value = instance
+        for attribute in name.split("__"):
+            value = getattr(value, attribute) if value is not None else None
+        if isinstance(value, FieldFile):
+            # .values() returns the stored file name
+            value = value.name
+        row[name] = value
+    return row
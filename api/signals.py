@@ -0,0 +1,79 @@
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models import Q
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .caching import invalidate_item
+from .metrics import record_query
+from .models import Bid, Item, User
+from .search_index import loaded_item_index, update_item_index
+
+
+@receiver(post_save, sender=Item)
+def index_saved_item(sender, instance, **kwargs):
+    # Only maintain the in-memory search index once something has built it,
+    # and only once the change is committed
+    if loaded_item_index() is not None:
+        transaction.on_commit(
+            lambda: update_item_index(
+                "add",
+                instance.id,
+                instance.title,
+                instance.description,
+                instance.created_at,
+                instance.auction_end_date,
+            )
+        )
+
+
+@receiver(post_delete, sender=Item)
+def unindex_deleted_item(sender, instance, **kwargs):
+    if loaded_item_index() is not None:
+        item_id = instance.id
+        transaction.on_commit(lambda: update_item_index("remove", item_id))
+
+
+@receiver(post_save, sender=Item)
+@receiver(post_delete, sender=Item)
+def invalidate_cached_item(sender, instance, **kwargs):
+    invalidate_item(instance.id)
+
+
+@receiver(post_save, sender=Bid)
+@receiver(post_delete, sender=Bid)
+def invalidate_bid_item(sender, instance, **kwargs):
+    # The item's highest bid and bid count changed with it
+    invalidate_item(instance.item_id)
+
+
+# Item details show their owner's and winner's names and the owner's email
+USER_ITEM_FIELDS = {"first_name", "last_name", "email"}
+
+
+def user_item_ids(user):
+    return list(
+        Item.objects.filter(Q(owner=user) | Q(auction_winner=user)).values_list(
+            "id", flat=True
+        )
+    )
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_items(sender, instance, created, update_fields=None, **kwargs):
+    if created or (update_fields is not None and not USER_ITEM_FIELDS & set(update_fields)):
+        return
+    invalidate_item(*user_item_ids(instance))
+
+
+@receiver(pre_delete, sender=User)
+def invalidate_deleted_user_items(sender, instance, **kwargs):
+    # Before the delete nulls the foreign keys, so the items can still be found
+    invalidate_item(*user_item_ids(instance))
+
+
+@receiver(connection_created)
+def instrument_connection(sender, connection, **kwargs):
+    # Count and time every query for the request metrics (see api.metrics)
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
@@ -0,0 +1,220 @@
+"""
+Content-addressed media storage.
+
+ContentAddressedStorage (the default storage, see STORAGES) names every file
+it saves by the SHA-256 of its contents, keeping the directory and extension
+it was given: saving ``item_pictures/item_5.jpg`` stores
+``item_pictures/3f/3fa1...e9.jpg``. A file's name therefore never points at
+different bytes, so media URLs can be cached forever, and identical files are
+stored once.
+
+Each stored file has a MediaBlob row counting the references handed out by
+save(). delete() drops one reference; the file itself is removed after the
+transaction commits, if nothing has taken a new reference in the meantime.
+Files that leak anyway (a rolled back transaction after the file was
+written, rows deleted without their images) are found by
+``manage.py gc_media``, which recounts references from the image columns.
+"""
+
+import hashlib
+import os
+import posixpath
+import re
+import uuid
+from datetime import timedelta
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.core.files.utils import validate_file_name
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+# <directory>/<first two hex digits>/<sha256><extension>
+CONTENT_NAME = re.compile(r"(?:^|/)([0-9a-f]{2})/\1[0-9a-f]{62}(\.\w+)?$")
+
+
+def is_content_name(name):
+    """Whether name is a content-addressed (immutable) file name"""
+    return bool(CONTENT_NAME.search(name))
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    def content_name(self, name, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        digest = digest.hexdigest()
+        directory, basename = posixpath.split(name.replace("\\", "/"))
+        extension = os.path.splitext(basename)[1].lower()
+        return posixpath.join(directory, digest[:2], digest + extension)
+
+    def save(self, name, content, max_length=None):
+        """Store content (once) and take a reference to it; returns its name"""
+        from .models import MediaBlob
+
+        if name is None:
+            name = content.name
+        if not hasattr(content, "chunks"):
+            content = File(content, name)
+        name = self.content_name(name, content)
+        validate_file_name(name, allow_relative_path=True)
+
+        with transaction.atomic():
+            # The row is written first so a concurrent delete() of the same
+            # file waits for this transaction
+            now = timezone.now()
+            blobs = MediaBlob.objects.filter(name=name)
+            if not blobs.update(refcount=F("refcount") + 1, touched_at=now):
+                try:
+                    with transaction.atomic():
+                        MediaBlob.objects.create(
+                            name=name, refcount=1, size=content.size, touched_at=now
+                        )
+                except IntegrityError:
+                    blobs.update(refcount=F("refcount") + 1, touched_at=now)
+            if not self.exists(name):
+                self.write(name, content)
+        return name
+
+    def write(self, name, content):
+        # Written under a temporary name and renamed, so readers never see a
+        # partial file
+        path = self.path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if self.directory_permissions_mode is not None:
+            os.chmod(os.path.dirname(path), self.directory_permissions_mode)
+        temporary = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            with open(temporary, "wb") as file:
+                for chunk in content.chunks():
+                    file.write(chunk)
+            if self.file_permissions_mode is not None:
+                os.chmod(temporary, self.file_permissions_mode)
+            os.replace(temporary, path)
+        except BaseException:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+            raise
+
+    def delete(self, name):
+        """Drop a reference; the file goes once none are left"""
+        from .models import MediaBlob
+
+        if not name:
+            raise ValueError("The name must be given to delete().")
+        if not is_content_name(name):
+            # Saved before content addressing, never shared
+            super().delete(name)
+            return
+
+        MediaBlob.objects.filter(name=name, refcount__gt=0).update(
+            refcount=F("refcount") - 1
+        )
+        transaction.on_commit(lambda: self.remove_unreferenced(name))
+
+    def remove_unreferenced(self, name):
+        from .models import MediaBlob
+
+        with transaction.atomic():
+            if MediaBlob.objects.filter(name=name, refcount__lte=0).delete()[0]:
+                self.remove(name)
+
+    def remove(self, name):
+        """Delete the file outright, whatever references it"""
+        super().delete(name)
+
+    def content_names(self, directory=""):
+        """Every content-addressed file under directory"""
+        if not self.exists(directory):
+            return
+        directories, files = self.listdir(directory)
+        for filename in files:
+            name = posixpath.join(directory, filename)
+            if is_content_name(name):
+                yield name
+        for subdirectory in directories:
+            yield from self.content_names(posixpath.join(directory, subdirectory))
+
+
+class GarbageStats:
+    """What one collect_garbage() run found"""
+
+    def __init__(self):
+        self.removed = 0
+        self.removed_bytes = 0
+        self.recounted = 0
+        self.missing = 0
+
+    def __str__(self):
+        return (
+            f"removed {self.removed} file(s) ({self.removed_bytes / 1024 / 1024:.1f} MB), "
+            f"corrected {self.recounted} reference count(s), "
+            f"{self.missing} referenced file(s) missing"
+        )
+
+
+def media_references():
+    """How many times each stored file is referenced by the image columns"""
+    from django.apps import apps
+
+    from .images import IMAGE_FIELDS
+
+    references = {}
+    for label, (field_name, _, renditions) in IMAGE_FIELDS.items():
+        columns = [field_name] + ([f"{field_name}_renditions"] if renditions else [])
+        for row in apps.get_model(label).objects.values_list(*columns):
+            names = [row[0]] if row[0] else []
+            if renditions and row[1]:
+                for by_width in row[1].values():
+                    names.extend(by_width.values())
+            for name in names:
+                references[name] = references.get(name, 0) + 1
+    return references
+
+
+def collect_garbage(storage, grace=timedelta(hours=1), dry_run=False):
+    """
+    Bring every MediaBlob's count in line with the image columns and remove
+    the files nothing references. Files and rows changed within grace are
+    left alone, since a save() may not have been recorded on its row yet.
+    Returns a GarbageStats.
+    """
+    from .models import MediaBlob
+
+    stats = GarbageStats()
+    cutoff = timezone.now() - grace
+    references = media_references()
+
+    for blob in MediaBlob.objects.filter(touched_at__lt=cutoff).iterator():
+        count = references.get(blob.name, 0)
+        if count != blob.refcount:
+            stats.recounted += 1
+            if not dry_run:
+                MediaBlob.objects.filter(pk=blob.pk, touched_at=blob.touched_at).update(
+                    refcount=count
+                )
+        if count and not storage.exists(blob.name):
+            stats.missing += 1
+
+    # Unreferenced files, with or without a row
+    for name in storage.content_names():
+        if references.get(name) or storage.get_modified_time(name) >= cutoff:
+            continue
+        size = storage.size(name)
+        if not dry_run:
+            with transaction.atomic():
+                # Unless a save() has just taken a reference
+                if MediaBlob.objects.filter(name=name, touched_at__gte=cutoff).exists():
+                    continue
+                MediaBlob.objects.filter(name=name).delete()
+                storage.remove(name)
+        stats.removed += 1
+        stats.removed_bytes += size
+
+    if not dry_run:
+        # Rows left behind by files deleted some other way
+        for blob in MediaBlob.objects.filter(refcount=0, touched_at__lt=cutoff):
+            if not storage.exists(blob.name):
+                blob.delete()
+    return stats
@@ -1,11 +1,57 @@
-from django.test import TestCase, Client
+from django.test import TestCase, TransactionTestCase, Client, AsyncClient, override_settings
+from django.test.utils import CaptureQueriesContext
+from unittest import mock, skipUnless
+from django.db import connection, transaction, OperationalError
+from django.db.backends.signals import connection_created
+from django.db.models import F
+from django.core.management import CommandError, call_command
+from django.core import mail
+from django.core.mail.backends import locmem
+from django.conf import settings
 from django.contrib.auth import authenticate, get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage, default_storage
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.utils import timezone
 from datetime import date, timedelta
+from decimal import Decimal
+import asyncio
 import json
 import io
+import os
+import random
+import shutil
+import smtplib
+import tempfile
+import threading
+import time
+from asgiref.sync import ThreadSensitiveContext, sync_to_async
 from PIL import Image
-from .models import Item, Bid, Message
+from .models import Item, Bid, Message, EmailOutbox, ImageStatus, MediaBlob
+from .bidding import BidRejected, place_bid
+from .images import save_upload
+from .cron import process_auction_winners
+from .outbox import enqueue_email, enqueue_emails, send_outbox
+from . import search_index
+from .search_index import reset_item_index
+from .responses import JsonResponse, StdlibJSONEncoder
+from .storage import is_content_name
+from .events import (
+    LocalHub,
+    SubscriberOverflow,
+    get_hub,
+    item_channel,
+    release_request_thread,
+)
+from .metrics import REQUEST_METRICS
+from .caching import (
+    ITEM_CACHE_STATS,
+    LISTING_CACHE_STATS,
+    bump_items,
+    cached_item_row,
+    cached_listing,
+    item_cache,
+)
 
 User = get_user_model()
 
@@ -243,6 +289,9 @@ class ProfilePictureTest(TestCase):
             password="testpass123",
         )
         self.client.force_login(self.user)
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        self.enterContext(self.settings(MEDIA_ROOT=media_root))
 
     def create_test_image(self):
         """Create a test image file"""
@@ -300,6 +349,551 @@ class ProfilePictureTest(TestCase):
         self.assertEqual(response.status_code, 404)
 
 
+def make_upload(name="photo.png", size=(100, 100), mode="RGB", image_format="PNG"):
+    """An uploaded image file"""
+    file = io.BytesIO()
+    Image.new(mode, size, color="red").save(file, image_format)
+    return SimpleUploadedFile(name, file.getvalue(), content_type="image/png")
+
+
+@override_settings(IMAGE_PROCESSING_WORKERS=0)
+class ImagePipelineTest(TestCase):
+    """Test uploads are stored raw and processed after the response"""
+
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(
+            first_name="Test",
+            last_name="User",
+            email="test@example.com",
+            date_of_birth=date(1990, 1, 1),
+            password="testpass123",
+        )
+        self.client.force_login(self.user)
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        self.enterContext(self.settings(MEDIA_ROOT=media_root))
+
+    def create_item(self, upload):
+        return self.client.post(
+            "/items/create/",
+            {
+                "title": "Lamp",
+                "description": "Desk lamp",
+                "minimum_bid": "10",
+                "auction_end_date": str(date.today() + timedelta(days=7)),
+                "item_image": upload,
+            },
+        )
+
+    def test_item_image_processing_then_ready(self):
+        """Test an item image reports processing until its job has run"""
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.create_item(make_upload(size=(3000, 2000), mode="RGBA"))
+
+        self.assertEqual(response.status_code, 200)
+        item_data = response.json()["item"]
+        self.assertEqual(item_data["image_status"], "processing")
+        self.assertIsNone(item_data["item_image"])
+        listed = self.client.get("/items/").json()["items"][0]
+        self.assertEqual(listed["image_status"], "processing")
+        self.assertIsNone(listed["item_image"])
+        # Cached while processing; the finished job must drop it
+        detail = self.client.get(f"/items/{item_data['id']}/").json()["item"]
+        self.assertEqual(detail["image_status"], "processing")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            for callback in callbacks:
+                callback()
+
+        item = Item.objects.get(id=item_data["id"])
+        self.assertEqual(item.item_image_status, ImageStatus.READY)
+        self.assertRegex(item.item_image.name, r"^item_pictures/[0-9a-f]{2}/[0-9a-f]{64}\.jpg$")
+        with Image.open(item.item_image) as image:
+            self.assertEqual(image.format, "JPEG")
+            self.assertEqual(image.size, (1024, 683))
+        detail = self.client.get(f"/items/{item.id}/").json()["item"]
+        self.assertEqual(detail["image_status"], "ready")
+        self.assertEqual(detail["item_image"], "http://testserver" + item.item_image.url)
+
+    def test_item_image_renditions(self):
+        """Test item images get smaller renditions, listed as srcsets"""
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_item(make_upload(size=(2000, 1000)))
+
+        item = Item.objects.get()
+        renditions = item.item_image_renditions
+        self.assertEqual(set(renditions["jpg"]), {"1024", "400", "160"})
+        self.assertIn("webp", renditions)
+        with Image.open(item.item_image.storage.open(renditions["webp"]["400"])) as image:
+            self.assertEqual(image.format, "WEBP")
+            self.assertEqual(image.size, (400, 200))
+
+        srcset = self.client.get("/items/").json()["items"][0]["image_srcset"]
+        jpg = srcset["jpg"].split(", ")
+        self.assertEqual([entry.split(" ")[1] for entry in jpg], ["160w", "400w", "1024w"])
+        self.assertTrue(jpg[0].startswith("http://testserver/"))
+        user_items = self.client.get(f"/users/{self.user.id}/items/").json()["items"]
+        self.assertEqual(user_items[0]["image_srcset"], srcset)
+
+    def test_renditions_shared_by_identical_uploads(self):
+        """Test the same image uploaded twice reuses its renditions"""
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_item(make_upload(size=(300, 300)))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_item(make_upload(size=(300, 300)))
+
+        first, second = Item.objects.order_by("id")
+        # Small images aren't scaled up
+        self.assertEqual(set(first.item_image_renditions["jpg"]), {"300", "160"})
+        self.assertEqual(first.item_image_renditions, second.item_image_renditions)
+
+    def test_replaced_upload_keeps_shared_raw_file(self):
+        """Test a stale job doesn't release a raw upload another row still uses"""
+        with self.captureOnCommitCallbacks() as first_callbacks:
+            self.create_item(make_upload(size=(300, 300)))
+        with self.captureOnCommitCallbacks() as second_callbacks:
+            self.create_item(make_upload(size=(300, 300)))
+        first, second = Item.objects.order_by("id")
+        raw_name = second.item_image.name
+        self.assertEqual(first.item_image.name, raw_name)
+        self.assertEqual(MediaBlob.objects.get(name=raw_name).refcount, 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            save_upload(first, make_upload(size=(200, 200)))
+        self.assertEqual(MediaBlob.objects.get(name=raw_name).refcount, 1)
+
+        # The first item's job for its old upload finishes afterwards
+        with self.captureOnCommitCallbacks(execute=True):
+            for callback in first_callbacks:
+                callback()
+        self.assertEqual(MediaBlob.objects.get(name=raw_name).refcount, 1)
+        self.assertTrue(second.item_image.storage.exists(raw_name))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            for callback in second_callbacks:
+                callback()
+        second.refresh_from_db()
+        self.assertEqual(second.item_image_status, ImageStatus.READY)
+
+    def test_raw_upload_removed_after_processing(self):
+        """Test the raw upload is deleted once processed"""
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                "/profile/picture/upload/", {"profile_picture": make_upload()}
+            )
+            self.user.refresh_from_db()
+            raw_name = self.user.profile_picture.name
+
+        self.assertTrue(raw_name.startswith("uploads/"))
+        self.assertFalse(self.user.profile_picture.storage.exists(raw_name))
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.profile_picture_status, ImageStatus.READY)
+        profile = self.client.get("/profile/").json()
+        self.assertEqual(profile["profile_picture_status"], "ready")
+        self.assertEqual(
+            profile["profile_picture"], "http://testserver" + self.user.profile_picture.url
+        )
+        self.assertTrue(self.user.profile_picture.name.startswith("profile_pictures/"))
+
+    def test_login_hides_unprocessed_profile_picture(self):
+        """Test login only returns the profile picture URL once it is processed"""
+
+        def login():
+            response = Client().post(
+                "/login/", {"email": "test@example.com", "password": "testpass123"}
+            )
+            return response.json()["user"]["profile_picture"]
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.client.post(
+                "/profile/picture/upload/", {"profile_picture": make_upload()}
+            )
+        self.assertIsNone(login())
+
+        for callback in callbacks:
+            callback()
+        self.user.refresh_from_db()
+        self.assertEqual(login(), "http://testserver" + self.user.profile_picture.url)
+
+    def test_non_image_rejected_immediately(self):
+        """Test files that aren't images are rejected on the request"""
+        response = self.create_item(
+            SimpleUploadedFile("notes.png", b"not an image", content_type="image/png")
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Item.objects.exists())
+
+    def test_large_jpeg_scaled_on_decode(self):
+        """Test large JPEGs are reduced to the served size with their aspect ratio"""
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_item(make_upload("photo.jpg", size=(4000, 3000), image_format="JPEG"))
+
+        item = Item.objects.get()
+        with Image.open(item.item_image) as image:
+            self.assertEqual(image.size, (1024, 768))
+            self.assertEqual(image.getpixel((512, 384)), image.getpixel((0, 0)))
+
+    def test_transparency_flattened_onto_white(self):
+        """Test transparent pixels come out white"""
+        with self.captureOnCommitCallbacks(execute=True):
+            # make_upload's red RGBA image is opaque
+            self.create_item(make_upload(size=(2000, 2000), mode="RGBA"))
+        transparent = io.BytesIO()
+        Image.new("LA", (1600, 1200), (0, 0)).save(transparent, "PNG")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_item(SimpleUploadedFile("clear.png", transparent.getvalue()))
+
+        opaque, clear = Item.objects.order_by("id")
+        with Image.open(opaque.item_image) as image:
+            self.assertGreater(image.getpixel((10, 10))[0], 240)
+            self.assertLess(image.getpixel((10, 10))[1], 15)
+        with Image.open(clear.item_image) as image:
+            self.assertEqual(image.size, (1024, 768))
+            self.assertTrue(all(channel > 250 for channel in image.getpixel((10, 10))))
+
+    @override_settings(IMAGE_MAX_PIXELS=1_000_000)
+    def test_too_many_pixels_rejected(self):
+        """Test images over the pixel budget are rejected from their header"""
+        response = self.create_item(make_upload(size=(1001, 1000)))
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("megapixels", response.json()["error"])
+        self.assertFalse(Item.objects.exists())
+
+    def test_undecodable_image_marked_failed(self):
+        """Test an image whose header parses but whose data doesn't is marked failed"""
+        data = make_upload(size=(400, 400), image_format="JPEG").read()
+        upload = SimpleUploadedFile("photo.jpg", data[: len(data) // 3])
+
+        with self.assertLogs("api.images", level="WARNING"):
+            with self.captureOnCommitCallbacks(execute=True):
+                item_id = self.create_item(upload).json()["item"]["id"]
+
+        item = Item.objects.get(id=item_id)
+        self.assertEqual(item.item_image_status, ImageStatus.FAILED)
+        self.assertFalse(item.item_image)
+
+    def test_replaced_upload_discards_stale_result(self):
+        """Test a job finishing after a newer upload doesn't overwrite it"""
+        with self.captureOnCommitCallbacks() as first:
+            self.client.post(
+                "/profile/picture/upload/", {"profile_picture": make_upload()}
+            )
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                "/profile/picture/upload/",
+                {"profile_picture": make_upload(size=(50, 50))},
+            )
+        for callback in first:
+            with self.assertLogs("api.images", level="WARNING"):
+                # Its raw file went with the replacement
+                callback()
+
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.profile_picture_status, ImageStatus.READY)
+        with Image.open(self.user.profile_picture) as image:
+            self.assertEqual(image.size, (50, 50))
+
+
+class ContentAddressedStorageTest(TestCase):
+    """Test media files are named by content, shared and reference counted"""
+
+    def setUp(self):
+        # A media root of its own, so gc_media only sees these tests' files
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        self.enterContext(self.settings(MEDIA_ROOT=media_root))
+        self.storage = default_storage
+
+    def save(self, name, data):
+        return self.storage.save(name, ContentFile(data))
+
+    def test_identical_files_stored_once(self):
+        """Test saving the same bytes twice gives one file with two references"""
+        first = self.save("item_pictures/a.jpg", b"same bytes")
+        second = self.save("item_pictures/b.JPG", b"same bytes")
+        other = self.save("item_pictures/a.jpg", b"other bytes")
+
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, other)
+        self.assertTrue(is_content_name(first))
+        self.assertEqual(MediaBlob.objects.get(name=first).refcount, 2)
+        with self.storage.open(first) as file:
+            self.assertEqual(file.read(), b"same bytes")
+
+    def test_file_removed_with_last_reference(self):
+        """Test a shared file survives until its last reference is deleted"""
+        name = self.save("item_pictures/a.jpg", b"shared")
+        self.save("item_pictures/a.jpg", b"shared")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.storage.delete(name)
+        self.assertTrue(self.storage.exists(name))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.storage.delete(name)
+        self.assertFalse(self.storage.exists(name))
+        self.assertFalse(MediaBlob.objects.filter(name=name).exists())
+
+    def test_rolled_back_delete_keeps_file(self):
+        """Test the file isn't removed when the deleting transaction rolls back"""
+        name = self.save("item_pictures/a.jpg", b"kept")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    self.storage.delete(name)
+                    raise ValueError
+            except ValueError:
+                pass
+
+        self.assertTrue(self.storage.exists(name))
+        self.assertEqual(MediaBlob.objects.get(name=name).refcount, 1)
+
+    def test_identical_item_images_shared(self):
+        """Test two items with the same photo share its files until both are deleted"""
+        user = User.objects.create_user(
+            first_name="Test",
+            last_name="User",
+            email="test@example.com",
+            date_of_birth=date(1990, 1, 1),
+            password="testpass123",
+        )
+        self.client.force_login(user)
+        with override_settings(IMAGE_PROCESSING_WORKERS=0):
+            for _ in range(2):
+                with self.captureOnCommitCallbacks(execute=True):
+                    self.client.post(
+                        "/items/create/",
+                        {
+                            "title": "Lamp",
+                            "description": "Desk lamp",
+                            "minimum_bid": "10",
+                            "auction_end_date": str(date.today() + timedelta(days=7)),
+                            "item_image": make_upload(size=(500, 500)),
+                        },
+                    )
+
+        first, second = Item.objects.order_by("id")
+        self.assertEqual(first.item_image.name, second.item_image.name)
+        names = [first.item_image.name] + list(first.item_image_renditions["webp"].values())
+        for name in names:
+            self.assertEqual(MediaBlob.objects.get(name=name).refcount, 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(f"/items/{first.id}/delete/")
+        self.assertTrue(all(self.storage.exists(name) for name in names))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(f"/items/{second.id}/delete/")
+        self.assertFalse(any(self.storage.exists(name) for name in names))
+
+    def test_content_addressed_media_cached_forever(self):
+        """Test hashed media URLs are served immutable and others are not"""
+        name = self.save("item_pictures/a.jpg", b"cached")
+        legacy = FileSystemStorage().save("item_pictures/item_1.jpg", ContentFile(b"old"))
+
+        response = self.client.get(self.storage.url(name))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Cache-Control"], "public, max-age=31536000, immutable")
+        self.assertEqual(self.client.get(self.storage.url(legacy))["Cache-Control"], "no-cache")
+
+    def test_gc_media(self):
+        """Test gc_media fixes counts and removes only unreferenced files"""
+        item = Item.objects.create(
+            title="Lamp",
+            description="Desk lamp",
+            minimum_bid=10,
+            auction_end_date=date.today(),
+        )
+        item.item_image.save("lamp.jpg", ContentFile(b"referenced"), save=True)
+        # Leaked references: a second count on the item's file, and a file
+        # nothing points at
+        self.save("item_pictures/lamp.jpg", b"referenced")
+        orphan = self.save("item_pictures/orphan.jpg", b"orphan")
+        # A file written without its row, e.g. by a rolled back save
+        stray = self.storage.content_name("renditions/160.jpg", ContentFile(b"stray"))
+        self.storage.write(stray, ContentFile(b"stray"))
+
+        out = io.StringIO()
+        call_command("gc_media", "--grace", "0", "--dry-run", stdout=out)
+        self.assertIn("removed 2 file(s)", out.getvalue())
+        self.assertTrue(self.storage.exists(orphan))
+
+        call_command("gc_media", "--grace", "0", stdout=io.StringIO())
+        self.assertEqual(MediaBlob.objects.get(name=item.item_image.name).refcount, 1)
+        self.assertTrue(self.storage.exists(item.item_image.name))
+        self.assertFalse(self.storage.exists(orphan))
+        self.assertFalse(self.storage.exists(stray))
+        self.assertFalse(MediaBlob.objects.filter(name=orphan).exists())
+
+
+class MediaServingTest(TestCase):
+    """Test media files are served with validators, ranges and cache headers"""
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        self.enterContext(self.settings(MEDIA_ROOT=media_root))
+        self.name = default_storage.save("item_pictures/a.jpg", ContentFile(b"0123456789"))
+        self.url = default_storage.url(self.name)
+
+    def body(self, response):
+        return b"".join(response.streaming_content)
+
+    def test_serves_file_with_validators(self):
+        """Test a hashed file is sent with its hash as ETag and cached forever"""
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.body(response), b"0123456789")
+        self.assertEqual(response["Content-Type"], "image/jpeg")
+        self.assertEqual(response["ETag"], f'"{self.name.split("/")[-1][:-4]}"')
+        self.assertIn("Last-Modified", response)
+        self.assertEqual(response["Accept-Ranges"], "bytes")
+        self.assertEqual(response["Cache-Control"], "public, max-age=31536000, immutable")
+
+    def test_not_modified(self):
+        """Test revalidating with the ETag or date gets a 304"""
+        response = self.client.get(self.url)
+
+        revalidated = self.client.get(self.url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(revalidated.status_code, 304)
+        self.assertEqual(revalidated["ETag"], response["ETag"])
+        revalidated = self.client.get(
+            self.url, HTTP_IF_MODIFIED_SINCE=response["Last-Modified"]
+        )
+        self.assertEqual(revalidated.status_code, 304)
+        self.assertEqual(
+            self.client.get(self.url, HTTP_IF_NONE_MATCH='"other"').status_code, 200
+        )
+
+    def test_ranges(self):
+        """Test single byte ranges are honoured"""
+        response = self.client.get(self.url, HTTP_RANGE="bytes=2-5")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(self.body(response), b"2345")
+        self.assertEqual(response["Content-Range"], "bytes 2-5/10")
+        self.assertEqual(response["Content-Length"], "4")
+
+        response = self.client.get(self.url, HTTP_RANGE="bytes=-3")
+        self.assertEqual(self.body(response), b"789")
+        response = self.client.get(self.url, HTTP_RANGE="bytes=8-")
+        self.assertEqual(self.body(response), b"89")
+
+        response = self.client.get(self.url, HTTP_RANGE="bytes=10-")
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response["Content-Range"], "bytes */10")
+
+        # A stale If-Range gets the whole file
+        response = self.client.get(
+            self.url, HTTP_RANGE="bytes=2-5", HTTP_IF_RANGE='"stale"'
+        )
+        self.assertEqual(response.status_code, 200)
+
+    async def test_asgi_streams_asynchronously(self):
+        """Test under ASGI files and ranges are streamed from an async iterator"""
+        async def body(response):
+            self.assertTrue(response.is_async)
+            return b"".join([chunk async for chunk in response.streaming_content])
+
+        response = await self.async_client.get(self.url)
+        self.assertEqual(await body(response), b"0123456789")
+        self.assertEqual(response["Content-Length"], "10")
+
+        response = await self.async_client.get(self.url, headers={"Range": "bytes=2-5"})
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(await body(response), b"2345")
+        self.assertEqual(response["Content-Length"], "4")
+
+    def test_missing_and_outside_files(self):
+        """Test missing files, directories and paths outside MEDIA_ROOT 404"""
+        for path in ["/media/nope.jpg", "/media/item_pictures/", "/media/../settings.py"]:
+            self.assertEqual(self.client.get(path).status_code, 404, path)
+
+    def test_deleted_file_forgotten(self):
+        """Test an indexed file that is deleted stops being served"""
+        self.client.get(self.url)
+        default_storage.remove(self.name)
+
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+    def test_mutable_file_changes_seen(self):
+        """Test files under non-hashed names are revalidated, not cached"""
+        legacy = FileSystemStorage()
+        name = legacy.save("item_pictures/item_1.jpg", ContentFile(b"old"))
+        url = legacy.url(name)
+        etag = self.client.get(url)["ETag"]
+
+        with open(legacy.path(name), "wb") as file:
+            file.write(b"newer")
+        os.utime(legacy.path(name), (time.time() + 10, time.time() + 10))
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.body(response), b"newer")
+        self.assertEqual(response["Cache-Control"], "no-cache")
+
+    def test_front_end_server_modes(self):
+        """Test X-Accel-Redirect and X-Sendfile leave sending to the front end"""
+        with self.settings(
+            MEDIA_SERVING="x-accel-redirect", MEDIA_ACCEL_REDIRECT_PREFIX="/internal/"
+        ):
+            response = self.client.get(self.url)
+        self.assertEqual(response["X-Accel-Redirect"], f"/internal/{self.name}")
+        self.assertEqual(response.content, b"")
+        self.assertEqual(response["Content-Type"], "image/jpeg")
+        self.assertEqual(response["Cache-Control"], "public, max-age=31536000, immutable")
+
+        with self.settings(MEDIA_SERVING="x-sendfile"):
+            response = self.client.get(self.url)
+        self.assertEqual(response["X-Sendfile"], default_storage.path(self.name))
+        self.assertEqual(response.content, b"")
+
+
+class ImageWorkerPoolTest(TransactionTestCase):
+    """Test uploads are processed by the worker pool"""
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        self.enterContext(self.settings(MEDIA_ROOT=media_root))
+
+    @override_settings(IMAGE_PROCESSING_WORKERS=1)
+    def test_pool_processes_upload(self):
+        """Test an item image is processed in the background and marked ready"""
+        user = User.objects.create_user(
+            first_name="Test",
+            last_name="User",
+            email="test@example.com",
+            date_of_birth=date(1990, 1, 1),
+            password="testpass123",
+        )
+        self.client.force_login(user)
+        response = self.client.post(
+            "/items/create/",
+            {
+                "title": "Lamp",
+                "description": "Desk lamp",
+                "minimum_bid": "10",
+                "auction_end_date": str(date.today() + timedelta(days=7)),
+                "item_image": make_upload(size=(2048, 2048)),
+            },
+        )
+        self.assertEqual(response.json()["item"]["image_status"], "processing")
+
+        item = Item.objects.get(id=response.json()["item"]["id"])
+        deadline = time.monotonic() + 30
+        while item.item_image_status == ImageStatus.PROCESSING:
+            self.assertLess(time.monotonic(), deadline, "image was not processed")
+            time.sleep(0.05)
+            item.refresh_from_db()
+
+        self.assertEqual(item.item_image_status, ImageStatus.READY)
+        with Image.open(item.item_image) as image:
+            self.assertEqual(image.size, (1024, 1024))
+
+
 class UserUpdateTest(TestCase):
     """Test user updates"""
 
@@ -523,6 +1117,1346 @@ class GetPaginatedItemsTest(TestCase):
         response = self.client.post("/items/")
         self.assertEqual(response.status_code, 405)
 
+    def test_highest_bid_and_bid_count(self):
+        """Test listing reports the highest bid and number of bids per item"""
+        bidder = User.objects.create_user(
+            first_name="Bid",
+            last_name="Der",
+            email="bidder@example.com",
+            date_of_birth=date(1990, 1, 1),
+            password="testpass123",
+        )
+        laptop = Item.objects.get(title="Laptop Computer")
+        Bid.objects.create(bidder=bidder, item=laptop, bid_amount=1100)
+        Bid.objects.create(bidder=bidder, item=laptop, bid_amount=1250)
+
+        response = self.client.get("/items/")
+        items_by_title = {item["title"]: item for item in response.json()["items"]}
+
+        self.assertEqual(items_by_title["Laptop Computer"]["highest_bid"], 1250)
+        self.assertEqual(items_by_title["Laptop Computer"]["bid_count"], 2)
+        self.assertIsNone(items_by_title["Smartphone"]["highest_bid"])
+        self.assertEqual(items_by_title["Smartphone"]["bid_count"], 0)
+
+    def test_query_count_independent_of_page_size(self):
+        """Test the number of queries does not grow with the page size"""
+        bidder = User.objects.create_user(
+            first_name="Bid",
+            last_name="Der",
+            email="bidder@example.com",
+            date_of_birth=date(1990, 1, 1),
+            password="testpass123",
+        )
+        future_date = date.today() + timedelta(days=7)
+        for i in range(20):
+            item = Item.objects.create(
+                title=f"Bulk Item {i}",
+                description="Bulk description",
+                owner=self.user,
+                auction_winner=bidder,
+                minimum_bid=10,
+                auction_end_date=future_date,
+            )
+            Bid.objects.create(bidder=bidder, item=item, bid_amount=20)
+
+        def count_queries(url):
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            return len(context.captured_queries)
+
+        small_page = count_queries("/items/?start=0&end=2")
+        large_page = count_queries("/items/?start=0&end=20")
+        search_page = count_queries("/items/?search=bulk&start=0&end=20")
+
+        self.assertEqual(small_page, large_page)
+        self.assertEqual(small_page, search_page)
+
+
+class ItemSearchTest(TestCase):
+    """Test full-text item search"""
+
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(
+            first_name="Test",
+            last_name="User",
+            email="test@example.com",
+            date_of_birth=date(1990, 1, 1),
+            password="testpass123",
+        )
+        future_date = date.today() + timedelta(days=7)
+        self.description_match = Item.objects.create(
+            title="Camera Bag",
+            description="Fits a camera and a small tripod",
+            owner=self.user,
+            minimum_bid=20,
+            auction_end_date=future_date,
+        )
+        self.title_match = Item.objects.create(
+            title="Tripod",
+            description="Aluminium, folds flat",
+            owner=self.user,
+            minimum_bid=40,
+            auction_end_date=future_date,
+        )
+
+    def search_titles(self, keyword):
+        response = self.client.get("/items/", {"search": keyword})
+        self.assertEqual(response.status_code, 200)
+        return [item["title"] for item in response.json()["items"]]
+
+    def test_title_match_ranks_above_description_match(self):
+        """Test a title match outranks a description-only match"""
+        self.assertEqual(self.search_titles("tripod"), ["Tripod", "Camera Bag"])
+
+    def test_prefix_match(self):
+        """Test partially typed words still match"""
+        self.assertEqual(self.search_titles("trip"), ["Tripod", "Camera Bag"])
+
+    def test_all_terms_must_match(self):
+        """Test multi-word searches only return items containing every word"""
+        self.assertEqual(self.search_titles("camera tripod"), ["Camera Bag"])
+
+    def test_index_follows_updates_and_deletes(self):
+        """Test the search index stays in sync with item changes"""
+        # Build any lazily created index before changing items
+        self.search_titles("tripod")
+
+        self.title_match.title = "Monopod"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.title_match.save()
+        self.assertEqual(self.search_titles("monopod"), ["Monopod"])
+        self.assertEqual(self.search_titles("tripod"), ["Camera Bag"])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.description_match.delete()
+        self.assertEqual(self.search_titles("tripod"), [])
+
+    def test_punctuation_only_search_returns_nothing(self):
+        """Test a search with no word characters matches nothing"""
+        self.assertEqual(self.search_titles('"*()'), [])
+
+    @override_settings(SEARCH_BACKEND="api.search.PatternSearchBackend")
+    def test_pattern_backend(self):
+        """Test the portable pattern-matching backend can be selected"""
+        self.assertEqual(self.search_titles("tripod"), ["Tripod", "Camera Bag"])
+
+
+@override_settings(SEARCH_BACKEND="api.search_index.InvertedIndexSearchBackend")
+class InvertedIndexSearchTest(ItemSearchTest):
+    """Test item search through the in-memory inverted index"""
+
+    def setUp(self):
+        reset_item_index()
+        self.addCleanup(reset_item_index)
+        super().setUp()
+
+    def test_expired_items_excluded(self):
+        """Test the index skips auctions that have already ended"""
+        self.title_match.auction_end_date = date.today() - timedelta(days=1)
+        self.title_match.save()
+
+        self.assertEqual(self.search_titles("tripod"), ["Camera Bag"])
+
+    def test_pagination(self):
+        """Test only the requested page is returned, with the full match count"""
+        response = self.client.get("/items/", {"search": "tripod", "start": 1, "end": 2})
+        data = response.json()
+
+        self.assertEqual([item["title"] for item in data["items"]], ["Camera Bag"])
+        self.assertEqual(data["total_count"], 2)
+
+    def test_stale_index_rebuilt_in_background(self):
+        """Test a stale index keeps serving searches while it is rebuilt"""
+        old = search_index.get_item_index()
+        fresh = search_index.ItemSearchIndex()
+        started, release = threading.Event(), threading.Event()
+
+        def build():
+            started.set()
+            release.wait(5)
+            return fresh
+
+        with override_settings(SEARCH_INDEX_MAX_AGE=0), mock.patch.object(
+            search_index, "build_item_index", build
+        ):
+            self.assertIs(search_index.get_item_index(), old)
+            self.assertTrue(started.wait(5))
+
+            # Changed mid-rebuild: applied to the old index and replayed onto the new
+            self.title_match.title = "Monopod"
+            with self.captureOnCommitCallbacks(execute=True):
+                self.title_match.save()
+            self.assertEqual(old.search("monopod")[0], [self.title_match.id])
+            # Only one rebuild at a time
+            self.assertIs(search_index.get_item_index(), old)
+
+            release.set()
+            for thread in threading.enumerate():
+                if thread.name == "item-index-rebuild":
+                    thread.join(5)
+
+        self.assertIs(search_index.loaded_item_index(), fresh)
+        self.assertEqual(fresh.search("monopod")[0], [self.title_match.id])
+
+
+class CursorPaginationTest(TestCase):
+    """Test keyset (cursor) pagination of the items listing"""
+
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(
+            first_name="Test",
+            last_name="User",
+            email="test@example.com",
+            date_of_birth=date(1990, 1, 1),
+            password="testpass123",
+        )
+        future_date = date.today() + timedelta(days=7)
+        for i in range(7):
+            Item.objects.create(
+                title=f"Lamp {i}",
+                description="Desk lamp" if i % 2 else "Floor lamp",
+                owner=self.user,
+                minimum_bid=10,
+                auction_end_date=future_date,
+            )
+        # Force a created_at tie so the id tiebreaker is exercised
+        Item.objects.filter(title__in=["Lamp 2", "Lamp 3"]).update(
+            created_at=Item.objects.get(title="Lamp 2").created_at
+        )
+
+    def walk_pages(self, params):
+        titles = []
+        cursor = ""
+        pages = 0
+        while cursor is not None:
+            response = self.client.get("/items/", {**params, "cursor": cursor})
+            self.assertEqual(response.status_code, 200)
+            data = response.json()
+            titles.extend(item["title"] for item in data["items"])
+            cursor = data["next_cursor"]
+            pages += 1
+        return titles, pages
+
+    def test_cursor_pages_match_offset_listing(self):
+        """Test walking the cursor returns every item once, in listing order"""
+        expected = [item["title"] for item in self.client.get("/items/").json()["items"]]
+
+        titles, pages = self.walk_pages({"limit": 3})
+
+        self.assertEqual(titles, expected)
+        self.assertEqual(pages, 3)
+
+    def test_search_cursor_pages(self):
+        """Test walking a search with a cursor returns every match once, in order"""
+        expected = [
+            item["title"]
+            for item in self.client.get("/items/", {"search": "desk"}).json()["items"]
+        ]
+
+        titles, _ = self.walk_pages({"search": "desk", "limit": 2})
+
+        self.assertEqual(titles, expected)
+        self.assertEqual(len(titles), 3)
+
+    @override_settings(SEARCH_BACKEND="api.search_index.InvertedIndexSearchBackend")
+    def test_inverted_index_search_cursor_pages(self):
+        """Test cursor pagination through the in-memory index backend"""
+        reset_item_index()
+        self.addCleanup(reset_item_index)
+        expected = [
+            item["title"]
+            for item in self.client.get("/items/", {"search": "lamp"}).json()["items"]
+        ]
+
+        titles, _ = self.walk_pages({"search": "lamp", "limit": 2})
+
+        self.assertEqual(titles, expected)
+        self.assertEqual(len(titles), 7)
+
+    @override_settings(SEARCH_BACKEND="api.search_index.InvertedIndexSearchBackend")
+    def test_inverted_index_pages_past_missing_rows(self):
+        """Test a page of ranked ids the database no longer has doesn't end paging"""
+        reset_item_index()
+        self.addCleanup(reset_item_index)
+        self.walk_pages({"search": "lamp", "limit": 2})
+        # Still in the index, as the on-commit unindexing never runs here
+        Item.objects.filter(title__in=["Lamp 6", "Lamp 5", "Lamp 4"]).delete()
+
+        titles, _ = self.walk_pages({"search": "lamp", "limit": 2})
+
+        self.assertEqual(titles, ["Lamp 3", "Lamp 2", "Lamp 1", "Lamp 0"])
+
+    def test_total_count_only_on_request(self):
+        """Test cursor pages skip COUNT(*) unless include_total is set"""
+        data = self.client.get("/items/", {"cursor": ""}).json()
+        self.assertIsNone(data["total_count"])
+
+        data = self.client.get("/items/", {"cursor": "", "include_total": "true"}).json()
+        self.assertEqual(data["total_count"], 7)
+
+    def test_query_count_independent_of_depth(self):
+        """Test deep cursor pages cost the same number of queries as the first"""
+        first = self.client.get("/items/", {"cursor": "", "limit": 1}).json()
+        # Cold, as the first page is otherwise served from the listing cache
+        item_cache().clear()
+        with CaptureQueriesContext(connection) as first_page:
+            self.client.get("/items/", {"cursor": "", "limit": 1})
+        deep_cursor = self.client.get(
+            "/items/", {"cursor": first["next_cursor"], "limit": 5}
+        ).json()["next_cursor"]
+        with CaptureQueriesContext(connection) as deep_page:
+            self.client.get("/items/", {"cursor": deep_cursor, "limit": 1})
+
+        self.assertEqual(len(first_page.captured_queries), 1)
+        self.assertEqual(len(deep_page.captured_queries), 1)
+
+    def test_invalid_cursor(self):
+        """Test malformed cursors and limits are rejected"""
+        for cursor in ["not-a-cursor", "WyJ4Il0", "WyJ4IiwieSJd"]:
+            response = self.client.get("/items/", {"cursor": cursor})
+            self.assertEqual(response.status_code, 400)
+
+        response = self.client.get("/items/", {"cursor": "", "limit": "0"})
+        self.assertEqual(response.status_code, 400)
+
+
+class ItemFieldsTest(TestCase):
+    """Test the shared item serializer and the fields query parameter"""
+
+    def setUp(self):
+        self.client = Client()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        self.enterContext(self.settings(MEDIA_ROOT=media_root))
+        self.user = User.objects.create_user(
+            first_name="Test",
+            last_name="User",
+            email="test@example.com",
+            date_of_birth=date(1990, 1, 1),
+            password="testpass123",
+        )
+        future_date = date.today() + timedelta(days=7)
+        for i in range(3):
+            Item.objects.create(
+                title=f"Chair {i}",
+                description="A very long description " * 50,
+                owner=self.user,
+                minimum_bid=10,
+                auction_end_date=future_date,
+            )
+
+    def test_fields_limits_response_and_columns(self):
+        """Test fields returns only the named fields and skips other columns"""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/items/", {"fields": "title,highest_bid"})
+
+        self.assertEqual(response.status_code, 200)
+        for item in response.json()["items"]:
+            self.assertEqual(set(item), {"id", "title", "highest_bid"})
+        self.assertTrue(
+            all("description" not in query["sql"] for query in queries.captured_queries)
+        )
+
+    def test_unknown_field_rejected(self):
+        """Test fields the view doesn't offer are rejected"""
+        response = self.client.get("/items/", {"fields": "title,password"})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("password", response.json()["error"])
+
+    def test_fields_with_cursor_pagination(self):
+        """Test cursor pagination works when created_at isn't requested"""
+        data = self.client.get(
+            "/items/", {"fields": "title", "cursor": "", "limit": 2}
+        ).json()
+        self.assertEqual(len(data["items"]), 2)
+
+        data = self.client.get(
+            "/items/", {"fields": "title", "cursor": data["next_cursor"], "limit": 2}
+        ).json()
+        self.assertEqual([item["title"] for item in data["items"]], ["Chair 0"])
+
+    def test_default_shape_matches_model(self):
+        """Test serialized rows carry the same values as the model"""
+        item = Item.objects.get(title="Chair 1")
+        item.item_image.save("chair.jpg", SimpleUploadedFile("chair.jpg", b"x"))
+
+        data = self.client.get(f"/items/{item.id}/").json()["item"]
+
+        self.assertEqual(data["created_at"], item.created_at.isoformat())
+        self.assertEqual(data["auction_end_date"], str(item.auction_end_date))
+        self.assertTrue(data["is_active"])
+        self.assertEqual(
+            data["owner"],
+            {"id": self.user.id, "name": "Test User", "email": "test@example.com"},
+        )
+        self.assertIsNone(data["auction_winner"])
+        self.assertEqual(
+            data["item_image"], "http://testserver" + item.item_image.url
+        )
+
+    def test_user_items_fields(self):
+        """Test get_user_items honours the fields parameter"""
+        self.client.login(email="test@example.com", password="testpass123")
+        response = self.client.get("/users/me/items/", {"fields": "title,is_active"})
+
+        self.assertEqual(response.status_code, 200)
+        for item in response.json()["items"]:
+            self.assertEqual(set(item), {"id", "title", "is_active"})
+
+
+class ItemDetailCacheTest(TestCase):
+    """Test get_item_by_id is cached and invalidated by writes"""
+
+    def setUp(self):
+        item_cache().clear()
+        ITEM_CACHE_STATS.reset()
+        self.owner = User.objects.create_user(
+            first_name="Owner",
+            last_name="User",
+            email="owner@example.com",
+            date_of_birth=date(1990, 1, 1),
+            password="testpass123",
+        )
+        self.bidder = User.objects.create_user(
+            first_name="Bidder",
+            last_name="User",
+            email="bidder@example.com",
+            date_of_birth=date(1990, 1, 1),
+            password="testpass123",
+        )
+        self.item = Item.objects.create(
+            title="Clock",
+            description="Wall clock",
+            owner=self.owner,
+            minimum_bid=10,
+            auction_end_date=date.today(),
+        )
+        self.url = f"/items/{self.item.id}/"
+
+    def get(self):
+        response = self.client.get(self.url)
+        return response["X-Cache"], response.json()["item"]
+
+    def test_repeat_read_served_from_cache(self):
+        """Test the second read is a hit that runs no queries"""
+        status, first = self.get()
+        self.assertEqual(status, "MISS")
+
+        with self.assertNumQueries(0):
+            status, second = self.get()
+        self.assertEqual(status, "HIT")
+        self.assertEqual(first, second)
+        self.assertEqual(
+            ITEM_CACHE_STATS.as_dict(),
+            {
+                "hits": 1,
+                "misses": 1,
+                "invalidations": 0,
+                "coalesced": 0,
+                "hit_ratio": 0.5,
+            },
+        )
+
+    def test_missing_item_not_cached(self):
+        """Test unknown items 404 every time"""
+        for _ in range(2):
+            self.assertEqual(self.client.get("/items/999999/").status_code, 404)
+
+    def test_bid_invalidates(self):
+        """Test a new bid shows up on the next read"""
+        self.get()
+        with self.captureOnCommitCallbacks(execute=True):
+            Bid.objects.create(bidder=self.bidder, item=self.item, bid_amount=25)
+
+        status, item = self.get()
+        self.assertEqual(status, "MISS")
+        self.assertEqual((item["highest_bid"], item["bid_count"]), (25, 1))
+
+    def test_rebuild_bid_summaries_invalidates(self):
+        """Test repaired bid summaries show up on the next read"""
+        with self.captureOnCommitCallbacks(execute=True):
+            Bid.objects.create(bidder=self.bidder, item=self.item, bid_amount=25)
+        # Out of step, as after a bulk bid change; update() sends no signals
+        Item.objects.filter(id=self.item.id).update(
+            current_highest_bid=None, highest_bidder=None, bid_count=0
+        )
+        self.assertEqual(self.get()[1]["bid_count"], 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Item.objects.filter(id=self.item.id).rebuild_bid_summaries()
+
+        status, item = self.get()
+        self.assertEqual(status, "MISS")
+        self.assertEqual((item["highest_bid"], item["bid_count"]), (25, 1))
+
+    def test_item_changes_invalidate(self):
+        """Test saving the item and renaming its owner show up on the next read"""
+        self.get()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.item.title = "Mantel clock"
+            self.item.save()
+        self.assertEqual(self.get()[1]["title"], "Mantel clock")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.owner.first_name = "Renamed"
+            self.owner.save()
+        self.assertEqual(self.get()[1]["owner"]["name"], "Renamed User")
+
+        # Logging in only touches last_login
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.force_login(self.owner)
+        self.assertEqual(self.get()[0], "HIT")
+
+    def test_uncommitted_change_not_invalidated(self):
+        """Test invalidation waits for the transaction to commit"""
+        self.get()
+        with self.captureOnCommitCallbacks() as callbacks:
+            Bid.objects.create(bidder=self.bidder, item=self.item, bid_amount=25)
+            self.assertEqual(self.get()[0], "HIT")
+        # The item's version, and the listing generation
+        self.assertEqual(len(callbacks), 2)
+
+    def test_winner_assignment_invalidates(self):
+        """Test the winner cron job's queryset update drops the cached item"""
+        Bid.objects.create(bidder=self.bidder, item=self.item, bid_amount=25)
+        self.get()
+        with self.captureOnCommitCallbacks(execute=True):
+            process_auction_winners()
+
+        self.assertEqual(self.get()[1]["auction_winner"]["id"], self.bidder.id)
+
+    def test_read_racing_a_write_not_kept(self):
+        """Test a row loaded before an invalidation isn't served after it"""
+
+        def load_then_invalidate():
+            row = {"id": self.item.id, "title": "Stale"}
+            bump_items([self.item.id])
+            return row
+
+        cached_item_row(self.item.id, load_then_invalidate)
+        row, hit = cached_item_row(self.item.id, lambda: {"id": self.item.id})
+        self.assertFalse(hit)
+        self.assertNotIn("title", row)
+
+    def test_file_based_backend(self):
+        """Test the cache works with another backend"""
+        location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, location)
+        backend = {
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+            "LOCATION": location,
+        }
+        with self.settings(CACHES={"default": backend, "items": backend}):
+            self.assertEqual(self.get()[0], "MISS")
+            self.assertEqual(self.get()[0], "HIT")
+
+    def test_stats_admin_only(self):
+        """Test the cache statistics are only shown to admins"""
+        self.get()
+        self.client.force_login(self.owner)
+        self.assertEqual(self.client.get("/stats/cache/").status_code, 403)
+
+        self.owner.is_admin = True
+        self.owner.save()
+        data = self.client.get("/stats/cache/").json()
+        self.assertEqual(data["item_detail"]["misses"], 1)
+
+
+class ItemListingCacheTest(TestCase):
+    """Test the anonymous first listing page is cached and invalidated by writes"""
+
+    def setUp(self):
+        item_cache().clear()
+        LISTING_CACHE_STATS.reset()
+        self.owner = User.objects.create_user(
+            first_name="Owner",
+            last_name="User",
+            email="owner@example.com",
+            date_of_birth=date(1990, 1, 1),
+            password="testpass123",
+        )
+        self.item = Item.objects.create(
+            title="Clock",
+            description="Wall clock",
+            owner=self.owner,
+            minimum_bid=10,
+            auction_end_date=date.today() + timedelta(days=3),
+        )
+
+    def get(self, query="start=0&end=20"):
+        response = self.client.get(f"/items/?{query}")
+        return response.get("X-Cache"), response.json()
+
+    def test_first_page_served_from_cache(self):
+        """Test repeat first pages are hits that run no queries"""
+        for query in ("start=0&end=20", "cursor=&include_total=true"):
+            status, first = self.get(query)
+            self.assertEqual(status, "MISS")
+            with self.assertNumQueries(0):
+                status, second = self.get(query)
+            self.assertEqual(status, "HIT")
+            self.assertEqual(first, second)
+            self.assertEqual(first["total_count"], 1)
+
+        # Different fields are a different page
+        self.assertEqual(self.get("start=0&end=20&fields=id")[0], "MISS")
+
+    def test_writes_invalidate(self):
+        """Test new items, edits and bids show up on the next read"""
+        bidder = User.objects.create_user(
+            first_name="Bidder",
+            last_name="User",
+            email="bidder@example.com",
+            date_of_birth=date(1990, 1, 1),
+            password="testpass123",
+        )
+        self.get()
+        with self.captureOnCommitCallbacks(execute=True):
+            Item.objects.create(
+                title="Lamp",
+                description="Desk lamp",
+                owner=self.owner,
+                minimum_bid=5,
+                auction_end_date=date.today() + timedelta(days=3),
+            )
+        status, data = self.get()
+        self.assertEqual(status, "MISS")
+        self.assertEqual(data["total_count"], 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Bid.objects.create(bidder=bidder, item=self.item, bid_amount=25)
+        data = self.get()[1]
+        clock = next(item for item in data["items"] if item["id"] == self.item.id)
+        self.assertEqual(clock["highest_bid"], 25)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.item.delete()
+        self.assertEqual(self.get()[1]["total_count"], 1)
+
+    def test_other_requests_not_cached(self):
+        """Test later pages, searches and signed in users bypass the cache"""
+        for query in ("start=1&end=20", "cursor=&search=clock", "search=clock"):
+            self.assertIsNone(self.get(query)[0])
+        self.client.force_login(self.owner)
+        self.assertIsNone(self.get()[0])
+        self.assertEqual(LISTING_CACHE_STATS.misses, 0)
+
+    def test_concurrent_misses_coalesced(self):
+        """Test one rebuild serves a burst of concurrent misses"""
+        started = threading.Event()
+        loads = []
+
+        def load():
+            loads.append(1)
+            started.set()
+            time.sleep(0.2)
+            return ["page"]
+
+        results = []
+
+        def request():
+            results.append(cached_listing(("test",), load))
+
+        first = threading.Thread(target=request)
+        first.start()
+        started.wait()
+        others = [threading.Thread(target=request) for _ in range(4)]
+        for thread in others:
+            thread.start()
+        for thread in [first] + others:
+            thread.join()
+
+        self.assertEqual(len(loads), 1)
+        self.assertEqual(sorted(hit for _, hit in results), [False] + [True] * 4)
+        self.assertEqual(LISTING_CACHE_STATS.coalesced, 4)
+
+    def test_stats_shown(self):
+        """Test the listing counts are in the cache statistics"""
+        self.get()
+        self.owner.is_admin = True
+        self.owner.save()
+        self.client.force_login(self.owner)
+        data = self.client.get("/stats/cache/").json()
+        self.assertEqual(data["item_listing"]["misses"], 1)
+
+
+class ConditionalGetTest(TestCase):
+    """Test polled read views answer If-None-Match with 304 until they change"""
+
+    def setUp(self):
+        item_cache().clear()
+        self.owner = User.objects.create_user(
+            first_name="Owner",
+            last_name="User",
+            email="owner@example.com",
+            date_of_birth=date(1990, 1, 1),
+            password="testpass123",
+        )
+        self.bidder = User.objects.create_user(
+            first_name="Bidder",
+            last_name="User",
+            email="bidder@example.com",
+            date_of_birth=date(1990, 1, 1),
+            password="testpass123",
+        )
+        self.item = Item.objects.create(
+            title="Clock",
+            description="Wall clock",
+            owner=self.owner,
+            minimum_bid=10,
+            auction_end_date=date.today() + timedelta(days=3),
+        )
+        self.bid = Bid.objects.create(bidder=self.bidder, item=self.item, bid_amount=20)
+        self.message = Message.objects.create(
+            poster=self.bidder,
+            item=self.item,
+            message_title="Question",
+            message_body="Does it chime?",
+        )
+        self.client.force_login(self.bidder)
+
+    def poll(self, url):
+        """Fetch url, then revalidate it; returns the second response"""
+        etag = self.client.get(url)["ETag"]
+        return self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+    def test_unchanged_resources_not_modified(self):
+        """Test revalidating an unchanged item, bid list or thread gets a 304"""
+        for suffix in ("", "bids/", "messages/"):
+            response = self.poll(f"/items/{self.item.id}/{suffix}")
+            self.assertEqual(response.status_code, 304)
+            self.assertEqual(response.content, b"")
+            self.assertIn("ETag", response)
+
+    def test_not_modified_skips_payload(self):
+        """Test a 304 costs one query besides the session and user lookups"""
+        for suffix in ("bids/", "messages/"):
+            url = f"/items/{self.item.id}/{suffix}"
+            etag = self.client.get(url)["ETag"]
+            with self.assertNumQueries(3):
+                self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+    def test_bids_change_etag(self):
+        """Test placing, editing and deleting bids each change the bid list's ETag"""
+        url = f"/items/{self.item.id}/bids/"
+
+        def changes(write):
+            etag = self.client.get(url)["ETag"]
+            write()
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+            return response.json()
+
+        data = changes(
+            lambda: Bid.objects.create(bidder=self.bidder, item=self.item, bid_amount=30)
+        )
+        self.assertEqual(data["count"], 2)
+
+        def edit():
+            self.bid.bid_amount = 25
+            self.bid.save()
+
+        changes(edit)
+        data = changes(self.bid.delete)
+        self.assertEqual([bid["bid_amount"] for bid in data["bids"]], [30])
+
+        def edit_item():
+            self.item.minimum_bid = 15
+            self.item.save()
+
+        self.assertEqual(changes(edit_item)["item"]["minimum_bid"], 15)
+
+    def test_bid_pages_have_their_own_etag(self):
+        """Test each page and format of the bid list gets a different ETag"""
+        url = f"/items/{self.item.id}/bids/"
+        Bid.objects.create(bidder=self.bidder, item=self.item, bid_amount=30)
+        first = self.client.get(url, {"cursor": "", "limit": 1})
+        etags = {
+            self.client.get(url)["ETag"],
+            first["ETag"],
+            self.client.get(url, {"cursor": first.json()["next_cursor"], "limit": 1})[
+                "ETag"
+            ],
+            self.client.get(url, {"format": "ndjson"})["ETag"],
+        }
+        self.assertEqual(len(etags), 4)
+        self.assertIn("Cookie", first["Vary"])
+
+    def test_messages_change_etag(self):
+        """Test posting, editing and deleting messages each change the thread's ETag"""
+        url = f"/items/{self.item.id}/messages/"
+
+        def changes(write):
+            etag = self.client.get(url)["ETag"]
+            write()
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+            return response.json()
+
+        reply = Message(
+            poster=self.owner,
+            item=self.item,
+            replying_to=self.message,
+            message_title="Re: Question",
+            message_body="Every hour",
+        )
+        data = changes(reply.save)
+        self.assertTrue(data["messages"][0]["replies"][0]["is_owner"])
+
+        def edit():
+            reply.message_body = "Every quarter hour"
+            reply.save()
+
+        data = changes(edit)
+        self.assertEqual(
+            data["messages"][0]["replies"][0]["message_body"], "Every quarter hour"
+        )
+        self.assertEqual(changes(reply.delete)["messages"][0]["replies"], [])
+
+    def test_item_change_etag(self):
+        """Test a cached item's ETag changes with the item"""
+        url = f"/items/{self.item.id}/"
+        etag = self.client.get(url)["ETag"]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.item.title = "Mantel clock"
+            self.item.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_missing_item(self):
+        """Test unknown items still 404"""
+        for suffix in ("", "bids/", "messages/"):
+            response = self.client.get(f"/items/999999/{suffix}", HTTP_IF_NONE_MATCH="*")
+            self.assertEqual(response.status_code, 404)
+
+
+class ItemEventStreamTest(TestCase):
+    """Test accepted bids and new messages are pushed to an item's watchers"""
+
+    def setUp(self):
+        self.owner = User.objects.create_user(
+            first_name="Owner",
+            last_name="User",
+            email="owner@example.com",
+            date_of_birth=date(1990, 1, 1),
+            password="testpass123",
+        )
+        self.bidder = User.objects.create_user(
+            first_name="Bidder",
+            last_name="User",
+            email="bidder@example.com",
+            date_of_birth=date(1990, 1, 1),
+            password="testpass123",
+        )
+        self.item = Item.objects.create(
+            title="Clock",
+            description="Wall clock",
+            owner=self.owner,
+            minimum_bid=10,
+            auction_end_date=date.today() + timedelta(days=3),
+        )
+        self.url = f"/items/{self.item.id}/events/"
+        self.client.force_login(self.owner)
+        self.async_client.force_login(self.owner)
+
+    def post(self, url, data):
+        # Sync, so it's run with sync_to_async from the async tests
+        client = Client()
+        client.force_login(self.bidder)
+        with self.captureOnCommitCallbacks(execute=True):
+            return client.post(url, json.dumps(data), content_type="application/json")
+
+    async def disconnect(self, stream):
+        # A client disconnecting cancels the task sending the stream
+        reader = asyncio.ensure_future(anext(stream))
+        await asyncio.sleep(0.01)
+        reader.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await reader
+
+    async def test_bids_and_messages_streamed(self):
+        """Test a watcher receives a new bid and message as they are made"""
+        response = await self.async_client.get(self.url)
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        stream = aiter(response.streaming_content)
+        # The first chunk is sent once the watcher has subscribed
+        self.assertTrue((await anext(stream)).startswith(b"retry:"))
+
+        await sync_to_async(self.post)(
+            "/bids/create/", {"item_id": self.item.id, "bid_amount": 25}
+        )
+        event, data = (await anext(stream)).decode().strip().split("\n")
+        self.assertEqual(event, "event: bid")
+        bid = json.loads(data.removeprefix("data: "))
+        self.assertEqual(bid["bid_amount"], 25)
+        self.assertEqual(bid["bidder"], {"id": self.bidder.id, "name": "Bidder User"})
+
+        await sync_to_async(self.post)(
+            "/messages/create/",
+            {"item_id": self.item.id, "message_title": "Hi", "message_body": "Chimes?"},
+        )
+        event, data = (await anext(stream)).decode().strip().split("\n")
+        self.assertEqual(event, "event: message")
+        self.assertEqual(json.loads(data.removeprefix("data: "))["message_body"], "Chimes?")
+
+        await self.disconnect(stream)
+        self.assertEqual(get_hub().subscriber_count(item_channel(self.item.id)), 0)
+
+    async def test_idle_stream_sends_heartbeats(self):
+        """Test an idle stream sends keep-alive comments"""
+        with self.settings(EVENT_STREAM_HEARTBEAT=0.01):
+            response = await self.async_client.get(self.url)
+            stream = aiter(response.streaming_content)
+            await anext(stream)
+            self.assertEqual(await anext(stream), b": keep-alive\n\n")
+            await self.disconnect(stream)
+
+    async def test_missing_item(self):
+        """Test watching an unknown item 404s"""
+        response = await self.async_client.get("/items/999999/events/")
+        self.assertEqual(response.status_code, 404)
+
+    async def test_anonymous_refused(self):
+        """Test only logged in users can watch an item"""
+        response = await AsyncClient().get(self.url)
+        self.assertEqual(response.status_code, 302)  # Redirect to login
+        self.assertEqual(get_hub().subscriber_count(item_channel(self.item.id)), 0)
+
+    def test_wsgi_refused(self):
+        """Test streams aren't served over WSGI, where they'd hold a worker"""
+        self.assertEqual(self.client.get(self.url).status_code, 501)
+
+    def test_request_thread_released(self):
+        """Test a waiting request gives up the thread kept for its sync code"""
+
+        async def request():
+            async with ThreadSensitiveContext():
+                first = await sync_to_async(threading.current_thread)()
+                await release_request_thread()
+                return first, await sync_to_async(threading.current_thread)()
+
+        first, second = asyncio.run(request())
+        self.assertIsNot(first, second)
+        first.join(1)
+        self.assertFalse(first.is_alive())
+
+    def test_local_hub(self):
+        """Test events published from another thread reach each loop's subscribers"""
+        hub = LocalHub(max_queue_size=2)
+
+        async def watch():
+            first = hub.subscribe("item:1")
+            second = hub.subscribe("item:1")
+            other = hub.subscribe("item:2")
+            publisher = threading.Thread(target=hub.publish, args=("item:1", "bid"))
+            publisher.start()
+            received = [await first.get(1), await second.get(1), await other.get(0.05)]
+            publisher.join()
+
+            # A subscriber that falls behind is told, rather than missing events
+            for event in range(3):
+                hub.publish("item:1", event)
+            await asyncio.sleep(0)
+            with self.assertRaises(SubscriberOverflow):
+                await first.get(1)
+
+            for subscription in (first, second, other):
+                subscription.close()
+            return received
+
+        self.assertEqual(asyncio.run(watch()), ["bid", "bid", None])
+        self.assertEqual(hub.channels, {})
+
+
+class LongPollBidsTest(TransactionTestCase):
+    """
+    Test items/<id>/bids/?since= waits for newer bids. Transactional, as the
+    re-checks run on other threads and so see only committed rows.
+    """
+
+    def setUp(self):
+        self.owner = User.objects.create_user(
+            first_name="Owner",
+            last_name="User",
+            email="owner@example.com",
+            date_of_birth=date(1990, 1, 1),
+            password="testpass123",
+        )
+        self.bidder = User.objects.create_user(
+            first_name="Bidder",
+            last_name="User",
+            email="bidder@example.com",
+            date_of_birth=date(1990, 1, 1),
+            password="testpass123",
+        )
+        self.item = Item.objects.create(
+            title="Clock",
+            description="Wall clock",
+            owner=self.owner,
+            minimum_bid=10,
+            auction_end_date=date.today() + timedelta(days=3),
+        )
+
+    def post(self, url, data):
+        # Sync, so it's run with sync_to_async from the async tests
+        client = Client()
+        client.force_login(self.bidder)
+        return client.post(url, json.dumps(data), content_type="application/json")
+
+    async def long_poll(self, query):
+        await self.async_client.aforce_login(self.owner)
+        response = await self.async_client.get(f"/items/{self.item.id}/bids/?{query}")
+        return response.status_code, response.json()
+
+    async def test_long_poll_returns_newer_bids(self):
+        """Test bids after since are returned at once, oldest first"""
+        first = await Bid.objects.acreate(bidder=self.bidder, item=self.item, bid_amount=20)
+        second = await Bid.objects.acreate(bidder=self.bidder, item=self.item, bid_amount=30)
+
+        status, data = await self.long_poll(f"since={first.id}&wait=5")
+        self.assertEqual(status, 200)
+        self.assertEqual([bid["id"] for bid in data["bids"]], [second.id])
+        self.assertEqual(data["last_bid_id"], second.id)
+
+        status, data = await self.long_poll("since=0")
+        self.assertEqual(data["count"], 2)
+
+    async def test_long_poll_limited(self):
+        """Test at most limit bids are returned, with a cursor for the rest"""
+        bids = [
+            await Bid.objects.acreate(bidder=self.bidder, item=self.item, bid_amount=amount)
+            for amount in (20, 30, 40)
+        ]
+
+        status, data = await self.long_poll("since=0&limit=2")
+        self.assertEqual([bid["id"] for bid in data["bids"]], [bids[0].id, bids[1].id])
+        self.assertEqual(data["next_cursor"], str(bids[1].id))
+
+        status, data = await self.long_poll(f"since={data['next_cursor']}&limit=2")
+        self.assertEqual([bid["id"] for bid in data["bids"]], [bids[2].id])
+        self.assertIsNone(data["next_cursor"])
+
+    async def test_long_poll_times_out(self):
+        """Test an empty list once wait runs out with no new bid"""
+        started = time.monotonic()
+        status, data = await self.long_poll("since=0&wait=0.2")
+        self.assertGreaterEqual(time.monotonic() - started, 0.2)
+        self.assertEqual((data["bids"], data["last_bid_id"]), ([], 0))
+
+    async def test_long_poll_woken_by_bid(self):
+        """Test a waiting request returns as soon as create_bid accepts a bid"""
+        poll = asyncio.ensure_future(self.long_poll("since=0&wait=20"))
+        while not get_hub().subscriber_count(item_channel(self.item.id)):
+            await asyncio.sleep(0.01)
+        started = time.monotonic()
+        await sync_to_async(self.post)(
+            "/bids/create/", {"item_id": self.item.id, "bid_amount": 25}
+        )
+        status, data = await poll
+        self.assertLess(time.monotonic() - started, 5)
+        self.assertEqual([bid["bid_amount"] for bid in data["bids"]], [25])
+
+    async def test_long_poll_checks_database(self):
+        """Test bids nothing announced (e.g. from other processes) are still found"""
+        with self.settings(LONG_POLL_INTERVAL=0.05):
+            poll = asyncio.ensure_future(self.long_poll("since=0&wait=20"))
+            await asyncio.sleep(0.1)
+            await Bid.objects.acreate(bidder=self.bidder, item=self.item, bid_amount=25)
+            status, data = await poll
+        self.assertEqual(data["count"], 1)
+
+    def test_long_poll_rechecks_reuse_connections(self):
+        """Test the re-checks while waiting don't each open a new connection"""
+        opened = []
+
+        def count(**kwargs):
+            opened.append(kwargs["connection"])
+
+        async def poll():
+            # As under the ASGI handler, which gives each request this context
+            async with ThreadSensitiveContext():
+                return await self.long_poll("since=0&wait=0.3")
+
+        connection_created.connect(count)
+        self.addCleanup(connection_created.disconnect, count)
+        with self.settings(LONG_POLL_INTERVAL=0.01):
+            status, data = asyncio.run(poll())
+        self.assertEqual(data["bids"], [])
+        self.assertLess(len(opened), 5)
+
+    async def test_long_poll_rechecks_close_old_connections(self):
+        """Test re-checks apply CONN_MAX_AGE and health checks to their connection"""
+        threads = []
+        with self.settings(LONG_POLL_INTERVAL=0.01), mock.patch(
+            "api.views.close_old_connections",
+            side_effect=lambda: threads.append(threading.current_thread()),
+        ):
+            await self.long_poll("since=0&wait=0.1")
+        self.assertTrue(threads)
+        self.assertEqual(len(threads) % 2, 0)
+        self.assertNotIn(threading.main_thread(), threads)
+
+    async def test_long_poll_invalid(self):
+        """Test bad parameters are rejected and unknown items 404"""
+        for query in (
+            "since=x",
+            "since=-1",
+            "since=0&wait=x",
+            "since=0&wait=nan",
+            "since=0&limit=0",
+        ):
+            self.assertEqual((await self.long_poll(query))[0], 400)
+        await self.async_client.aforce_login(self.owner)
+        response = await self.async_client.get("/items/999999/bids/?since=0")
+        self.assertEqual(response.status_code, 404)
+
+
+class RequestMetricsTest(TestCase):
+    """Test per-view request metrics and the metrics/ endpoint"""
+
+    def setUp(self):
+        REQUEST_METRICS.reset()
+        self.admin = User.objects.create_superuser(
+            first_name="Admin",
+            last_name="User",
+            email="admin@example.com",
+            date_of_birth=date(1990, 1, 1),
+            password="testpass123",
+        )
+        self.user = User.objects.create_user(
+            first_name="Regular",
+            last_name="User",
+            email="user@example.com",
+            date_of_birth=date(1990, 1, 1),
+            password="testpass123",
+        )
+        self.item = Item.objects.create(
+            title="Lamp",
+            description="Desk lamp",
+            owner=self.admin,
+            minimum_bid=10,
+            auction_end_date=date.today() + timedelta(days=3),
+        )
+        for amount in (20, 30):
+            Bid.objects.create(bidder=self.user, item=self.item, bid_amount=amount)
+
+    def test_records_queries_per_view(self):
+        """Test each request's queries, time and size are recorded under its URL name"""
+        self.client.force_login(self.user)
+        response = self.client.get(f"/items/{self.item.id}/bids/")
+        self.assertEqual(response.status_code, 200)
+        self.client.get(f"/items/{self.item.id}/bids/")
+
+        histograms = REQUEST_METRICS.views["get_item_bids"]
+        self.assertEqual(histograms["queries"].count, 2)
+        self.assertGreater(histograms["queries"].sum, 0)
+        self.assertGreater(histograms["db_time"].sum, 0)
+        self.assertGreater(histograms["serialization_time"].sum, 0)
+        self.assertEqual(histograms["size"].sum, 2 * len(response.content))
+        self.assertEqual(REQUEST_METRICS.statuses["get_item_bids", 200], 2)
+
+    def test_async_view_queries_counted(self):
+        """Test queries an async view runs through sync_to_async are counted"""
+        self.client.force_login(self.user)
+        self.client.get(f"/items/{self.item.id}/bids/?since=0")
+        self.assertGreater(REQUEST_METRICS.views["get_item_bids"]["queries"].sum, 0)
+
+    def test_unmatched_requests_share_a_label(self):
+        """Test 404s for unknown URLs don't create a histogram per path"""
+        self.client.get("/no/such/page/")
+        self.client.get("/no/other/page/")
+        self.assertEqual(list(REQUEST_METRICS.views), ["<unmatched>"])
+
+    def test_prometheus_format(self):
+        """Test admins get the metrics in the Prometheus text format"""
+        self.client.force_login(self.admin)
+        self.client.get(f"/items/{self.item.id}/bids/")
+        response = self.client.get("/metrics/")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Content-Type"].startswith("text/plain; version=0.0.4"))
+        body = response.content.decode()
+        self.assertIn('http_requests_total{view="get_item_bids",status="200"} 1', body)
+        self.assertIn("# TYPE http_request_db_queries histogram", body)
+        self.assertIn('http_request_db_queries_bucket{view="get_item_bids",le="+Inf"} 1', body)
+        self.assertIn('http_request_db_queries_count{view="get_item_bids"} 1', body)
+        self.assertIn('cache_hits_total{cache="item_detail"}', body)
+
+    def test_admin_only(self):
+        """Test the metrics are refused to anonymous and non-admin users"""
+        self.assertEqual(self.client.get("/metrics/").status_code, 403)
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get("/metrics/").status_code, 403)
+        self.client.force_login(self.admin)
+        self.assertEqual(self.client.post("/metrics/").status_code, 405)
+
+    @override_settings(METRICS_TOKEN="scrape-secret")
+    def test_bearer_token(self):
+        """Test a scraper can read the metrics with METRICS_TOKEN"""
+        response = self.client.get(
+            "/metrics/", HTTP_AUTHORIZATION="Bearer scrape-secret"
+        )
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get("/metrics/", HTTP_AUTHORIZATION="Bearer wrong")
+        self.assertEqual(response.status_code, 403)
+
+    def test_slow_request_logged(self):
+        """Test requests over SLOW_REQUEST_SECONDS are logged with their queries"""
+        self.client.force_login(self.user)
+        with self.settings(SLOW_REQUEST_SECONDS=0), self.assertLogs(
+            "api.metrics", "WARNING"
+        ) as logs:
+            self.client.get(f"/items/{self.item.id}/bids/")
+        self.assertEqual(len(logs.output), 1)
+        self.assertIn(f"GET /items/{self.item.id}/bids/ (get_item_bids) 200", logs.output[0])
+        self.assertIn("slowest", logs.output[0])
+
+    def test_fast_requests_not_logged(self):
+        """Test nothing is logged without a threshold"""
+        self.client.force_login(self.user)
+        with self.assertNoLogs("api.metrics"):
+            self.client.get(f"/items/{self.item.id}/bids/")
+
+
+class SeedAndBenchCommandTest(TestCase):
+    """Test the seed_auctions and bench management commands"""
+
+    def seed(self, *args):
+        call_command(
+            "seed_auctions",
+            "--users", "20",
+            "--items", "30",
+            "--bids", "300",
+            "--messages", "60",
+            "--batch-size", "7",
+            *args,
+            stdout=io.StringIO(),
+        )
+
+    def test_seed_auctions(self):
+        """Test seeded bids are consistent histories and messages are threaded"""
+        self.seed()
+        self.assertEqual(User.objects.count(), 20)
+        self.assertEqual(Item.objects.count(), 30)
+        self.assertEqual(Bid.objects.count(), 300)
+        self.assertEqual(Message.objects.count(), 60)
+
+        # Bids rise over time on each item, and never come from its owner
+        for item in Item.objects.all():
+            amounts = list(
+                item.bid_set.order_by("created_at", "id").values_list(
+                    "bid_amount", flat=True
+                )
+            )
+            self.assertEqual(amounts, sorted(amounts))
+            self.assertEqual(item.bid_count, len(amounts))
+            self.assertEqual(item.current_highest_bid, max(amounts, default=None))
+            self.assertFalse(item.bid_set.filter(bidder=item.owner).exists())
+            if amounts and item.auction_end_date < date.today():
+                self.assertEqual(item.auction_winner_id, item.highest_bidder_id)
+
+        # Popular items get most of the bids
+        counts = sorted(Item.objects.values_list("bid_count", flat=True), reverse=True)
+        self.assertGreater(sum(counts[:6]), sum(counts[6:]))
+
+        replies = Message.objects.filter(replying_to__isnull=False)
+        self.assertEqual(replies.count(), 33)
+        self.assertTrue(replies.filter(replying_to__replying_to__isnull=False).exists())
+        self.assertFalse(replies.exclude(item=F("replying_to__item")).exists())
+
+        self.assertTrue(
+            authenticate(email=User.objects.first().email, password="seedpass")
+        )
+
+    def test_seed_auctions_flush(self):
+        """Test --flush removes earlier seeded rows but not real ones"""
+        real = User.objects.create_user(
+            first_name="Real",
+            last_name="User",
+            email="real@example.com",
+            date_of_birth=date(1990, 1, 1),
+            password="testpass123",
+        )
+        self.seed()
+        self.seed("--flush")
+        self.assertEqual(User.objects.count(), 21)
+        self.assertEqual(Item.objects.count(), 30)
+        self.assertTrue(User.objects.filter(pk=real.pk).exists())
+
+    def test_bench(self):
+        """Test bench reports every endpoint and leaves the database as it was"""
+        self.seed()
+        before = (Item.objects.count(), Bid.objects.count(), Message.objects.count())
+        out = io.StringIO()
+        call_command("bench", "--runs", "2", "--warmup", "0", stdout=out, stderr=io.StringIO())
+        results = json.loads(out.getvalue())
+
+        endpoints = results["endpoints"]
+        self.assertEqual(results["rows"]["items"], 30)
+        self.assertEqual(
+            {endpoint["status"] for endpoint in endpoints.values()}, {200}
+        )
+        self.assertEqual(endpoints["get_item_by_id"]["path"][:7], "/items/")
+        for name in ("p50_ms", "p95_ms", "p99_ms", "queries"):
+            self.assertIn(name, endpoints["create_bid"])
+        self.assertGreater(endpoints["create_bid"]["queries"], 0)
+        self.assertIn("stream_item_events", results["skipped"])
+        self.assertEqual(
+            before, (Item.objects.count(), Bid.objects.count(), Message.objects.count())
+        )
+        self.assertFalse(User.objects.filter(email__startswith="bench-").exists())
+
+    def test_bench_compare(self):
+        """Test --compare fails on endpoints running more queries than before"""
+        baseline = {"endpoints": {"get_item_bids": {"p95_ms": 1e9, "queries": 1}}}
+        with tempfile.NamedTemporaryFile("w", suffix=".json") as f:
+            json.dump(baseline, f)
+            f.flush()
+            with self.assertRaisesMessage(CommandError, "get_item_bids"):
+                call_command(
+                    "bench",
+                    "--runs", "2",
+                    "--warmup", "0",
+                    "--only", "get_item_bids",
+                    "--compare", f.name,
+                    stdout=io.StringIO(),
+                    stderr=io.StringIO(),
+                )
+
+
+class JsonResponseTest(TestCase):
+    """Test the project JSON response class"""
+
+    def test_dates_encoded_as_isoformat(self):
+        """Test dates and datetimes are encoded like isoformat()"""
+        created_at = timezone.now()
+        response = JsonResponse(
+            {"date": date(2026, 1, 2), "created_at": created_at, "bid": Decimal("1.5")}
+        )
+        self.assertEqual(response["Content-Type"], "application/json")
+        self.assertEqual(
+            json.loads(response.content),
+            {"date": "2026-01-02", "created_at": created_at.isoformat(), "bid": "1.5"},
+        )
+
+    def test_stdlib_fallback_matches(self):
+        """Test the stdlib fallback encodes the same as the active backend"""
+        data = {"created_at": timezone.now(), "end": date(2026, 1, 2), "n": [1, None]}
+        self.assertEqual(
+            json.loads(json.dumps(data, cls=StdlibJSONEncoder)),
+            json.loads(JsonResponse(data).content),
+        )
+
+    def test_non_dict_requires_safe_false(self):
+        """Test non-dict data is rejected unless safe=False"""
+        with self.assertRaises(TypeError):
+            JsonResponse([1, 2])
+        self.assertEqual(json.loads(JsonResponse([1, 2], safe=False).content), [1, 2])
+
 
 class CreateItemTest(TestCase):
     """Test create item view"""
@@ -1033,6 +2967,105 @@ class BidModelTest(TestCase):
         self.assertEqual(self.item.bid_set.count(), 1)
         self.assertIn(bid, self.item.bid_set.all())
 
+    def test_bid_updates_item_summary(self):
+        """Test creating bids keeps the item's denormalised summary in step"""
+        Bid.objects.create(bidder=self.user, item=self.item, bid_amount=150)
+        Bid.objects.create(bidder=self.owner, item=self.item, bid_amount=120)
+
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.current_highest_bid, 150)
+        self.assertEqual(self.item.highest_bidder, self.user)
+        self.assertEqual(self.item.bid_count, 2)
+
+    def test_deleting_bid_recomputes_item_summary(self):
+        """Test deleting the highest bid falls back to the next highest"""
+        top_bid = Bid.objects.create(bidder=self.user, item=self.item, bid_amount=150)
+        Bid.objects.create(bidder=self.owner, item=self.item, bid_amount=120)
+
+        top_bid.delete()
+
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.current_highest_bid, 120)
+        self.assertEqual(self.item.highest_bidder, self.owner)
+        self.assertEqual(self.item.bid_count, 1)
+
+    def test_rebuild_bid_summaries_command(self):
+        """Test the repair command rebuilds summaries from the Bid table"""
+        Bid.objects.create(bidder=self.user, item=self.item, bid_amount=150)
+        Item.objects.filter(id=self.item.id).update(
+            current_highest_bid=None, highest_bidder=None, bid_count=0
+        )
+
+        call_command("rebuild_bid_summaries", stdout=io.StringIO())
+
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.current_highest_bid, 150)
+        self.assertEqual(self.item.highest_bidder, self.user)
+        self.assertEqual(self.item.bid_count, 1)
+
+
+@skipUnless(connection.vendor == "sqlite", "Query plans are checked on SQLite")
+class IndexUsageTest(TestCase):
+    """Test the SQLite planner uses the composite indexes for hot queries"""
+
+    def assertUsesIndex(self, queryset, index_pattern):
+        plan = queryset.explain()
+        self.assertRegex(plan, index_pattern)
+        # Neither a full scan nor a separate sort step
+        self.assertNotIn("SCAN", plan)
+        self.assertNotIn("TEMP B-TREE", plan)
+
+    def test_item_bids_by_amount(self):
+        """Test an item's bids ordered by amount use an (item, bid_amount) index"""
+        self.assertUsesIndex(
+            Bid.objects.filter(item_id=1).order_by("-bid_amount"),
+            r"bid_item_amount(_created)?_idx",
+        )
+
+    def test_user_bids_by_date(self):
+        """Test a user's bids newest first use the (bidder, -created_at) index"""
+        self.assertUsesIndex(
+            Bid.objects.filter(bidder_id=1).order_by("-created_at"),
+            "bid_bidder_created_at_idx",
+        )
+
+    def test_winning_bid_lookup(self):
+        """Test the earliest bid at an amount uses the (item, bid_amount, created_at) index"""
+        self.assertUsesIndex(
+            Bid.objects.filter(item_id=1, bid_amount=100).order_by("created_at")[:1],
+            "bid_item_amount_created_idx",
+        )
+
+    def test_item_messages_by_date(self):
+        """Test an item's messages oldest first use the (item, created_at) index"""
+        self.assertUsesIndex(
+            Message.objects.filter(item_id=1).order_by("created_at"),
+            "message_item_created_at_idx",
+        )
+
+    def test_active_listing(self):
+        """Test the listing's page query reads listing_idx in order, with no sort"""
+        owner = User.objects.create_user(
+            first_name="Owner",
+            last_name="User",
+            email="owner@example.com",
+            date_of_birth=date(1990, 1, 1),
+            password="testpass123",
+        )
+        # Logged in, so the page is read from the database rather than the cache
+        self.client.force_login(owner)
+        for query in ("start=0&end=20", "cursor=&limit=20"):
+            with CaptureQueriesContext(connection) as queries:
+                self.client.get(f"/items/?{query}")
+            (page_sql,) = [
+                query["sql"] for query in queries if "ORDER BY" in query["sql"]
+            ]
+            with connection.cursor() as cursor:
+                cursor.execute(f"EXPLAIN QUERY PLAN {page_sql}")
+                plan = "\n".join(row[-1] for row in cursor.fetchall())
+            self.assertIn("USING INDEX listing_idx", plan)
+            self.assertNotIn("TEMP B-TREE", plan)
+
 
 class CreateBidTest(TestCase):
     """Test create bid view"""
@@ -1269,6 +3302,86 @@ class CreateBidTest(TestCase):
         self.assertEqual(response.status_code, 405)
 
 
+class ConcurrentBidPlacementTest(TransactionTestCase):
+    """Test bid placement stays consistent under concurrent bidding"""
+
+    def setUp(self):
+        self.owner = User.objects.create_user(
+            first_name="Owner",
+            last_name="User",
+            email="owner@example.com",
+            date_of_birth=date(1990, 1, 1),
+            password="testpass123",
+        )
+        self.bidders = [
+            User.objects.create_user(
+                first_name="Bidder",
+                last_name=str(i),
+                email=f"bidder{i}@example.com",
+                date_of_birth=date(1990, 1, 1),
+                password="testpass123",
+            )
+            for i in range(4)
+        ]
+        self.item = Item.objects.create(
+            title="Hot Item",
+            description="Everyone wants this",
+            owner=self.owner,
+            minimum_bid=100,
+            auction_end_date=date.today() + timedelta(days=1),
+        )
+
+    def test_accepted_bids_strictly_increase(self):
+        """Test hundreds of racing bids never accept a non-increasing amount"""
+        threads_count = 8
+        bids_per_thread = 40
+        accepted = []
+        barrier = threading.Barrier(threads_count)
+
+        def bid_worker(worker_index):
+            bidder = self.bidders[worker_index % len(self.bidders)]
+            rng = random.Random(worker_index)
+            barrier.wait()
+            try:
+                for i in range(bids_per_thread):
+                    # Amounts mostly rise, with plenty of stale and duplicate bids
+                    bid_amount = 100 + i * 5 + rng.randint(-10, 10)
+                    for attempt in range(20):
+                        try:
+                            bid = place_bid(self.item.id, bidder, bid_amount)
+                            accepted.append(bid.id)
+                            break
+                        except BidRejected:
+                            break
+                        except OperationalError:
+                            # SQLite reports lock contention as an error; retry
+                            time.sleep(0.001 * (attempt + 1))
+            finally:
+                connection.close()
+
+        threads = [
+            threading.Thread(target=bid_worker, args=(i,)) for i in range(threads_count)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        amounts = list(
+            Bid.objects.filter(item=self.item)
+            .order_by("id")
+            .values_list("bid_amount", flat=True)
+        )
+        self.assertGreater(len(amounts), 0)
+        self.assertEqual(len(amounts), len(accepted))
+        for previous, current in zip(amounts, amounts[1:]):
+            self.assertLess(previous, current)
+
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.current_highest_bid, amounts[-1])
+        self.assertEqual(self.item.bid_count, len(amounts))
+
+
 class DeleteBidTest(TestCase):
     """Test delete bid view"""
 
@@ -1487,6 +3600,64 @@ class GetUserBidsTest(TestCase):
         response = self.client.post("/users/me/bids/")
         self.assertEqual(response.status_code, 405)
 
+    def test_user_bids_paginated(self):
+        """Test pages follow on newest first in a fixed number of queries"""
+        for amount in range(300, 325):
+            Bid.objects.create(bidder=self.user1, item=self.item2, bid_amount=amount)
+        self.client.force_login(self.user1)
+
+        bids = []
+        cursor = ""
+        while cursor is not None:
+            # Session, logged in user, user looked up, bid page, total
+            with self.assertNumQueries(5):
+                data = self.client.get(
+                    f"/users/me/bids/?limit=10&include_total=true&cursor={cursor}"
+                ).json()
+            self.assertLessEqual(data["count"], 10)
+            self.assertEqual(data["total_count"], 27)
+            bids += data["bids"]
+            cursor = data["next_cursor"]
+
+        expected = Bid.objects.filter(bidder=self.user1).order_by("-created_at", "-id")
+        self.assertEqual([bid["id"] for bid in bids], [bid.id for bid in expected])
+        self.assertEqual(bids[0]["item"]["id"], self.item2.id)
+
+    def test_user_bids_unpaged_by_default(self):
+        """Test without cursor or limit every bid is returned"""
+        for amount in range(300, 325):
+            Bid.objects.create(bidder=self.user1, item=self.item2, bid_amount=amount)
+        self.client.force_login(self.user1)
+
+        data = self.client.get("/users/me/bids/").json()
+
+        self.assertEqual(data["count"], 27)
+        self.assertIsNone(data["next_cursor"])
+
+    def test_user_bids_ndjson(self):
+        """Test format=ndjson streams every bid from the cursor on"""
+        for amount in range(300, 310):
+            Bid.objects.create(bidder=self.user1, item=self.item2, bid_amount=amount)
+        self.client.force_login(self.user1)
+
+        response = self.client.get("/users/me/bids/?format=ndjson")
+        self.assertTrue(response.streaming)
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        lines = b"".join(response.streaming_content).splitlines()
+        self.assertEqual(len(lines), 12)
+        self.assertEqual(json.loads(lines[0])["bid_amount"], 309)
+
+        cursor = self.client.get("/users/me/bids/?limit=5").json()["next_cursor"]
+        response = self.client.get(f"/users/me/bids/?format=ndjson&cursor={cursor}")
+        self.assertEqual(len(b"".join(response.streaming_content).splitlines()), 7)
+
+    def test_user_bids_invalid_pagination(self):
+        """Test bad cursor and limit parameters are rejected"""
+        self.client.force_login(self.user1)
+        for query in ("cursor=nonsense", "limit=0", "format=ndjson&cursor=nonsense"):
+            response = self.client.get(f"/users/me/bids/?{query}")
+            self.assertEqual(response.status_code, 400)
+
 
 class GetItemBidsTest(TestCase):
     """Test get item bids view"""
@@ -1584,6 +3755,60 @@ class GetItemBidsTest(TestCase):
         response = self.client.post(f"/items/{self.item.id}/bids/")
         self.assertEqual(response.status_code, 405)
 
+    def test_item_bids_paginated(self):
+        """Test pages follow on highest first, with the total from the item"""
+        for amount in range(300, 320):
+            Bid.objects.create(bidder=self.user2, item=self.item, bid_amount=amount)
+        Bid.objects.create(bidder=self.user1, item=self.item, bid_amount=310)
+        self.client.force_login(self.user1)
+
+        bids = []
+        cursor = ""
+        while cursor is not None:
+            data = self.client.get(
+                f"/items/{self.item.id}/bids/?limit=7&cursor={cursor}"
+            ).json()
+            self.assertEqual(data["total_count"], 24)
+            bids += data["bids"]
+            cursor = data["next_cursor"]
+
+        expected = self.item.bid_set.order_by("-bid_amount", "id")
+        self.assertEqual([bid["id"] for bid in bids], [bid.id for bid in expected])
+
+    def test_item_bids_unpaged_by_default(self):
+        """Test without cursor or limit the whole history is returned"""
+        for amount in range(300, 330):
+            Bid.objects.create(bidder=self.user2, item=self.item, bid_amount=amount)
+        self.client.force_login(self.user1)
+
+        data = self.client.get(f"/items/{self.item.id}/bids/").json()
+
+        self.assertEqual(data["count"], 33)
+        self.assertEqual(data["bids"][0]["bid_amount"], 329)
+        self.assertIsNone(data["next_cursor"])
+
+    def test_item_bids_ndjson(self):
+        """Test format=ndjson streams the whole history, one bid per line"""
+        self.client.force_login(self.user1)
+        response = self.client.get(f"/items/{self.item.id}/bids/?format=ndjson")
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        lines = b"".join(response.streaming_content).splitlines()
+        bids = [json.loads(line) for line in lines]
+        self.assertEqual([bid["bid_amount"] for bid in bids], [250, 200, 150])
+        self.assertEqual(bids[1]["bidder"]["id"], self.user2.id)
+
+    async def test_item_bids_ndjson_asgi(self):
+        """Test under ASGI the stream is an async iterator over the rows"""
+        await self.async_client.aforce_login(self.user1)
+        response = await self.async_client.get(
+            f"/items/{self.item.id}/bids/?format=ndjson"
+        )
+        self.assertTrue(response.is_async)
+        lines = [line async for line in response.streaming_content]
+        self.assertEqual(
+            [json.loads(line)["bid_amount"] for line in lines], [250, 200, 150]
+        )
+
 
 class GetUserBiddedItemsTest(TestCase):
     """Test get user bidded items view"""
@@ -1777,6 +4002,239 @@ class GetUserBiddedItemsTest(TestCase):
         response = self.client.post("/users/me/bidded-items/")
         self.assertEqual(response.status_code, 405)
 
+    def make_bidded_items(self, count):
+        for day in range(count):
+            item = Item.objects.create(
+                title=f"Extra {day}",
+                description="Description",
+                owner=self.owner,
+                minimum_bid=10,
+                auction_end_date=date.today() + timedelta(days=day - count // 2),
+            )
+            Bid.objects.create(bidder=self.user1, item=item, bid_amount=20)
+            Bid.objects.create(bidder=self.user2, item=item, bid_amount=30)
+            Bid.objects.create(bidder=self.user1, item=item, bid_amount=40 + day)
+
+    def test_query_count_independent_of_items(self):
+        """Test a page costs the same few queries however many items are on it"""
+        self.make_bidded_items(15)
+        self.client.force_login(self.user1)
+        # Session, logged in user, user looked up, item page, latest bids
+        with self.assertNumQueries(5):
+            response = self.client.get("/users/me/bidded-items/")
+        data = response.json()
+        self.assertEqual(data["count"], 18)
+        extra = {item["title"]: item for item in data["items"]}["Extra 3"]
+        self.assertEqual(extra["my_latest_bid"]["bid_amount"], 43)
+        self.assertTrue(extra["is_winning"])
+
+    def test_bidded_items_paginated_in_order(self):
+        """Test pages follow on, ongoing auctions first, each by end date"""
+        self.make_bidded_items(10)
+        self.client.force_login(self.user1)
+
+        items = []
+        cursor = ""
+        while cursor is not None:
+            data = self.client.get(
+                f"/users/me/bidded-items/?limit=4&include_total=true&cursor={cursor}"
+            ).json()
+            self.assertLessEqual(data["count"], 4)
+            self.assertEqual(data["total_count"], 13)
+            items += data["items"]
+            cursor = data["next_cursor"]
+
+        self.assertEqual(len({item["id"] for item in items}), 13)
+        keys = [
+            (item["status"] != "ongoing", item["auction_end_date"], item["id"])
+            for item in items
+        ]
+        self.assertEqual(keys, sorted(keys))
+        self.assertEqual(items[0]["status"], "ongoing")
+        self.assertIn(items[-1]["status"], ("won", "lost"))
+
+    def test_bidded_items_invalid_pagination(self):
+        """Test bad cursor and limit parameters are rejected"""
+        self.client.force_login(self.user1)
+        for query in ("cursor=nonsense", "limit=0", "limit=x"):
+            response = self.client.get(f"/users/me/bidded-items/?{query}")
+            self.assertEqual(response.status_code, 400)
+
+
+class ProcessAuctionWinnersTest(TestCase):
+    """Test the auction winner cron job"""
+
+    def setUp(self):
+        self.owner = User.objects.create_user(
+            first_name="Owner",
+            last_name="User",
+            email="owner@example.com",
+            date_of_birth=date(1990, 1, 1),
+            password="testpass123",
+        )
+        self.bidders = [
+            User.objects.create_user(
+                first_name="Bidder",
+                last_name=str(i),
+                email=f"bidder{i}@example.com",
+                date_of_birth=date(1990, 1, 1),
+                password="testpass123",
+            )
+            for i in range(3)
+        ]
+
+    def make_item(self, title, end_date=None, bids=()):
+        item = Item.objects.create(
+            title=title,
+            description="Test description",
+            owner=self.owner,
+            minimum_bid=10,
+            auction_end_date=end_date or date.today(),
+        )
+        for bidder, amount in bids:
+            Bid.objects.create(bidder=bidder, item=item, bid_amount=amount)
+        return item
+
+    def test_winners_assigned_and_emailed(self):
+        """Test each auction ending today goes to its highest bidder"""
+        first, second, third = self.bidders
+        clock = self.make_item("Clock", bids=[(first, 20), (second, 50), (third, 30)])
+        # The earliest of several equal highest bids wins
+        vase = self.make_item("Vase", bids=[(third, 40), (first, 40)])
+        no_bids = self.make_item("Rug")
+        tomorrow = self.make_item(
+            "Desk", date.today() + timedelta(days=1), bids=[(first, 20)]
+        )
+
+        self.assertEqual(process_auction_winners(chunk_size=2), 2)
+        # Winner emails wait in the outbox until it is drained
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(send_outbox().sent, 2)
+
+        clock.refresh_from_db()
+        vase.refresh_from_db()
+        no_bids.refresh_from_db()
+        tomorrow.refresh_from_db()
+        self.assertEqual(clock.auction_winner, second)
+        self.assertEqual(vase.auction_winner, third)
+        self.assertIsNone(no_bids.auction_winner)
+        self.assertIsNone(tomorrow.auction_winner)
+        self.assertEqual(
+            sorted((email.subject, email.to[0]) for email in mail.outbox),
+            [
+                ("Congratulations! You won Clock", "bidder1@example.com"),
+                ("Congratulations! You won Vase", "bidder2@example.com"),
+            ],
+        )
+
+    def test_assigned_winners_not_reprocessed(self):
+        """Test a second run leaves auctions that already have a winner alone"""
+        self.make_item("Clock", bids=[(self.bidders[0], 20)])
+        process_auction_winners()
+
+        self.assertEqual(process_auction_winners(), 0)
+        self.assertEqual(EmailOutbox.objects.count(), 1)
+
+    def test_query_count_independent_of_auctions(self):
+        """Test a chunk costs the same number of queries however many auctions it holds"""
+        for i in range(3):
+            self.make_item(f"Item {i}", bids=[(self.bidders[i], 20)])
+        with CaptureQueriesContext(connection) as few:
+            process_auction_winners()
+
+        for i in range(12):
+            self.make_item(f"More {i}", bids=[(self.bidders[i % 3], 20)])
+        with CaptureQueriesContext(connection) as many:
+            process_auction_winners()
+
+        self.assertEqual(len(few.captured_queries), len(many.captured_queries))
+
+
+class FlakyEmailBackend(locmem.EmailBackend):
+    """locmem backend that counts connections and rejects some recipients"""
+
+    opened = 0
+    reject = set()
+
+    def open(self):
+        FlakyEmailBackend.opened += 1
+        return super().open()
+
+    def send_messages(self, messages):
+        for message in messages:
+            if set(message.to) & self.reject:
+                raise smtplib.SMTPRecipientsRefused({message.to[0]: (550, b"No")})
+        return super().send_messages(messages)
+
+
+@override_settings(
+    EMAIL_BACKEND="api.tests.FlakyEmailBackend",
+    OUTBOX_RETRY_DELAY=60,
+    OUTBOX_MAX_ATTEMPTS=3,
+)
+class EmailOutboxTest(TestCase):
+    """Test the transactional email outbox"""
+
+    def setUp(self):
+        FlakyEmailBackend.opened = 0
+        FlakyEmailBackend.reject = set()
+
+    def test_batches_share_one_connection(self):
+        """Test every batch is sent over a single connection"""
+        enqueue_emails(
+            (f"Subject {i}", "Body", f"user{i}@example.com", None) for i in range(25)
+        )
+
+        stats = send_outbox(batch_size=10)
+
+        self.assertEqual((stats.sent, stats.batches), (25, 3))
+        self.assertEqual(FlakyEmailBackend.opened, 1)
+        self.assertEqual(len(mail.outbox), 25)
+        self.assertEqual(mail.outbox[0].from_email, settings.DEFAULT_FROM_EMAIL)
+        self.assertFalse(EmailOutbox.objects.exclude(status=EmailOutbox.SENT).exists())
+
+    def test_rolled_back_email_never_sent(self):
+        """Test an email queued in a rolled back transaction is discarded"""
+        try:
+            with transaction.atomic():
+                enqueue_email("Subject", "Body", "user@example.com")
+                raise RuntimeError
+        except RuntimeError:
+            pass
+
+        self.assertEqual(send_outbox().sent, 0)
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_failures_retried_with_backoff(self):
+        """Test a failed email is retried later, then given up on"""
+        FlakyEmailBackend.reject = {"bad@example.com"}
+        bad = enqueue_email("Subject", "Body", "bad@example.com")
+        enqueue_email("Subject", "Body", "good@example.com")
+
+        with self.assertLogs("api.outbox", level="WARNING") as logs:
+            stats = send_outbox()
+            bad.refresh_from_db()
+            self.assertEqual((stats.sent, stats.retried), (1, 1))
+            self.assertEqual(bad.attempts, 1)
+            self.assertIn("SMTPRecipientsRefused", bad.last_error)
+            self.assertGreater(bad.next_attempt_at, timezone.now() + timedelta(seconds=50))
+
+            # Not due yet
+            self.assertEqual(send_outbox().retried, 0)
+
+            # The delay doubles with each attempt until the attempts run out
+            EmailOutbox.objects.filter(id=bad.id).update(next_attempt_at=timezone.now())
+            send_outbox()
+            bad.refresh_from_db()
+            self.assertGreater(bad.next_attempt_at, timezone.now() + timedelta(seconds=110))
+
+            EmailOutbox.objects.filter(id=bad.id).update(next_attempt_at=timezone.now())
+            self.assertEqual(send_outbox().failed, 1)
+            bad.refresh_from_db()
+            self.assertEqual((bad.status, bad.attempts), (EmailOutbox.FAILED, 3))
+        self.assertIn("Giving up on email", logs.output[-1])
+        self.assertEqual(len(mail.outbox), 1)
+
 
 class MessageModelTest(TestCase):
     """Test Message model"""
@@ -29,6 +29,7 @@ from .views import (
     delete_profile_picture,
     get_paginated_items,
     get_item_by_id,
+    stream_item_events,
     create_item,
     update_item,
     delete_item,
@@ -42,6 +43,8 @@ from .views import (
     get_item_messages,
     update_message,
     delete_message,
+    get_cache_stats,
+    get_metrics,
 )
 
 urlpatterns = [
@@ -55,6 +58,7 @@ urlpatterns = [
     path('items/', get_paginated_items, name='get_items'),
     path('items/create/', create_item, name='create_item'),
     path('items/<int:item_id>/', get_item_by_id, name='get_item_by_id'),
+    path('items/<int:item_id>/events/', stream_item_events, name='stream_item_events'),
     path('items/<int:item_id>/update/', update_item, name='update_item'),
     path('items/<int:item_id>/delete/', delete_item, name='delete_item'),
     path('users/<int:user_id>/items/', get_user_items, name='get_user_items'),
@@ -70,4 +74,6 @@ urlpatterns = [
     path('items/<int:item_id>/messages/', get_item_messages, name='get_item_messages'),
     path('messages/<int:message_id>/update/', update_message, name='update_message'),
     path('messages/<int:message_id>/delete/', delete_message, name='delete_message'),
+    path('stats/cache/', get_cache_stats, name='get_cache_stats'),
+    path('metrics/', get_metrics, name='get_metrics'),
 ]
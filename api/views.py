@@ -1,16 +1,60 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.contrib.auth import authenticate, login
-from django.http import HttpResponse, HttpRequest, JsonResponse
+from django.http import HttpResponse, HttpRequest, StreamingHttpResponse
 from django.shortcuts import render
 from django.views.decorators.csrf import csrf_exempt, ensure_csrf_cookie
 from django.contrib.auth.decorators import login_required
-from django.db.models import Q, Case, When, IntegerField, Value, F, Max
-from django.core.files.base import ContentFile
-from .models import User, Item, Bid, Message
+from django.core.handlers.asgi import ASGIRequest
+from django.core.exceptions import ValidationError
+from django.utils.cache import patch_vary_headers
+from django.utils.crypto import constant_time_compare
+from django.db import close_old_connections
+from django.db.models import (
+    Case,
+    Count,
+    F,
+    IntegerField,
+    Max,
+    Sum,
+    Value,
+    When,
+    Window,
+)
+from django.db.models.functions import RowNumber
+from .models import User, Item, Bid, Message, ImageStatus
+from .images import InvalidImage, check_upload, delete_image, save_upload
+from .responses import JsonResponse, NdjsonResponse, make_etag, not_modified
+from .caching import (
+    ITEM_CACHE_STATS,
+    LISTING_CACHE_STATS,
+    cached_item_row,
+    cached_listing,
+)
+from .bidding import BidRejected, place_bid
+from .metrics import REQUEST_METRICS, render_cache_stats
+from .events import (
+    SubscriberOverflow,
+    event_stream,
+    get_hub,
+    item_channel,
+    publish_item_event,
+    release_request_thread,
+)
+from .search import get_search_backend
+from .pagination import MAX_PAGE_SIZE, Keyset, parse_limit
+from .serializers import (
+    ITEM_DETAIL_FIELDS,
+    ITEM_FIELDS_ON_WRITE,
+    ITEM_LIST_FIELDS,
+    USER_BIDDED_ITEM_FIELDS,
+    USER_ITEM_FIELDS,
+    ItemSerializer,
+    requested_fields,
+)
+import asyncio
 import json
-import re
-import io
 from datetime import date
-from PIL import Image
 
 
 @ensure_csrf_cookie
@@ -61,16 +105,9 @@ def user_login(request):
             "email": user.email,
             "first_name": user.first_name,
             "last_name": user.last_name,
+            "profile_picture": profile_picture_url(request, user),
         }
 
-        # Add profile picture URL if exists
-        if user.profile_picture:
-            user_data["profile_picture"] = request.build_absolute_uri(
-                user.profile_picture.url
-            )
-        else:
-            user_data["profile_picture"] = None
-
         return JsonResponse(
             {"success": True, "message": "Login successful", "user": user_data}
         )
@@ -89,6 +126,13 @@ Example fetch request for get user profile
 """
 
 
+def profile_picture_url(request, user):
+    """Absolute URL of the user's profile picture, once it has been processed"""
+    if not user.profile_picture or user.profile_picture_status != ImageStatus.READY:
+        return None
+    return request.build_absolute_uri(user.profile_picture.url)
+
+
 @login_required
 def get_user_profile(request):
     """Get the current user's profile"""
@@ -99,12 +143,11 @@ def get_user_profile(request):
         "email": user.email,
         "first_name": user.first_name,
         "last_name": user.last_name,
-        "date_of_birth": str(user.date_of_birth),
-        "profile_picture": request.build_absolute_uri(user.profile_picture.url)
-        if user.profile_picture
-        else None,
-        "created_at": user.created_at.isoformat(),
-        "updated_at": user.updated_at.isoformat(),
+        "date_of_birth": user.date_of_birth,
+        "profile_picture": profile_picture_url(request, user),
+        "profile_picture_status": user.profile_picture_status,
+        "created_at": user.created_at,
+        "updated_at": user.updated_at,
     }
 
     return JsonResponse(user_data)
@@ -138,68 +181,27 @@ def upload_profile_picture(request):
     user = request.user
     profile_picture = request.FILES["profile_picture"]
 
-    # Validate file size BEFORE processing (max 5MB)
-    max_size = 5 * 1024 * 1024  # 5MB in bytes
-    if profile_picture.size > max_size:
-        return JsonResponse(
-            {"error": "File too large. Maximum size is 5MB"}, status=400
-        )
-
+    # Only the size and header are checked here; decoding, resizing and
+    # re-encoding happen in the background (see api.images)
     try:
-        # Open and verify the image using Pillow
-        image = Image.open(profile_picture)
-
-        # Verify it's actually an image (this will raise an exception if not)
-        image.verify()
-
-        # Re-open the image after verify() (verify() closes the file)
-        profile_picture.seek(0)
-        image = Image.open(profile_picture)
-
-        # Convert RGBA to RGB if necessary (for JPEG compatibility)
-        if image.mode in ("RGBA", "LA", "P"):
-            background = Image.new("RGB", image.size, (255, 255, 255))
-            if image.mode == "P":
-                image = image.convert("RGBA")
-            background.paste(
-                image, mask=image.split()[-1] if image.mode == "RGBA" else None
-            )
-            image = background
+        check_upload(profile_picture)
+    except InvalidImage as e:
+        return JsonResponse({"error": str(e)}, status=400)
 
-        # Resize if image is too large (optional but recommended)
-        max_dimension = 1024  # Max width or height
-        if image.width > max_dimension or image.height > max_dimension:
-            image.thumbnail((max_dimension, max_dimension), Image.Resampling.LANCZOS)
-
-        # Save the processed image to a BytesIO buffer
-        output = io.BytesIO()
-        image_format = "JPEG"  # Standardize to JPEG
-        image.save(output, format=image_format, quality=85, optimize=True)
-        
-        # IMPORTANT: Seek to the beginning of the buffer before reading
-        output.seek(0)
-
-        # Delete old profile picture if exists
-        if user.profile_picture:
-            user.profile_picture.delete(save=False)
-        
-        # Save the processed image with save=True to persist to database
-        filename = f"user_{user.id}_profile.jpg"
-        user.profile_picture.save(filename, ContentFile(output.read()), save=True)
+    try:
+        save_upload(user, profile_picture)
 
         return JsonResponse(
             {
                 "success": True,
-                "message": "Profile picture uploaded successfully",
-                "profile_picture": request.build_absolute_uri(user.profile_picture.url),
+                "message": "Profile picture uploaded, processing",
+                "profile_picture": None,
+                "profile_picture_status": user.profile_picture_status,
             }
         )
 
-    except (IOError, OSError) as e:
-        # Handle Pillow errors (invalid image, corrupt file, etc.)
-        return JsonResponse({"error": "Invalid or corrupt image file"}, status=400)
     except Exception as e:
-        return JsonResponse({"error": f"Failed to process image: {str(e)}"}, status=500)
+        return JsonResponse({"error": f"Failed to upload image: {str(e)}"}, status=500)
 
 
 """
@@ -226,8 +228,9 @@ def delete_profile_picture(request):
         return JsonResponse({"error": "No profile picture to delete"}, status=404)
 
     # Delete the file
-    user.profile_picture.delete(save=False)
+    delete_image(user)
     user.profile_picture = None
+    user.profile_picture_status = ImageStatus.READY
     user.save()
 
     return JsonResponse(
@@ -319,12 +322,11 @@ def update_user_profile(request):
             "email": user.email,
             "first_name": user.first_name,
             "last_name": user.last_name,
-            "date_of_birth": str(user.date_of_birth),
-            "profile_picture": request.build_absolute_uri(user.profile_picture.url)
-            if user.profile_picture
-            else None,
-            "created_at": user.created_at.isoformat(),
-            "updated_at": user.updated_at.isoformat(),
+            "date_of_birth": user.date_of_birth,
+            "profile_picture": profile_picture_url(request, user),
+            "profile_picture_status": user.profile_picture_status,
+            "created_at": user.created_at,
+            "updated_at": user.updated_at,
         }
 
         return JsonResponse(
@@ -428,6 +430,10 @@ def user_signup(request):
         )
 
 
+# Newest first; id breaks ties between items created in the same instant
+LISTING_KEYSET = Keyset("-created_at", "-id")
+
+
 """
 Example fetch request for get paginated items
 ------------------------------------------------
@@ -441,6 +447,12 @@ Example fetch request for get paginated items
         method: "GET",
     });
 
+    // Cursor pagination (infinite scroll): pass an empty cursor for the first
+    // page, then the next_cursor from each response until it is null
+    await fetch("http://localhost:8000/items/?cursor=&limit=20", {
+        method: "GET",
+    });
+
 """
 
 
@@ -452,6 +464,11 @@ def get_paginated_items(request):
     - search: keyword to search in title and description
     - start: starting index for pagination (inclusive)
     - end: ending index for pagination (exclusive)
+    - cursor: use keyset pagination instead of start/end; empty for the first
+      page, then the next_cursor from the previous response
+    - limit: page size for cursor pagination (default 20, max 100)
+    - include_total: with cursor pagination, also compute total_count
+    - fields: comma-separated item fields to return (default: all)
     """
     if request.method != "GET":
         return JsonResponse({"error": "Method not allowed"}, status=405)
@@ -460,52 +477,75 @@ def get_paginated_items(request):
     search_keyword = request.GET.get("search", "").strip()
     start = request.GET.get("start")
     end = request.GET.get("end")
+    cursor = request.GET.get("cursor")
+
+    try:
+        fields = requested_fields(request, ITEM_LIST_FIELDS)
+        serializer = ItemSerializer(request, fields)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
 
     # Start with all items where auction has not ended
     today = date.today()
-    items = Item.objects.filter(auction_end_date__gte=today)
+    # Only the serialized columns are fetched, with owner/winner joined and the
+    # bid summary read from the item's denormalised columns, so a page costs
+    # one query regardless of its size. id and created_at are always fetched
+    # for the keyset cursor.
+    items = serializer.rows(
+        Item.objects.filter(auction_end_date__gte=today), "id", "created_at"
+    )
 
-    # Apply search filter if keyword provided
-    if search_keyword:
-        # Escape special regex characters to prevent regex injection
-        escaped_keyword = re.escape(search_keyword)
+    # Anonymous visitors all get the same first page, so it's cached (see
+    # api.caching); cache_page describes the page when the request is one
+    cache_page = None
+    cached = None
+    next_cursor = None
+    if cursor is not None:
+        # Keyset pagination: seek past the previous page instead of using
+        # OFFSET, and only pay for COUNT(*) when the client asks for it
+        try:
+            limit = parse_limit(request.GET.get("limit"))
+        except (ValueError, TypeError):
+            return JsonResponse({"error": "Invalid limit parameter"}, status=400)
+        include_total = request.GET.get("include_total") == "true"
 
-        # Filter items that contain the keyword in title or description
-        search_filter = Q(title__icontains=search_keyword) | Q(
-            description__icontains=search_keyword
-        )
-        items = items.filter(search_filter)
-
-        # Calculate relevance score with different weights
-        # Priority: title exact match > title partial > description exact > description partial
-        items = items.annotate(
-            relevance_score=Case(
-                # Exact word match in title (highest priority) - weight: 100
-                When(title__iregex=r"\b" + escaped_keyword + r"\b", then=Value(100)),
-                # Partial match in title - weight: 50
-                When(title__icontains=search_keyword, then=Value(50)),
-                # Exact word match in description - weight: 20
-                When(
-                    description__iregex=r"\b" + escaped_keyword + r"\b", then=Value(20)
-                ),
-                # Partial match in description - weight: 10
-                When(description__icontains=search_keyword, then=Value(10)),
-                default=Value(0),
-                output_field=IntegerField(),
-            )
-        ).order_by("-relevance_score", "-created_at")
-    else:
-        # Default ordering by creation date (newest first)
-        items = items.order_by("-created_at")
+        total_count = None
+        try:
+            if search_keyword:
+                backend = get_search_backend()
+                page, next_cursor = backend.search_keyset(
+                    items, search_keyword, cursor, limit
+                )
+                if include_total:
+                    total_count = backend.search_count(items, search_keyword)
+            else:
 
-    # Get total count before applying pagination
-    total_count = items.count()
+                def load():
+                    page, next_cursor = LISTING_KEYSET.paginate(items, cursor, limit)
+                    return page, next_cursor, items.count() if include_total else None
 
-    # Apply pagination if both start and end are provided
-    if start is not None and end is not None:
-        try:
-            start = int(start)
-            end = int(end)
+                if not cursor and not request.user.is_authenticated:
+                    cache_page = ("cursor", limit, include_total, today, *fields)
+                    (page, next_cursor, total_count), cached = cached_listing(
+                        cache_page, load
+                    )
+                else:
+                    page, next_cursor, total_count = load()
+        except (ValueError, ValidationError):
+            # Includes InvalidCursor, and cursors holding values of the wrong type
+            return JsonResponse({"error": "Invalid cursor"}, status=400)
+        items = page
+
+    else:
+        # Validate pagination if both start and end are provided
+        if start is not None and end is not None:
+            try:
+                start = int(start)
+                end = int(end)
+            except (ValueError, TypeError):
+                return JsonResponse(
+                    {"error": "Invalid pagination parameters"}, status=400
+                )
             if start < 0 or end < 0:
                 return JsonResponse(
                     {"error": "Pagination indices must be non-negative"}, status=400
@@ -515,63 +555,48 @@ def get_paginated_items(request):
                     {"error": "Start index must be less than or equal to end index"},
                     status=400,
                 )
-            items = items[start:end]
-        except (ValueError, TypeError):
-            return JsonResponse({"error": "Invalid pagination parameters"}, status=400)
-
-    # Serialize items
-    items_data = []
-    for item in items:
-        item_data = {
-            "id": item.id,
-            "title": item.title,
-            "description": item.description,
-            "minimum_bid": item.minimum_bid,
-            "auction_end_date": str(item.auction_end_date),
-            "created_at": item.created_at.isoformat(),
-        }
-
-        # Add owner information
-        if item.owner:
-            item_data["owner"] = {
-                "id": item.owner.id,
-                "name": f"{item.owner.first_name} {item.owner.last_name}",
-                "email": item.owner.email,
-            }
         else:
-            item_data["owner"] = None
+            start = end = None
 
-        # Add auction winner information
-        if item.auction_winner:
-            item_data["auction_winner"] = {
-                "id": item.auction_winner.id,
-                "name": f"{item.auction_winner.first_name} {item.auction_winner.last_name}",
-            }
-        else:
-            item_data["auction_winner"] = None
-
-        # Add item image URL if exists
-        if item.item_image:
-            item_data["item_image"] = request.build_absolute_uri(item.item_image.url)
+        if search_keyword:
+            # Full-text match, ordered by relevance then newest first
+            items, total_count = get_search_backend().search_page(
+                items, search_keyword, start, end
+            )
         else:
-            item_data["item_image"] = None
-
-        # Add highest bid
-        highest_bid = Bid.objects.filter(item=item).aggregate(Max("bid_amount"))[
-            "bid_amount__max"
-        ]
-        item_data["highest_bid"] = highest_bid
+            # Default ordering by creation date (newest first)
+            items = items.order_by(*LISTING_KEYSET.ordering)
+
+            def load():
+                # Get total count before applying pagination
+                total_count = items.count()
+                page = items[start:end] if start is not None else items
+                return list(page), total_count
+
+            if (
+                start == 0
+                and end <= MAX_PAGE_SIZE
+                and not request.user.is_authenticated
+            ):
+                cache_page = ("offset", end, today, *fields)
+                (items, total_count), cached = cached_listing(cache_page, load)
+            else:
+                items, total_count = load()
 
-        items_data.append(item_data)
+    items_data = [serializer.serialize(row) for row in items]
 
-    return JsonResponse(
+    response = JsonResponse(
         {
             "success": True,
             "items": items_data,
             "count": len(items_data),
             "total_count": total_count,
+            "next_cursor": next_cursor,
         }
     )
+    if cache_page is not None:
+        response["X-Cache"] = "HIT" if cached else "MISS"
+    return response
 
 
 """
@@ -589,54 +614,69 @@ def get_item_by_id(request, item_id):
     if request.method != "GET":
         return JsonResponse({"error": "Method not allowed"}, status=405)
 
-    try:
-        item = Item.objects.get(id=item_id)
-    except Item.DoesNotExist:
+    serializer = ItemSerializer(request, ITEM_DETAIL_FIELDS)
+    item_data, cached = cached_item_row(
+        item_id, lambda: serializer.rows(Item.objects.filter(id=item_id)).first()
+    )
+    if item_data is None:
         return JsonResponse({"error": "Item not found"}, status=404)
 
-    today = date.today()
+    # The payload is determined by the row, plus the host (image URLs) and
+    # today's date (is_active)
+    etag = make_etag(item_data, request.get_host(), date.today())
+    response = not_modified(request, etag)
+    if response is None:
+        response = JsonResponse(
+            {"success": True, "item": serializer.serialize(item_data)}
+        )
+        response["ETag"] = etag
+    response["Cache-Control"] = "no-cache"
+    response["X-Cache"] = "HIT" if cached else "MISS"
+    return response
 
-    item_data = {
-        "id": item.id,
-        "title": item.title,
-        "description": item.description,
-        "minimum_bid": item.minimum_bid,
-        "auction_end_date": str(item.auction_end_date),
-        "created_at": item.created_at.isoformat(),
-        "is_active": item.auction_end_date >= today,
-    }
 
-    if item.owner:
-        item_data["owner"] = {
-            "id": item.owner.id,
-            "name": f"{item.owner.first_name} {item.owner.last_name}",
-            "email": item.owner.email,
-        }
-    else:
-        item_data["owner"] = None
+"""
+Example of watching an item's new bids and messages
+------------------------------------------------
+    const events = new EventSource("http://localhost:8000/items/123/events/", {
+        withCredentials: true,
+    });
+    events.addEventListener("bid", (event) => {
+        const bid = JSON.parse(event.data);
+    });
+    events.addEventListener("message", (event) => {
+        const message = JSON.parse(event.data);
+    });
 
-    if item.auction_winner:
-        item_data["auction_winner"] = {
-            "id": item.auction_winner.id,
-            "name": f"{item.auction_winner.first_name} {item.auction_winner.last_name}",
-        }
-    else:
-        item_data["auction_winner"] = None
+"""
 
-    if item.item_image:
-        item_data["item_image"] = request.build_absolute_uri(item.item_image.url)
-    else:
-        item_data["item_image"] = None
 
-    highest_bid = Bid.objects.filter(item=item).aggregate(Max("bid_amount"))[
-        "bid_amount__max"
-    ]
-    item_data["highest_bid"] = highest_bid
+@login_required
+async def stream_item_events(request, item_id):
+    """
+    Stream an item's accepted bids and new messages as server-sent events, to
+    logged in users (as with the item's bid list and messages).
+    Needs the ASGI server (project/asgi.py): under WSGI a stream would hold a
+    worker for as long as it's open.
+    """
+    if request.method != "GET":
+        return JsonResponse({"error": "Method not allowed"}, status=405)
+
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse(
+            {"error": "Event streams are only served over ASGI"}, status=501
+        )
 
-    bid_count = Bid.objects.filter(item=item).count()
-    item_data["bid_count"] = bid_count
+    if not await Item.objects.filter(id=item_id).aexists():
+        return JsonResponse({"error": "Item not found"}, status=404)
 
-    return JsonResponse({"success": True, "item": item_data})
+    response = StreamingHttpResponse(
+        event_stream(item_channel(item_id)), content_type="text/event-stream"
+    )
+    response["Cache-Control"] = "no-cache"
+    # Tell nginx not to buffer the stream
+    response["X-Accel-Buffering"] = "no"
+    return response
 
 
 """
@@ -747,6 +787,14 @@ def create_item(request):
             {"error": "Invalid date format. Use YYYY-MM-DD"}, status=400
         )
 
+    # Only the size and header are checked here; decoding, resizing and
+    # re-encoding happen in the background (see api.images)
+    if item_image:
+        try:
+            check_upload(item_image)
+        except InvalidImage as e:
+            return JsonResponse({"error": str(e)}, status=400)
+
     try:
         # Create the item
         item = Item.objects.create(
@@ -757,78 +805,14 @@ def create_item(request):
             auction_end_date=auction_end_date_obj,
         )
 
-        # Process and save item image if provided
+        # Store the image for processing if provided
         if item_image:
-            # Validate file size (max 5MB)
-            max_size = 5 * 1024 * 1024
-            if item_image.size > max_size:
-                item.delete()
-                return JsonResponse(
-                    {"error": "File too large. Maximum size is 5MB"}, status=400
-                )
-
-            try:
-                # Open and verify the image
-                image = Image.open(item_image)
-                image.verify()
-
-                # Re-open after verify
-                item_image.seek(0)
-                image = Image.open(item_image)
-
-                # Convert RGBA to RGB if necessary
-                if image.mode in ("RGBA", "LA", "P"):
-                    background = Image.new("RGB", image.size, (255, 255, 255))
-                    if image.mode == "P":
-                        image = image.convert("RGBA")
-                    background.paste(
-                        image, mask=image.split()[-1] if image.mode == "RGBA" else None
-                    )
-                    image = background
-
-                # Resize if too large
-                max_dimension = 1024
-                if image.width > max_dimension or image.height > max_dimension:
-                    image.thumbnail((max_dimension, max_dimension), Image.Resampling.LANCZOS)
-
-                # Save to buffer
-                output = io.BytesIO()
-                image_format = "JPEG"
-                image.save(output, format=image_format, quality=85, optimize=True)
-                output.seek(0)
-
-                # Save to item
-                filename = f"item_{item.id}.jpg"
-                item.item_image.save(filename, ContentFile(output.read()), save=True)
-
-            except (IOError, OSError):
-                item.delete()
-                return JsonResponse(
-                    {"error": "Invalid or corrupt image file"}, status=400
-                )
-            except Exception as e:
-                item.delete()
-                return JsonResponse(
-                    {"error": f"Failed to process image: {str(e)}"}, status=500
-                )
+            save_upload(item, item_image)
 
         # Return item data
-        item_data = {
-            "id": item.id,
-            "title": item.title,
-            "description": item.description,
-            "minimum_bid": item.minimum_bid,
-            "auction_end_date": str(item.auction_end_date),
-            "created_at": item.created_at.isoformat(),
-            "owner": {
-                "id": request.user.id,
-                "name": f"{request.user.first_name} {request.user.last_name}",
-                "email": request.user.email,
-            },
-            "item_image": request.build_absolute_uri(item.item_image.url)
-            if item.item_image
-            else None,
-        }
+        item_data = ItemSerializer(request, ITEM_FIELDS_ON_WRITE).serialize_instance(
+            item
+        )
 
         return JsonResponse(
             {"success": True, "message": "Item created successfully", "item": item_data}
@@ -933,8 +917,7 @@ def update_item(request, item_id):
 
     if "minimum_bid" in data:
         # Check if there are any bids on this item
-        existing_bids = Bid.objects.filter(item=item).exists()
-        if existing_bids:
+        if item.bid_count > 0:
             return JsonResponse(
                 {"error": "Cannot update minimum bid - item already has bids"}, status=400
             )
@@ -962,84 +945,25 @@ def update_item(request, item_id):
                 {"error": "Invalid date format. Use YYYY-MM-DD"}, status=400
             )
 
-    # Process and update item image if provided
+    # Only the size and header are checked here; decoding, resizing and
+    # re-encoding happen in the background (see api.images)
     if item_image:
-        # Validate file size (max 5MB)
-        max_size = 5 * 1024 * 1024
-        if item_image.size > max_size:
-            return JsonResponse(
-                {"error": "File too large. Maximum size is 5MB"}, status=400
-            )
-
         try:
-            # Open and verify the image
-            image = Image.open(item_image)
-            image.verify()
-
-            # Re-open after verify
-            item_image.seek(0)
-            image = Image.open(item_image)
-
-            # Convert RGBA to RGB if necessary
-            if image.mode in ("RGBA", "LA", "P"):
-                background = Image.new("RGB", image.size, (255, 255, 255))
-                if image.mode == "P":
-                    image = image.convert("RGBA")
-                background.paste(
-                    image, mask=image.split()[-1] if image.mode == "RGBA" else None
-                )
-                image = background
-
-            # Resize if too large
-            max_dimension = 1024
-            if image.width > max_dimension or image.height > max_dimension:
-                image.thumbnail((max_dimension, max_dimension), Image.Resampling.LANCZOS)
-
-            # Save to buffer
-            output = io.BytesIO()
-            image_format = "JPEG"
-            image.save(output, format=image_format, quality=85, optimize=True)
-            output.seek(0)
-
-            # Delete old image if exists
-            if item.item_image:
-                item.item_image.delete(save=False)
-
-            # Save new image
-            filename = f"item_{item.id}.jpg"
-            item.item_image.save(filename, ContentFile(output.read()), save=False)
-
-        except (IOError, OSError):
-            return JsonResponse(
-                {"error": "Invalid or corrupt image file"}, status=400
-            )
-        except Exception as e:
-            return JsonResponse(
-                {"error": f"Failed to process image: {str(e)}"}, status=500
-            )
+            check_upload(item_image)
+        except InvalidImage as e:
+            return JsonResponse({"error": str(e)}, status=400)
 
     try:
         item.save()
 
-        # Return updated item data
-        item_data = {
-            "id": item.id,
-            "title": item.title,
-            "description": item.description,
-            "minimum_bid": item.minimum_bid,
-            "auction_end_date": str(item.auction_end_date),
-            "created_at": item.created_at.isoformat(),
-            "item_image": request.build_absolute_uri(item.item_image.url)
-            if item.item_image
-            else None,
-        }
+        # Store the new image for processing if provided
+        if item_image:
+            save_upload(item, item_image)
 
-        if item.owner:
-            item_data["owner"] = {
-                "id": item.owner.id,
-                "name": f"{item.owner.first_name} {item.owner.last_name}",
-                "email": item.owner.email,
-            }
+        # Return updated item data
+        item_data = ItemSerializer(request, ITEM_FIELDS_ON_WRITE).serialize_instance(
+            item
+        )
 
         return JsonResponse(
             {"success": True, "message": "Item updated successfully", "item": item_data}
@@ -1079,9 +1003,8 @@ def delete_item(request, item_id):
         )
 
     try:
-        # Delete associated image if exists
-        if item.item_image:
-            item.item_image.delete(save=False)
+        # Delete associated image and renditions if they exist
+        delete_image(item)
 
         item.delete()
 
@@ -1110,7 +1033,11 @@ Example fetch request for get user items
 
 @login_required
 def get_user_items(request, user_id=None):
-    """Get all items owned by a specific user"""
+    """
+    Get all items owned by a specific user
+    Query parameters:
+    - fields: comma-separated item fields to return (default: all)
+    """
     if request.method != "GET":
         return JsonResponse({"error": "Method not allowed"}, status=405)
 
@@ -1124,48 +1051,16 @@ def get_user_items(request, user_id=None):
     except User.DoesNotExist:
         return JsonResponse({"error": "User not found"}, status=404)
 
-    # Get all items owned by this user
-    items = Item.objects.filter(owner=user).order_by("-created_at")
-
-    # Serialize items
-    items_data = []
-    for item in items:
-        item_data = {
-            "id": item.id,
-            "title": item.title,
-            "description": item.description,
-            "minimum_bid": item.minimum_bid,
-            "auction_end_date": str(item.auction_end_date),
-            "created_at": item.created_at.isoformat(),
-            "is_active": item.auction_end_date >= date.today(),
-        }
-
-        # Add owner information
-        if item.owner:
-            item_data["owner"] = {
-                "id": item.owner.id,
-                "name": f"{item.owner.first_name} {item.owner.last_name}",
-                "email": item.owner.email,
-            }
-        else:
-            item_data["owner"] = None
-
-        # Add auction winner information
-        if item.auction_winner:
-            item_data["auction_winner"] = {
-                "id": item.auction_winner.id,
-                "name": f"{item.auction_winner.first_name} {item.auction_winner.last_name}",
-            }
-        else:
-            item_data["auction_winner"] = None
-
-        # Add item image URL if exists
-        if item.item_image:
-            item_data["item_image"] = request.build_absolute_uri(item.item_image.url)
-        else:
-            item_data["item_image"] = None
+    try:
+        serializer = ItemSerializer(
+            request, requested_fields(request, USER_ITEM_FIELDS)
+        )
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
 
-        items_data.append(item_data)
+    # Get all items owned by this user
+    items = serializer.rows(Item.objects.filter(owner=user).order_by("-created_at"))
+    items_data = [serializer.serialize(row) for row in items]
 
     return JsonResponse(
         {
@@ -1220,20 +1115,6 @@ def create_bid(request):
             {"error": "Both item_id and bid_amount are required"}, status=400
         )
 
-    # Get the item
-    try:
-        item = Item.objects.get(id=item_id)
-    except Item.DoesNotExist:
-        return JsonResponse({"error": "Item not found"}, status=404)
-
-    # Check if auction has ended
-    if item.auction_end_date < date.today():
-        return JsonResponse({"error": "Auction has ended for this item"}, status=400)
-
-    # Check if bidder is the owner
-    if item.owner == request.user:
-        return JsonResponse({"error": "You cannot bid on your own item"}, status=403)
-
     # Validate bid amount
     try:
         bid_amount = int(bid_amount)
@@ -1244,40 +1125,16 @@ def create_bid(request):
     except (ValueError, TypeError):
         return JsonResponse({"error": "Invalid bid amount"}, status=400)
 
-    # Get the current highest bid for this item
-    highest_bid = Bid.objects.filter(item=item).aggregate(Max("bid_amount"))[
-        "bid_amount__max"
-    ]
-
-    # Determine minimum required bid
-    if highest_bid is not None:
-        # There are existing bids, must be higher than the highest bid
-        if bid_amount <= highest_bid:
-            return JsonResponse(
-                {
-                    "error": f"Bid must be greater than the current highest bid of {highest_bid}"
-                },
-                status=400,
-            )
-    else:
-        # No existing bids, must meet or exceed minimum bid
-        if bid_amount < item.minimum_bid:
-            return JsonResponse(
-                {
-                    "error": f"Bid must be at least the minimum bid of {item.minimum_bid}"
-                },
-                status=400,
-            )
-
     try:
-        # Create the bid
-        bid = Bid.objects.create(bidder=request.user, item=item, bid_amount=bid_amount)
+        # Validate against the current highest bid and create the bid atomically
+        bid = place_bid(item_id, request.user, bid_amount)
+        item = bid.item
 
         # Return bid data
         bid_data = {
             "id": bid.id,
             "bid_amount": bid.bid_amount,
-            "created_at": bid.created_at.isoformat(),
+            "created_at": bid.created_at,
             "bidder": {
                 "id": request.user.id,
                 "name": f"{request.user.first_name} {request.user.last_name}",
@@ -1286,9 +1143,21 @@ def create_bid(request):
             "item": {"id": item.id, "title": item.title},
         }
 
+        # Everyone watching the item sees the bid, without the bidder's email
+        publish_item_event(
+            item.id,
+            "bid",
+            {
+                **bid_data,
+                "bidder": {"id": request.user.id, "name": bid_data["bidder"]["name"]},
+            },
+        )
+
         return JsonResponse(
             {"success": True, "message": "Bid placed successfully", "bid": bid_data}
         )
+    except BidRejected as e:
+        return JsonResponse({"error": e.message}, status=e.status)
     except Exception as e:
         return JsonResponse({"error": f"Failed to create bid: {str(e)}"}, status=500)
 
@@ -1324,6 +1193,7 @@ def delete_bid(request, bid_id):
         )
 
     try:
+        # Deleting also recomputes the item's bid summary atomically
         bid.delete()
 
         return JsonResponse({"success": True, "message": "Bid deleted successfully"})
@@ -1346,12 +1216,35 @@ Example fetch request for get user bids
         credentials: "include",
     });
 
+    // A page at a time: an empty cursor for the first page, then the
+    // next_cursor from each response until it is null
+    await fetch("http://localhost:8000/users/me/bids/?cursor=&limit=50", {
+        method: "GET",
+        credentials: "include",
+    });
+
+    // The whole history as newline-delimited JSON, one bid per line
+    await fetch("http://localhost:8000/users/me/bids/?format=ndjson", {
+        method: "GET",
+        credentials: "include",
+    });
+
 """
 
 
 @login_required
 def get_user_bids(request, user_id=None):
-    """Get all bids made by a specific user (own bids only, unless admin)"""
+    """
+    Get the bids made by a specific user, newest first (own bids only, unless
+    admin). Every bid is returned unless cursor or limit is given.
+    Query parameters:
+    - cursor: page through the bids instead; empty for the first page, then
+      the next_cursor from the previous response
+    - limit: page size (default 20, max 100)
+    - include_total: also compute total_count
+    - format: "ndjson" to stream every bid from the cursor on, one JSON
+      object per line, instead of a page
+    """
     if request.method != "GET":
         return JsonResponse({"error": "Method not allowed"}, status=405)
 
@@ -1372,42 +1265,44 @@ def get_user_bids(request, user_id=None):
             status=403,
         )
 
-    # Get all bids made by this user
-    bids = (
-        Bid.objects.filter(bidder=user).select_related("item").order_by("-created_at")
-    )
+    try:
+        limit = parse_limit(request.GET.get("limit"))
+    except (ValueError, TypeError):
+        return JsonResponse({"error": "Invalid limit parameter"}, status=400)
 
-    # Serialize bids
-    bids_data = []
-    for bid in bids:
-        bid_data = {
-            "id": bid.id,
-            "bid_amount": bid.bid_amount,
-            "created_at": bid.created_at.isoformat(),
+    # The user's bids, newest first, with each one's item (and bidder, for the
+    # response format) joined rather than loaded per bid
+    bids = Bid.objects.filter(bidder=user).select_related("item", "bidder")
+    today = date.today()
+
+    def serialize(bid):
+        bid_data = serialize_bid(bid)
+        bid_data["item"] = {
+            "id": bid.item.id,
+            "title": bid.item.title,
+            "auction_end_date": bid.item.auction_end_date,
+            "is_active": bid.item.auction_end_date >= today,
         }
+        return bid_data
 
-        # Add bidder information
-        if bid.bidder:
-            bid_data["bidder"] = {
-                "id": bid.bidder.id,
-                "name": f"{bid.bidder.first_name} {bid.bidder.last_name}",
-                "email": bid.bidder.email,
-            }
-        else:
-            bid_data["bidder"] = None
-
-        # Add item information
-        if bid.item:
-            bid_data["item"] = {
-                "id": bid.item.id,
-                "title": bid.item.title,
-                "auction_end_date": str(bid.item.auction_end_date),
-                "is_active": bid.item.auction_end_date >= date.today(),
-            }
+    try:
+        if request.GET.get("format") == "ndjson":
+            # Every bid from the cursor on, one per line
+            return NdjsonResponse(
+                request,
+                USER_BIDS_KEYSET.after(bids, request.GET.get("cursor")),
+                serialize,
+            )
+        if paged(request):
+            page, next_cursor = USER_BIDS_KEYSET.paginate(
+                bids, request.GET.get("cursor"), limit
+            )
         else:
-            bid_data["item"] = None
+            page, next_cursor = bids.order_by(*USER_BIDS_KEYSET.ordering), None
+    except (ValueError, ValidationError):
+        return JsonResponse({"error": "Invalid cursor"}, status=400)
 
-        bids_data.append(bid_data)
+    bids_data = [serialize(bid) for bid in page]
 
     return JsonResponse(
         {
@@ -1419,10 +1314,25 @@ def get_user_bids(request, user_id=None):
             },
             "bids": bids_data,
             "count": len(bids_data),
+            "total_count": (
+                bids.count() if request.GET.get("include_total") == "true" else None
+            ),
+            "next_cursor": next_cursor,
         }
     )
 
 
+# A user's bids newest first, and an item's highest first (the earlier of
+# two equal bids first); id breaks ties
+USER_BIDS_KEYSET = Keyset("-created_at", "-id")
+ITEM_BIDS_KEYSET = Keyset("-bid_amount", "id")
+
+
+def paged(request):
+    """Whether a bid history request asked for a page rather than every bid"""
+    return "cursor" in request.GET or "limit" in request.GET
+
+
 """
 Example fetch request for get item bids
 ------------------------------------------------
@@ -1431,61 +1341,239 @@ Example fetch request for get item bids
         credentials: "include",
     });
 
+    // A page at a time: an empty cursor for the first page, then the
+    // next_cursor from each response until it is null
+    await fetch("http://localhost:8000/items/123/bids/?cursor=&limit=50", {
+        method: "GET",
+        credentials: "include",
+    });
+
+    // The whole history as newline-delimited JSON, one bid per line
+    await fetch("http://localhost:8000/items/123/bids/?format=ndjson", {
+        method: "GET",
+        credentials: "include",
+    });
+
+    // Wait up to 25 seconds for bids newer than bid 456
+    await fetch("http://localhost:8000/items/123/bids/?since=456&wait=25", {
+        method: "GET",
+        credentials: "include",
+    });
+
 """
 
 
 @login_required
-def get_item_bids(request, item_id):
-    """Get all bids for a specific item"""
+async def get_item_bids(request, item_id):
+    """
+    Get the bids for a specific item, highest first. Every bid is returned
+    unless cursor or limit is given.
+    Query parameters:
+    - cursor: page through the bids instead; empty for the first page, then
+      the next_cursor from the previous response
+    - limit: page size (default 20, max 100)
+    - format: "ndjson" to stream every bid from the cursor on, one JSON
+      object per line, instead of a page
+    - since: only return bids placed after the bid with this ID, oldest
+      first, at most limit of them; if there are more, next_cursor is the
+      since to pass for the rest
+    - wait: with since, if there are none yet, wait up to this many seconds
+      (max LONG_POLL_MAX_WAIT) for one before returning an empty list
+    """
     if request.method != "GET":
         return JsonResponse({"error": "Method not allowed"}, status=405)
 
-    # Get the item
+    if "since" in request.GET:
+        return await wait_for_bids(request, item_id)
+    return await sync_to_async(list_item_bids)(request, item_id)
+
+
+def serialize_bid(bid):
+    bid_data = {
+        "id": bid.id,
+        "bid_amount": bid.bid_amount,
+        "created_at": bid.created_at,
+    }
+
+    # Add bidder information
+    if bid.bidder:
+        bid_data["bidder"] = {
+            "id": bid.bidder.id,
+            "name": f"{bid.bidder.first_name} {bid.bidder.last_name}",
+            "email": bid.bidder.email,
+        }
+    else:
+        bid_data["bidder"] = None
+    return bid_data
+
+
+async def wait_for_bids(request, item_id):
+    """
+    Long poll for the item's bids after since. The request is parked on the
+    item's event channel (see api.events), without a thread, until create_bid
+    announces a bid; the database is also checked every LONG_POLL_INTERVAL
+    seconds, for bids placed through other processes.
+
+    Only the first check runs on the request's own thread, which is released
+    before waiting. The later checks share the event loop's default executor
+    (thread_sensitive=False), whose few threads keep their database
+    connections from one check to the next, as CONN_MAX_AGE allows.
+    """
     try:
-        item = Item.objects.get(id=item_id)
-    except Item.DoesNotExist:
+        since = int(request.GET["since"])
+        wait = float(request.GET.get("wait", 0))
+    except (ValueError, TypeError):
+        return JsonResponse({"error": "Invalid since or wait parameter"}, status=400)
+    if since < 0 or not 0 <= wait < float("inf"):
+        return JsonResponse({"error": "Invalid since or wait parameter"}, status=400)
+    try:
+        limit = parse_limit(request.GET.get("limit"))
+    except (ValueError, TypeError):
+        return JsonResponse({"error": "Invalid limit parameter"}, status=400)
+    wait = min(wait, getattr(settings, "LONG_POLL_MAX_WAIT", 30))
+    interval = getattr(settings, "LONG_POLL_INTERVAL", 5)
+
+    if not await Item.objects.filter(id=item_id).aexists():
         return JsonResponse({"error": "Item not found"}, status=404)
 
-    # Get all bids for this item
-    bids = (
-        Bid.objects.filter(item=item).select_related("bidder").order_by("-bid_amount")
+    # One extra to learn whether there are more than limit
+    newer = (
+        Bid.objects.filter(item_id=item_id, id__gt=since)
+        .select_related("bidder")
+        .order_by("id")[: limit + 1]
     )
 
-    # Serialize bids
-    bids_data = []
-    for bid in bids:
-        bid_data = {
-            "id": bid.id,
-            "bid_amount": bid.bid_amount,
-            "created_at": bid.created_at.isoformat(),
+    @sync_to_async(thread_sensitive=False)
+    def check_again():
+        # Executor threads never see request_started/request_finished, which
+        # is where CONN_MAX_AGE and CONN_HEALTH_CHECKS are applied, so a dead
+        # or expired connection is dropped here instead
+        close_old_connections()
+        try:
+            return [serialize_bid(bid) for bid in newer.all()]
+        finally:
+            close_old_connections()
+
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + wait
+    # Subscribed before the first check, so a bid placed in between still
+    # wakes this request
+    subscription = get_hub().subscribe(item_channel(item_id))
+    try:
+        bids_data = [serialize_bid(bid) async for bid in newer.all()]
+        if not bids_data and wait > 0:
+            await release_request_thread()
+        while not bids_data:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                await subscription.get(min(remaining, interval))
+            except SubscriberOverflow:
+                pass
+            bids_data = await check_again()
+    finally:
+        subscription.close()
+
+    more = len(bids_data) > limit
+    bids_data = bids_data[:limit]
+    last_bid_id = bids_data[-1]["id"] if bids_data else since
+    return JsonResponse(
+        {
+            "success": True,
+            "bids": bids_data,
+            "count": len(bids_data),
+            "last_bid_id": last_bid_id,
+            "next_cursor": str(last_bid_id) if more else None,
         }
+    )
 
-        # Add bidder information
-        if bid.bidder:
-            bid_data["bidder"] = {
-                "id": bid.bidder.id,
-                "name": f"{bid.bidder.first_name} {bid.bidder.last_name}",
-                "email": bid.bidder.email,
-            }
+
+def list_item_bids(request, item_id):
+    # The item, with a summary of its bids that changes whenever one is
+    # placed, edited or deleted. Pollers whose copy is current get a 304
+    # without the bids being read. (Renaming a bidder doesn't change it.)
+    item = (
+        Item.objects.filter(id=item_id)
+        .annotate(last_bid_id=Max("bid__id"), bid_total=Sum("bid__bid_amount"))
+        .values(
+            "id",
+            "title",
+            "minimum_bid",
+            "auction_end_date",
+            "bid_count",
+            "last_bid_id",
+            "bid_total",
+        )
+        .first()
+    )
+    if item is None:
+        return JsonResponse({"error": "Item not found"}, status=404)
+    # Plus which part of the history, and in which format, was asked for
+    etag = make_etag(
+        *item.values(),
+        date.today(),
+        *(request.GET.get(name) for name in ("cursor", "limit", "format")),
+    )
+
+    def conditional(response):
+        response["ETag"] = etag
+        response["Cache-Control"] = "private, no-cache"
+        # Only sent to logged in users, which the ETag doesn't cover
+        patch_vary_headers(response, ["Cookie"])
+        return response
+
+    response = not_modified(request, etag)
+    if response is not None:
+        return conditional(response)
+
+    try:
+        limit = parse_limit(request.GET.get("limit"))
+    except (ValueError, TypeError):
+        return JsonResponse({"error": "Invalid limit parameter"}, status=400)
+
+    bids = Bid.objects.filter(item_id=item_id).select_related("bidder")
+    try:
+        if request.GET.get("format") == "ndjson":
+            # Every bid from the cursor on, one per line
+            response = NdjsonResponse(
+                request,
+                ITEM_BIDS_KEYSET.after(bids, request.GET.get("cursor")),
+                serialize_bid,
+            )
+            return conditional(response)
+        if paged(request):
+            page, next_cursor = ITEM_BIDS_KEYSET.paginate(
+                bids, request.GET.get("cursor"), limit
+            )
         else:
-            bid_data["bidder"] = None
+            page, next_cursor = bids.order_by(*ITEM_BIDS_KEYSET.ordering), None
+    except (ValueError, ValidationError):
+        return JsonResponse({"error": "Invalid cursor"}, status=400)
 
-        bids_data.append(bid_data)
+    bids_data = [serialize_bid(bid) for bid in page]
 
-    return JsonResponse(
+    response = JsonResponse(
         {
             "success": True,
             "item": {
-                "id": item.id,
-                "title": item.title,
-                "minimum_bid": item.minimum_bid,
-                "auction_end_date": str(item.auction_end_date),
-                "is_active": item.auction_end_date >= date.today(),
+                "id": item["id"],
+                "title": item["title"],
+                "minimum_bid": item["minimum_bid"],
+                "auction_end_date": item["auction_end_date"],
+                "is_active": item["auction_end_date"] >= date.today(),
             },
             "bids": bids_data,
             "count": len(bids_data),
+            "total_count": item["bid_count"],
+            "next_cursor": next_cursor,
         }
     )
+    return conditional(response)
+
+
+# Ongoing auctions first, then by end date; id breaks ties
+BIDDED_ITEMS_KEYSET = Keyset("ended", "auction_end_date", "id")
 
 
 """
@@ -1503,14 +1591,27 @@ Example fetch request for get user bidded items
         credentials: "include",
     });
 
+    // The next page: pass the next_cursor from each response until it is null
+    await fetch("http://localhost:8000/users/me/bidded-items/?cursor=...&limit=20", {
+        method: "GET",
+        credentials: "include",
+    });
+
 """
 
 
 @login_required
 def get_user_bidded_items(request, user_id=None):
     """
-    Get all items a user has bid on with their most recent bid and auction status.
+    Get the items a user has bid on with their most recent bid and auction
+    status, ongoing auctions first (ending soonest first), then ended ones.
     Users can only view their own bidded items unless they're an admin.
+    Query parameters:
+    - fields: comma-separated item fields to return (default: all); status,
+      is_winning and my_latest_bid are always included
+    - cursor: the next_cursor from the previous page (omit for the first)
+    - limit: page size (default 20, max 100)
+    - include_total: also compute total_count
     """
     if request.method != "GET":
         return JsonResponse({"error": "Method not allowed"}, status=405)
@@ -1532,38 +1633,73 @@ def get_user_bidded_items(request, user_id=None):
             status=403,
         )
 
-    # Get all distinct items the user has bid on
-    item_ids = (
-        Bid.objects.filter(bidder=user).values_list("item_id", flat=True).distinct()
-    )
-    items = Item.objects.filter(id__in=item_ids).select_related("owner")
+    try:
+        serializer = ItemSerializer(
+            request, requested_fields(request, USER_BIDDED_ITEM_FIELDS)
+        )
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    try:
+        limit = parse_limit(request.GET.get("limit"))
+    except (ValueError, TypeError):
+        return JsonResponse({"error": "Invalid limit parameter"}, status=400)
+    include_total = request.GET.get("include_total") == "true"
 
     today = date.today()
-    items_data = []
 
-    for item in items:
-        # Get the user's most recent bid on this item
-        user_latest_bid = (
-            Bid.objects.filter(bidder=user, item=item).order_by("-created_at").first()
+    # One query for the page: the items the user has bid on, sorted and
+    # paginated in the database. Whether the user is winning comes from the
+    # item's denormalised highest_bidder rather than the bid history.
+    bids = Bid.objects.filter(bidder=user)
+    items = serializer.rows(
+        Item.objects.filter(id__in=bids.values("item_id")).annotate(
+            ended=Case(
+                When(auction_end_date__lt=today, then=Value(1)),
+                default=Value(0),
+                output_field=IntegerField(),
+            )
+        ),
+        "id",
+        "auction_end_date",
+        "highest_bidder_id",
+        "ended",
+    )
+    try:
+        page, next_cursor = BIDDED_ITEMS_KEYSET.paginate(
+            items, request.GET.get("cursor"), limit
         )
+    except (ValueError, ValidationError):
+        return JsonResponse({"error": "Invalid cursor"}, status=400)
+
+    # And one for the user's latest bid on each of them
+    latest_bids = {}
+    if page:
+        latest_bids = {
+            bid["item_id"]: bid
+            for bid in bids.filter(item_id__in=[row["id"] for row in page])
+            .annotate(
+                rank=Window(
+                    RowNumber(),
+                    partition_by=F("item_id"),
+                    order_by=(F("created_at").desc(), F("id").desc()),
+                )
+            )
+            .filter(rank=1)
+            .values("id", "item_id", "bid_amount", "created_at")
+        }
 
-        # Get the highest bid on this item
-        highest_bid = Bid.objects.filter(item=item).aggregate(Max("bid_amount"))[
-            "bid_amount__max"
-        ]
-
-        # Get all bids with the highest amount (in case of ties)
-        highest_bidders = Bid.objects.filter(
-            item=item, bid_amount=highest_bid
-        ).values_list("bidder_id", flat=True)
+    items_data = []
+    for row in page:
+        is_highest_bidder = row["highest_bidder_id"] == user.id
 
         # Determine auction status
-        if item.auction_end_date >= today:
+        if row["auction_end_date"] >= today:
             status = "ongoing"
-            is_winning = user.id in highest_bidders if highest_bidders else False
+            is_winning = is_highest_bidder
         else:
             # Auction has ended
-            if user.id in highest_bidders:
+            if is_highest_bidder:
                 status = "won"
                 is_winning = True
             else:
@@ -1571,51 +1707,23 @@ def get_user_bidded_items(request, user_id=None):
                 is_winning = False
 
         # Build item data
-        item_data = {
-            "id": item.id,
-            "title": item.title,
-            "description": item.description,
-            "minimum_bid": item.minimum_bid,
-            "auction_end_date": str(item.auction_end_date),
-            "is_active": item.auction_end_date >= today,
-            "status": status,
-            "is_winning": is_winning,
-            "highest_bid": highest_bid,
-        }
-
-        # Add owner information
-        if item.owner:
-            item_data["owner"] = {
-                "id": item.owner.id,
-                "name": f"{item.owner.first_name} {item.owner.last_name}",
-                "email": item.owner.email,
-            }
-        else:
-            item_data["owner"] = None
-
-        # Add item image URL if exists
-        if item.item_image:
-            item_data["item_image"] = request.build_absolute_uri(item.item_image.url)
-        else:
-            item_data["item_image"] = None
+        item_data = serializer.serialize(row)
+        item_data["status"] = status
+        item_data["is_winning"] = is_winning
 
         # Add user's most recent bid information
-        if user_latest_bid:
+        latest_bid = latest_bids.get(row["id"])
+        if latest_bid:
             item_data["my_latest_bid"] = {
-                "id": user_latest_bid.id,
-                "bid_amount": user_latest_bid.bid_amount,
-                "created_at": user_latest_bid.created_at.isoformat(),
+                "id": latest_bid["id"],
+                "bid_amount": latest_bid["bid_amount"],
+                "created_at": latest_bid["created_at"],
             }
         else:
             item_data["my_latest_bid"] = None
 
         items_data.append(item_data)
 
-    # Sort by auction end date (active auctions first, then by end date)
-    items_data.sort(
-        key=lambda x: (x["auction_end_date"] < str(today), x["auction_end_date"])
-    )
-
     return JsonResponse(
         {
             "success": True,
@@ -1626,6 +1734,10 @@ def get_user_bidded_items(request, user_id=None):
             },
             "items": items_data,
             "count": len(items_data),
+            "total_count": (
+                bids.values("item_id").distinct().count() if include_total else None
+            ),
+            "next_cursor": next_cursor,
         }
     )
 
@@ -1720,7 +1832,7 @@ def create_message(request):
             "id": message.id,
             "message_title": message.message_title,
             "message_body": message.message_body,
-            "created_at": message.created_at.isoformat(),
+            "created_at": message.created_at,
             "poster": {
                 "id": request.user.id,
                 "name": f"{request.user.first_name} {request.user.last_name}",
@@ -1735,6 +1847,16 @@ def create_message(request):
             else False,
         }
 
+        # Everyone watching the item sees the message, without the poster's email
+        publish_item_event(
+            item.id,
+            "message",
+            {
+                **message_data,
+                "poster": {"id": request.user.id, "name": message_data["poster"]["name"]},
+            },
+        )
+
         return JsonResponse(
             {
                 "success": True,
@@ -1765,13 +1887,29 @@ def get_item_messages(request, item_id):
     if request.method != "GET":
         return JsonResponse({"error": "Method not allowed"}, status=405)
 
-    try:
-        item = Item.objects.get(id=item_id)
-    except Item.DoesNotExist:
+    # The item, with a summary of its thread that changes whenever a message
+    # is posted, edited or deleted. Pollers whose copy is current get a 304
+    # without the messages being read. (Renaming a poster doesn't change it.)
+    item = (
+        Item.objects.filter(id=item_id)
+        .annotate(
+            message_count=Count("message"),
+            last_message_id=Max("message__id"),
+            last_edit=Max("message__updated_at"),
+        )
+        .values("id", "title", "owner_id", "message_count", "last_message_id", "last_edit")
+        .first()
+    )
+    if item is None:
         return JsonResponse({"error": "Item not found"}, status=404)
+    etag = make_etag(*item.values())
+    response = not_modified(request, etag)
+    if response is not None:
+        response["Cache-Control"] = "private, no-cache"
+        return response
 
     all_messages = (
-        Message.objects.filter(item=item)
+        Message.objects.filter(item_id=item_id)
         .select_related("poster", "replying_to")
         .order_by("created_at")
     )
@@ -1784,7 +1922,7 @@ def get_item_messages(request, item_id):
             "id": message.id,
             "message_title": message.message_title,
             "message_body": message.message_body,
-            "created_at": message.created_at.isoformat(),
+            "created_at": message.created_at,
             "poster": {
                 "id": message.poster.id,
                 "name": f"{message.poster.first_name} {message.poster.last_name}",
@@ -1792,9 +1930,8 @@ def get_item_messages(request, item_id):
             }
             if message.poster
             else None,
-            "is_owner": message.poster == item.owner
-            if message.poster and item.owner
-            else False,
+            "is_owner": message.poster_id is not None
+            and message.poster_id == item["owner_id"],
             "replying_to_id": message.replying_to.id if message.replying_to else None,
             "replies": [],
         }
@@ -1810,14 +1947,17 @@ def get_item_messages(request, item_id):
                 messages_dict[message.id]
             )
 
-    return JsonResponse(
+    response = JsonResponse(
         {
             "success": True,
-            "item": {"id": item.id, "title": item.title},
+            "item": {"id": item["id"], "title": item["title"]},
             "messages": top_level_messages,
             "count": len(top_level_messages),
         }
     )
+    response["ETag"] = etag
+    response["Cache-Control"] = "private, no-cache"
+    return response
 
 
 """
@@ -1878,7 +2018,7 @@ def update_message(request, message_id):
             "id": message.id,
             "message_title": message.message_title,
             "message_body": message.message_body,
-            "created_at": message.created_at.isoformat(),
+            "created_at": message.created_at,
             "poster": {
                 "id": message.poster.id,
                 "name": f"{message.poster.first_name} {message.poster.last_name}",
@@ -1945,3 +2085,49 @@ def delete_message(request, message_id):
             {"error": f"Failed to delete message: {str(e)}"}, status=500
         )
 
+
+@login_required
+def get_cache_stats(request):
+    """Item cache counts for the worker process serving this (admin only)"""
+    if request.method != "GET":
+        return JsonResponse({"error": "Method not allowed"}, status=405)
+
+    if not request.user.is_admin:
+        return JsonResponse(
+            {"error": "You don't have permission to view cache statistics"}, status=403
+        )
+
+    return JsonResponse(
+        {
+            "success": True,
+            "item_detail": ITEM_CACHE_STATS.as_dict(),
+            "item_listing": LISTING_CACHE_STATS.as_dict(),
+        }
+    )
+
+
+def get_metrics(request):
+    """
+    Request and cache metrics for the worker process serving this, in the
+    Prometheus text format. Admins only, or a scraper sending METRICS_TOKEN
+    as a bearer token.
+    """
+    if request.method != "GET":
+        return JsonResponse({"error": "Method not allowed"}, status=405)
+
+    token = getattr(settings, "METRICS_TOKEN", None)
+    if not (
+        token
+        and constant_time_compare(
+            request.headers.get("Authorization", ""), f"Bearer {token}"
+        )
+    ) and not (request.user.is_authenticated and request.user.is_admin):
+        return JsonResponse(
+            {"error": "You don't have permission to view metrics"}, status=403
+        )
+
+    return HttpResponse(
+        REQUEST_METRICS.render()
+        + render_cache_stats(ITEM_CACHE_STATS, LISTING_CACHE_STATS),
+        content_type="text/plain; version=0.0.4; charset=utf-8",
+    )
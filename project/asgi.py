@@ -2,6 +2,9 @@
 ASGI config for project project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Serving the project over ASGI (see Procfile) lets async views such as the
+live event stream (api/events.py) hold connections open without a thread
+each; the other views still run in a thread pool.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/stable/howto/deployment/asgi/
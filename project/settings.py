@@ -55,6 +55,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so it times everything below it (see api/metrics.py)
+    "api.middleware.RequestMetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
@@ -63,7 +65,8 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
-    "whitenoise.middleware.WhiteNoiseMiddleware",
+    # whitenoise.middleware.WhiteNoiseMiddleware, usable from async views
+    "api.middleware.AsyncWhiteNoiseMiddleware",
 ]
 
 ROOT_URLCONF = "project.urls"
@@ -71,6 +74,7 @@ ROOT_URLCONF = "project.urls"
 # Create Application Cron Jobs
 CRONJOBS = [
     ("0 0 * * *", "api.cron.process_auction_winners"),
+    ("* * * * *", "api.cron.send_queued_emails"),
 ]
 
 # Configure Email Settings for send_mail
@@ -166,6 +170,68 @@ INTERNAL_IPS = ["127.0.0.1"]
 MEDIA_URL = "/media/"
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
 
+# Uploaded media is stored by content hash and reference counted (see
+# api/storage.py); run ``manage.py gc_media`` periodically to remove orphans
+STORAGES = {
+    "default": {"BACKEND": "api.storage.ContentAddressedStorage"},
+    "staticfiles": {
+        "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"
+    },
+}
+
+# The item detail and listing caches (see api/caching.py) use the "items" cache. Local
+# memory is per process; point ITEM_CACHE_BACKEND at e.g.
+# django.core.cache.backends.redis.RedisCache to share it between workers.
+CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    "items": {
+        "BACKEND": os.environ.get(
+            "ITEM_CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"
+        ),
+        "LOCATION": os.environ.get("ITEM_CACHE_LOCATION", "items"),
+    },
+}
+ITEM_CACHE_TIMEOUT = 300
+LISTING_CACHE_TIMEOUT = 60
+# How long a request waits for another one rebuilding the same listing page
+LISTING_CACHE_WAIT = 2.0
+
+# Request metrics (see api/metrics.py), at /metrics/ for admins, or for a
+# scraper sending "Authorization: Bearer <METRICS_TOKEN>" if it's set.
+# Requests slower than SLOW_REQUEST_SECONDS are logged with their queries.
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN") or None
+SLOW_REQUEST_SECONDS = (
+    float(os.environ["SLOW_REQUEST_SECONDS"])
+    if os.environ.get("SLOW_REQUEST_SECONDS")
+    else None
+)
+
+# Live bid and message events (see api/events.py). LocalHub only reaches
+# watchers connected to the same process; use a broker-backed hub to run
+# several ASGI workers.
+EVENT_HUB = os.environ.get("EVENT_HUB", "api.events.LocalHub")
+# Events a slow watcher may fall behind by before its stream is ended
+EVENT_QUEUE_SIZE = 100
+# Seconds between keep-alive comments on an idle stream
+EVENT_STREAM_HEARTBEAT = 15
+# Long polls for new bids (items/<id>/bids/?since=&wait=): the longest a
+# request may wait, and how often it checks the database meanwhile
+LONG_POLL_MAX_WAIT = 30
+LONG_POLL_INTERVAL = 5
+
+# Who sends media files (see api/media.py): "python" (Django), or the front
+# end server via "x-accel-redirect" (nginx) or "x-sendfile" (Apache). Under
+# the ASGI workers "python" gets no sendfile, so prefer a front end in production
+MEDIA_SERVING = os.environ.get("MEDIA_SERVING", "python")
+MEDIA_ACCEL_REDIRECT_PREFIX = os.environ.get(
+    "MEDIA_ACCEL_REDIRECT_PREFIX", "/protected-media/"
+)
+
+# Processes that resize uploaded images in the background (see api/images.py).
+# Unset uses one per CPU; 0 processes uploads inline instead.
+if os.environ.get("IMAGE_PROCESSING_WORKERS"):
+    IMAGE_PROCESSING_WORKERS = int(os.environ["IMAGE_PROCESSING_WORKERS"])
+
 # CORS settings for frontend development
 # Allow requests from Vue dev server
 CORS_ALLOWED_ORIGINS = [